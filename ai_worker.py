@@ -0,0 +1,190 @@
+import queue
+import threading
+from chess_model import ChessModel
+from search import Searcher
+
+
+class AIReply:
+    """
+    A move chosen by an AIWorker.
+
+    Attributes:
+        request (int): The number of the request answered, as returned by AIWorker.request.
+        position (bytes): The position the move was chosen for, packed by ChessModel.to_bytes.
+        move (Move): The chosen move, or None if the player had no legal move.
+        ponder (Move): The reply the worker expects and is pondering on, or None if it is not pondering.
+    """
+    __slots__ = ('request', 'position', 'move', 'ponder')
+
+    def __init__(self, request, position, move, ponder=None):
+        self.request = request
+        self.position = position
+        self.move = move
+        self.ponder = ponder
+
+
+class _Task:
+    # A position for the worker thread to play from. A ponder task has no request number until the player makes
+    # the move it predicted.
+    __slots__ = ('number', 'position', 'stop', 'cancelled', 'timer', 'move', 'done')
+
+    def __init__(self, number, position):
+        self.number = number
+        self.position = position
+        self.stop = threading.Event()
+        self.cancelled = False
+        self.timer = None
+        self.move = None
+        self.done = False
+
+
+class AIWorker:
+    def __init__(self, post, time_limit: float = 1.0, max_depth: int = None, searcher: Searcher = None,
+                 opening_book=None, tablebase=None, ponder: bool = False):
+        """
+        Initialize a worker thread that picks moves away from the caller's thread. Positions are handed over as
+        snapshots, so the caller's model can change while the worker thinks, and every reply is passed to post
+        from the worker thread. The searcher is kept between requests, so its transposition table carries over
+        from move to move.
+
+        When pondering, the worker goes on after each reply to search the position after the reply it expects,
+        while the opponent thinks. If the next request is for that position, the search carries on with the
+        time limit starting then and keeps what it has found so far. Otherwise it is dropped, and the new search
+        reuses its transposition table entries.
+
+        Parameters:
+            post: A function called with an AIReply for every request that was not cancelled. It must be safe to
+                call from another thread, such as pygame.event.post.
+            time_limit (float): The wall-clock budget of each search in seconds, or None for no limit.
+            max_depth (int): The deepest iteration each search may run, or None for no limit.
+            searcher (Searcher): The searcher to run, or None to create one.
+            opening_book (OpeningBook): The book to play from before searching, or None.
+            tablebase (Tablebase): The endgame tables to play from once few pieces are left, or None.
+            ponder (bool): Whether to search on the opponent's time.
+        """
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.searcher = searcher if searcher is not None else Searcher()
+        self.opening_book = opening_book
+        self.tablebase = tablebase
+        self.ponder = ponder
+        self.__post = post
+        self.__requests = queue.Queue()
+        self.__lock = threading.Lock()
+        self.__count = 0
+        # Task being worked on or waiting, including a ponder task, or None when the worker is idle
+        self.__task = None
+        self.__thread = threading.Thread(target=self.__run, name='AIWorker', daemon=True)
+        self.__thread.start()
+
+    def request(self, model: ChessModel) -> int:
+        """
+        Asks for a move in the model's current position, cancelling any request still in progress. If the worker
+        is pondering on this position, its search becomes the one that answers.
+
+        Parameters:
+            model (ChessModel): The position to play from. It is copied, so it may change straight away.
+
+        Returns:
+            int: The number of the request, which its AIReply carries.
+        """
+        position = model.to_bytes()
+        with self.__lock:
+            self.__count += 1
+            task = self.__task
+            if task is not None and task.number is None and task.position == position:
+                task.number = self.__count
+                if task.done:
+                    # The ponder search already finished, so the worker only has to post its move
+                    self.__requests.put(task)
+                else:
+                    self.__start_clock(task)
+                return self.__count
+            self.__cancel()
+            self.__task = _Task(self.__count, position)
+            self.__start_clock(self.__task)
+            self.__requests.put(self.__task)
+            return self.__count
+
+    def cancel(self):
+        """
+        Stops the request in progress and any pondering, such as after an undo or a reset. The reply of the
+        request is not posted.
+        """
+        with self.__lock:
+            self.__cancel()
+
+    def close(self):
+        """
+        Cancels any request and waits for the worker thread to finish.
+        """
+        self.cancel()
+        self.__requests.put(None)
+        self.__thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __cancel(self):
+        # Called with the lock held
+        task = self.__task
+        if task is not None:
+            task.cancelled = True
+            task.stop.set()
+            if task.timer is not None:
+                task.timer.cancel()
+            self.__task = None
+
+    def __start_clock(self, task: _Task):
+        # The search runs until its stop event is set, so a ponder search can be given a time limit once the
+        # player makes the predicted move
+        if self.time_limit is not None:
+            task.timer = threading.Timer(self.time_limit, task.stop.set)
+            task.timer.daemon = True
+            task.timer.start()
+
+    def __run(self):
+        while True:
+            task = self.__requests.get()
+            if task is None:
+                break
+            while task is not None:
+                if not task.done and not task.cancelled:
+                    task.move = self.__choose(task.position, task.stop)
+                task = self.__finish(task)
+
+    def __choose(self, position: bytes, stop: threading.Event):
+        # Plays on a model of its own that shares the worker's searcher, book and tables
+        model = ChessModel.from_bytes(position)
+        model.searcher = self.searcher
+        model.opening_book = self.opening_book
+        model.tablebase = self.tablebase
+        return model.ai_move(max_depth=self.max_depth if self.max_depth is not None else 64, stop_event=stop)
+
+    def __finish(self, task: _Task):
+        # Posts the reply of a finished task and returns the ponder task that follows it, if any. Posting under the
+        # lock means a reply is never posted after cancel or request returns.
+        with self.__lock:
+            task.done = True
+            if task.timer is not None:
+                task.timer.cancel()
+            # A ponder task that finished before the player moved waits for its request
+            if task.cancelled or task.number is None:
+                return None
+            self.__task = None
+            predicted = None
+            ponder = None
+            if self.ponder and task.move is not None:
+                model = ChessModel.from_bytes(task.position)
+                model.move(task.move)
+                line = self.searcher.principal_variation(model, 1)
+                if line:
+                    predicted = line[0]
+                    model.move(predicted)
+                    ponder = _Task(None, model.to_bytes())
+            self.__post(AIReply(task.number, task.position, task.move, predicted))
+            self.__task = ponder
+            return ponder
@@ -0,0 +1,159 @@
+from player import Player
+from bitboard import BitBoard, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+
+# Ray directions as (row step, col step), named as the board is drawn with row 0 at the top
+DOWN_LEFT, DOWN, DOWN_RIGHT, LEFT, RIGHT, UP_LEFT, UP, UP_RIGHT = range(8)
+DIRECTIONS = ((1, -1), (1, 0), (1, 1), (0, -1), (0, 1), (-1, -1), (-1, 0), (-1, 1))
+ROOK_DIRECTIONS = (DOWN, LEFT, RIGHT, UP)
+BISHOP_DIRECTIONS = (DOWN_LEFT, DOWN_RIGHT, UP_LEFT, UP_RIGHT)
+# Rays that walk towards higher square indexes meet their first blocker at the lowest set bit
+_POSITIVE = (True, True, True, False, True, False, False, False)
+
+
+def _on_board(row: int, col: int) -> bool:
+    return 0 <= row < 8 and 0 <= col < 8
+
+
+def _step_table(steps):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        bb = 0
+        for dr, dc in steps:
+            if _on_board(row + dr, col + dc):
+                bb |= 1 << ((row + dr) * 8 + col + dc)
+        table.append(bb)
+    return table
+
+
+def _ray_table(dr: int, dc: int):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        bb = 0
+        row, col = row + dr, col + dc
+        while _on_board(row, col):
+            bb |= 1 << (row * 8 + col)
+            row, col = row + dr, col + dc
+        table.append(bb)
+    return table
+
+
+KNIGHT_ATTACKS = _step_table(((2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2)))
+KING_ATTACKS = _step_table(((1, 1), (1, 0), (1, -1), (0, 1), (0, -1), (-1, 1), (-1, 0), (-1, -1)))
+# Pawns capture towards row 0 for white and towards row 7 for black, indexed by player.value
+PAWN_ATTACKS = (_step_table(((1, -1), (1, 1))), _step_table(((-1, -1), (-1, 1))))
+RAYS = tuple(_ray_table(dr, dc) for dr, dc in DIRECTIONS)
+
+
+def _slider_attacks(sq: int, occupied: int, directions) -> int:
+    attacks = 0
+    for direction in directions:
+        ray = RAYS[direction][sq]
+        blockers = ray & occupied
+        if blockers:
+            if _POSITIVE[direction]:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= RAYS[direction][first]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(sq: int, occupied: int) -> int:
+    """
+    Finds the squares a rook on a square attacks, stopping each ray at the first occupied square.
+
+    Parameters:
+        sq (int): The square of the rook.
+        occupied (int): The bitboard of every occupied square.
+
+    Returns:
+        int: The bitboard of attacked squares, including the blocking squares.
+    """
+    return _slider_attacks(sq, occupied, ROOK_DIRECTIONS)
+
+
+def bishop_attacks(sq: int, occupied: int) -> int:
+    """
+    Finds the squares a bishop on a square attacks, stopping each ray at the first occupied square.
+
+    Parameters:
+        sq (int): The square of the bishop.
+        occupied (int): The bitboard of every occupied square.
+
+    Returns:
+        int: The bitboard of attacked squares, including the blocking squares.
+    """
+    return _slider_attacks(sq, occupied, BISHOP_DIRECTIONS)
+
+
+def queen_attacks(sq: int, occupied: int) -> int:
+    """
+    Finds the squares a queen on a square attacks, stopping each ray at the first occupied square.
+
+    Parameters:
+        sq (int): The square of the queen.
+        occupied (int): The bitboard of every occupied square.
+
+    Returns:
+        int: The bitboard of attacked squares, including the blocking squares.
+    """
+    return _slider_attacks(sq, occupied, ROOK_DIRECTIONS) | _slider_attacks(sq, occupied, BISHOP_DIRECTIONS)
+
+
+def piece_attacks(kind: int, side: int, sq: int, occupied: int) -> int:
+    """
+    Finds the squares a piece attacks, whether they are empty or hold a piece of either color.
+
+    Parameters:
+        kind (int): The piece type, PAWN to KING.
+        side (int): The value of the player that owns the piece, which sets the direction pawns attack in.
+        sq (int): The square of the piece.
+        occupied (int): The bitboard of every occupied square.
+
+    Returns:
+        int: The bitboard of attacked squares.
+    """
+    if kind == PAWN:
+        return PAWN_ATTACKS[side][sq]
+    if kind == KNIGHT:
+        return KNIGHT_ATTACKS[sq]
+    if kind == KING:
+        return KING_ATTACKS[sq]
+    if kind == ROOK:
+        return _slider_attacks(sq, occupied, ROOK_DIRECTIONS)
+    if kind == BISHOP:
+        return _slider_attacks(sq, occupied, BISHOP_DIRECTIONS)
+    return _slider_attacks(sq, occupied, ROOK_DIRECTIONS) | _slider_attacks(sq, occupied, BISHOP_DIRECTIONS)
+
+
+def is_square_attacked(bitboard: BitBoard, sq: int, player: Player) -> bool:
+    """
+    Checks if any piece of a player attacks a square. The pieces of the player are looked up from the square
+    outwards, so the answer costs a handful of table lookups instead of one move check per piece.
+
+    Parameters:
+        bitboard (BitBoard): The position to look at.
+        sq (int): The square that may be attacked.
+        player (Player): The attacking player.
+
+    Returns:
+        bool: True if the player attacks the square, False otherwise.
+    """
+    pieces = bitboard.pieces[player.value]
+    if KNIGHT_ATTACKS[sq] & pieces[KNIGHT]:
+        return True
+    if KING_ATTACKS[sq] & pieces[KING]:
+        return True
+    # A pawn attacks the square if a pawn of the other color on the square would attack the pawn
+    if PAWN_ATTACKS[1 - player.value][sq] & pieces[PAWN]:
+        return True
+    occupied = bitboard.occupied[0] | bitboard.occupied[1]
+    queens = pieces[QUEEN]
+    if pieces[ROOK] | queens and rook_attacks(sq, occupied) & (pieces[ROOK] | queens):
+        return True
+    if pieces[BISHOP] | queens and bishop_attacks(sq, occupied) & (pieces[BISHOP] | queens):
+        return True
+    return False
@@ -0,0 +1,233 @@
+import argparse
+import time
+from functools import lru_cache
+import numpy as np
+from chess_model import ChessModel, START_FEN
+from attacks import KNIGHT_ATTACKS, RAYS, ROOK_DIRECTIONS, BISHOP_DIRECTIONS
+from bitboard import KNIGHT, BISHOP, ROOK, QUEEN
+from evaluation import Evaluation, DEFAULT_EVALUATION, PHASE_WEIGHTS, MAX_PHASE
+
+# Positions are arrays of 64 uint8 codes, one per square in ChessModel order (row 0 first): 0 for an empty square,
+# 1 to 6 for a black pawn to king and 7 to 12 for a white pawn to king, as in ChessModel.to_bytes
+EMPTY = 0
+_FEN_CODES = np.zeros(256, dtype=np.uint8)
+for _code, _letter in enumerate('pnbrqkPNBRQK', 1):
+    _FEN_CODES[ord(_letter)] = _code
+# FEN digits become that many '.' squares and the rank separators disappear
+_FEN_EXPAND = {ord(str(n)): '.' * n for n in range(1, 9)}
+_FEN_EXPAND[ord('/')] = None
+
+# Centipawns per reachable empty square, indexed by piece type; pawns and kings are not counted
+MOBILITY_WEIGHTS = (0, 4, 3, 2, 1, 0)
+
+# The middlegame score, endgame score and phase of a position are summed as one int64, each in a field of this
+# many bits, with the middlegame score in the top field. Scores of up to a million centipawns either way fit.
+_FIELD_BITS = 21
+_FIELD_MASK = (1 << _FIELD_BITS) - 1
+_FIELD_BIAS = 1 << (_FIELD_BITS - 1)
+
+
+@lru_cache(maxsize=8)
+def _square_table(evaluation: Evaluation) -> np.ndarray:
+    # Packed middlegame score, endgame score and phase weight of every code on every square, positive for white,
+    # stored square by square so that code + 13 * square indexes them
+    table = np.zeros((64, 13), dtype=np.int64)
+    for side in range(2):
+        for kind in range(6):
+            middlegame = np.array(evaluation.middlegame_scores[side][kind], dtype=np.int64)
+            endgame = np.array(evaluation.endgame_scores[side][kind], dtype=np.int64)
+            table[:, side * 6 + kind + 1] = (middlegame << 2 * _FIELD_BITS) + (endgame << _FIELD_BITS) + \
+                PHASE_WEIGHTS[kind]
+    return table.ravel()
+
+
+def _unpack_scores(totals: np.ndarray) -> tuple:
+    # Splits summed fields back into middlegame scores, endgame scores and phases
+    phase = totals & _FIELD_MASK
+    endgame = ((totals >> _FIELD_BITS) + _FIELD_BIAS & _FIELD_MASK) - _FIELD_BIAS
+    middlegame = (totals - (endgame << _FIELD_BITS) - phase) >> 2 * _FIELD_BITS
+    return middlegame, endgame, phase
+
+
+def _mobility_tables(weights) -> tuple:
+    # The squares a piece of each code reaches from every square on an empty board as a 64-bit mask, and the
+    # signed weight of each code. Queens reach along both kinds of line; codes that are not counted get no mask.
+    lines = {KNIGHT: (), BISHOP: BISHOP_DIRECTIONS, ROOK: ROOK_DIRECTIONS,
+             QUEEN: BISHOP_DIRECTIONS + ROOK_DIRECTIONS}
+    masks = np.zeros((64, 13), dtype=np.uint64)
+    code_weights = np.zeros(13, dtype=np.int64)
+    for side, sign in ((0, -1), (1, 1)):
+        for kind, directions in lines.items():
+            code = side * 6 + kind + 1
+            code_weights[code] = sign * weights[kind]
+            for sq in range(64):
+                reach = KNIGHT_ATTACKS[sq] if kind == KNIGHT else 0
+                for direction in directions:
+                    reach |= RAYS[direction][sq]
+                masks[sq, code] = reach
+    return masks.ravel(), code_weights
+
+
+_MOBILITY_MASKS, _MOBILITY_WEIGHTS = _mobility_tables(MOBILITY_WEIGHTS)
+_MOBILE = _MOBILITY_WEIGHTS != 0
+_SQUARE_OFFSETS = (np.arange(64) * 13).astype(np.int16)
+# Set bits of every byte, for NumPy versions without bitwise_count
+_BYTE_COUNTS = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+
+def _popcount_bytes(masks: np.ndarray) -> np.ndarray:
+    # Set bits of each uint64, a byte at a time through the lookup table
+    return _BYTE_COUNTS[masks.view(np.uint8)].reshape(len(masks), 8).sum(axis=1, dtype=np.int64)
+
+
+_popcount = getattr(np, 'bitwise_count', _popcount_bytes)
+
+
+def board_to_array(board: list) -> np.ndarray:
+    """
+    Encodes a board as 64 piece codes.
+
+    Parameters:
+        board (list): The board as 8 rows of 8 pieces or None, such as ChessModel.board.
+
+    Returns:
+        numpy.ndarray: A uint8 array of 64 codes.
+    """
+    codes = np.zeros(64, dtype=np.uint8)
+    for row in range(8):
+        for col in range(8):
+            piece = board[row][col]
+            if piece is not None:
+                codes[row * 8 + col] = piece.side * 6 + piece.code + 1
+    return codes
+
+
+def model_to_array(model: ChessModel) -> np.ndarray:
+    """
+    Encodes the board of a model as 64 piece codes, straight from its packed form.
+
+    Parameters:
+        model (ChessModel): The position to encode.
+
+    Returns:
+        numpy.ndarray: A uint8 array of 64 codes.
+    """
+    return np.frombuffer(model.to_bytes(), dtype=np.uint8, count=64).copy()
+
+
+def fens_to_array(fens) -> tuple:
+    """
+    Encodes many FEN positions at once, without building a model for any of them.
+
+    Parameters:
+        fens: An iterable of FEN strings.
+
+    Returns:
+        tuple: A uint8 array of shape (N, 64) with the piece codes and a uint8 array of shape (N,) with the value of
+            the player to move.
+
+    Raises:
+        ValueError: If a FEN does not describe 64 squares or a player to move.
+    """
+    squares = []
+    players = bytearray()
+    for fen in fens:
+        placement, _, rest = fen.strip().partition(' ')
+        expanded = placement.translate(_FEN_EXPAND)
+        if len(expanded) != 64 or rest[:1] not in ('w', 'b'):
+            raise ValueError(f'Not a FEN position: {fen!r}')
+        squares.append(expanded)
+        players.append(rest[0] == 'w')
+    letters = np.frombuffer(''.join(squares).encode('ascii', 'replace'), dtype=np.uint8)
+    positions = _FEN_CODES[letters]
+    if np.any((positions == EMPTY) & (letters != ord('.'))):
+        raise ValueError('Not a FEN position: unknown piece letter')
+    return positions.reshape(len(squares), 64), np.frombuffer(bytes(players), dtype=np.uint8)
+
+
+def fen_to_array(fen: str) -> np.ndarray:
+    """
+    Encodes one FEN position as 64 piece codes.
+
+    Parameters:
+        fen (str): The position.
+
+    Returns:
+        numpy.ndarray: A uint8 array of 64 codes.
+
+    Raises:
+        ValueError: If the text is not a FEN position.
+    """
+    return fens_to_array([fen])[0][0]
+
+
+def evaluate_batch(positions, players=None, chunk_size: int = 4096, evaluation: Evaluation = None) -> np.ndarray:
+    """
+    Scores many positions at once from material and piece-square bonuses, blended by game phase as
+    ChessModel.evaluate does, plus mobility. Mobility counts the empty squares each knight, bishop, rook and queen
+    reaches along its empty-board lines, so sliders see past blockers; this keeps it one mask and one bit count
+    per piece.
+
+    Parameters:
+        positions: A uint8 array of shape (N, 64), or (64,) for a single position.
+        players: The value of the player to move in each position, or None to score every position for white.
+        chunk_size (int): The number of positions scored per step, which bounds the memory used.
+        evaluation (Evaluation): The piece values and piece-square tables to score with, or None for the defaults.
+
+    Returns:
+        numpy.ndarray: An int32 array of N scores in centipawns, positive when white (or the player to move) is
+            ahead.
+    """
+    table = _square_table(evaluation or DEFAULT_EVALUATION)
+    positions = np.atleast_2d(np.asarray(positions, dtype=np.uint8))
+    scores = np.empty(len(positions), dtype=np.int32)
+    # Reused by every chunk, as freshly allocated arrays this size cost more in page faults than the gather
+    gathered = np.empty((min(chunk_size, len(positions)), 64), dtype=np.int64)
+    for start in range(0, len(positions), chunk_size):
+        chunk = positions[start:start + chunk_size]
+        count = len(chunk)
+        indices = chunk + _SQUARE_OFFSETS
+        totals = np.take(table, indices, mode='clip', out=gathered[:count]).sum(axis=1)
+        middlegame, endgame, phase = _unpack_scores(totals)
+        phase = np.minimum(phase, MAX_PHASE)
+        static = (middlegame * phase + endgame * (MAX_PHASE - phase)) // MAX_PHASE
+        # Only the squares holding a counted piece are looked at: each piece's mask is cut down to the empty
+        # squares of its position, and the weighted bit counts are added up per position
+        empty = np.packbits(chunk == EMPTY, axis=1, bitorder='little').view(np.uint64).ravel()
+        codes = chunk.ravel()
+        pieces = np.flatnonzero(np.take(_MOBILE, codes, mode='clip'))
+        owners = pieces >> 6
+        reached = _popcount(_MOBILITY_MASKS[indices.ravel()[pieces]] & empty[owners]).astype(np.int64)
+        mobility = np.bincount(owners, reached * _MOBILITY_WEIGHTS[codes[pieces]], minlength=count)
+        scores[start:start + count] = static + mobility.astype(np.int64)
+    if players is not None:
+        # Player value 0 is black
+        scores = np.where(np.asarray(players) == 0, -scores, scores).astype(np.int32)
+    return scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the throughput of the batch evaluator.')
+    parser.add_argument('path', nargs='?', help='file with one FEN per line; the starting position if left out')
+    parser.add_argument('--count', type=int, default=1000000, help='number of positions to score')
+    args = parser.parse_args()
+
+    if args.path:
+        with open(args.path) as file:
+            fens = [line for line in file if line.strip() and not line.startswith('#')]
+    else:
+        fens = [START_FEN]
+    positions, players = fens_to_array(fens)
+    repeat = max(1, args.count // len(positions))
+    positions = np.tile(positions, (repeat, 1))
+    players = np.tile(players, repeat)
+    start = time.perf_counter()
+    scores = evaluate_batch(positions, players)
+    elapsed = time.perf_counter() - start
+    print(f'Positions: {len(scores)}')
+    print(f'Time: {elapsed:.3f}s')
+    print(f'Positions/second: {len(scores) / elapsed if elapsed else 0:.0f}')
+
+
+if __name__ == '__main__':
+    main()
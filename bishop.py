@@ -1,14 +1,21 @@
 from chess_piece import ChessPiece
+from bitboard import BISHOP
 from move import Move
 
 
 class Bishop(ChessPiece):
+    __slots__ = ()
+    code = BISHOP
+
     def __str__(self) -> str:
         return 'Bishop'
 
     def type(self) -> str:
         return 'Bishop'
 
+    def possible_moves(self, row: int, col: int, board) -> list:
+        return self._slide_moves(row, col, board, ((1, 1), (1, -1), (-1, 1), (-1, -1)))
+
     def is_valid_move(self, move: Move, board) -> bool:
         # inherits from parent function where if those occurences dont pass then they wont pass here
         if not super().is_valid_move(move, board):
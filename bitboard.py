@@ -0,0 +1,140 @@
+from player import Player
+
+# Index of each piece type inside a player's list of bitboards
+PAWN = 0
+KNIGHT = 1
+BISHOP = 2
+ROOK = 3
+QUEEN = 4
+KING = 5
+
+PIECE_TYPES = ('Pawn', 'Knight', 'Bishop', 'Rook', 'Queen', 'King')
+
+
+def square(row: int, col: int) -> int:
+    """
+    Converts a board location into a square index. Square 0 is row 0, col 0 and square 63 is row 7, col 7.
+
+    Parameters:
+        row (int): The row of the square.
+        col (int): The column of the square.
+
+    Returns:
+        int: The square index, between 0 and 63.
+    """
+    return row * 8 + col
+
+
+def bits(bb: int):
+    """
+    Iterates over the square indexes of the set bits of a bitboard, lowest square first.
+
+    Parameters:
+        bb (int): The bitboard to iterate over.
+
+    Yields:
+        int: The index of each set bit.
+    """
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+class BitBoard:
+    def __init__(self):
+        """
+        Initialize an empty BitBoard. The position is stored as twelve 64-bit integers, one per piece type and
+        player, indexed as pieces[player.value][piece type]. The occupancy of each player is kept alongside them.
+        """
+        self.pieces = [[0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0]]
+        self.occupied = [0, 0]
+
+    @property
+    def all(self) -> int:
+        """
+        Property to get the bitboard of every occupied square.
+
+        Returns:
+            int: The union of both players' occupancy.
+        """
+        return self.occupied[0] | self.occupied[1]
+
+    def add(self, sq: int, player: Player, kind: int):
+        """
+        Sets the bit of a square for a piece type of a player.
+
+        Parameters:
+            sq (int): The square index.
+            player (Player): The owner of the piece.
+            kind (int): The piece type index.
+        """
+        bit = 1 << sq
+        self.pieces[player.value][kind] |= bit
+        self.occupied[player.value] |= bit
+
+    def remove(self, sq: int, player: Player, kind: int):
+        """
+        Clears the bit of a square for a piece type of a player.
+
+        Parameters:
+            sq (int): The square index.
+            player (Player): The owner of the piece.
+            kind (int): The piece type index.
+        """
+        mask = ~(1 << sq)
+        self.pieces[player.value][kind] &= mask
+        self.occupied[player.value] &= mask
+
+    def clear(self):
+        """
+        Removes every piece from the bitboards.
+        """
+        self.pieces = [[0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 0]]
+        self.occupied = [0, 0]
+
+    def copy(self):
+        """
+        Creates a copy of the bitboards.
+
+        Returns:
+            BitBoard: An independent copy of this position.
+        """
+        new = BitBoard()
+        new.pieces = [self.pieces[0][:], self.pieces[1][:]]
+        new.occupied = self.occupied[:]
+        return new
+
+    def king_square(self, player: Player):
+        """
+        Finds the square of a player's king.
+
+        Parameters:
+            player (Player): The owner of the king.
+
+        Returns:
+            int: The square index of the king, or None if the player has no king.
+        """
+        kings = self.pieces[player.value][KING]
+        if not kings:
+            return None
+        return (kings & -kings).bit_length() - 1
+
+    @classmethod
+    def from_board(cls, board: list):
+        """
+        Builds the bitboards for a board stored as a list of lists of pieces.
+
+        Parameters:
+            board (list): The board to convert.
+
+        Returns:
+            BitBoard: The bitboards of the position.
+        """
+        bitboard = cls()
+        for row in range(len(board)):
+            for col in range(len(board[row])):
+                piece = board[row][col]
+                if piece is not None:
+                    bitboard.add(square(row, col), piece.player, piece.code)
+        return bitboard
@@ -0,0 +1,114 @@
+from enum import Enum
+import pygame as pg
+from player import Player
+from bitboard import PIECE_TYPES
+
+IMAGE_SIZE = 52  # small format - images 52 X 52
+# Size of one sprite on the sheet, which has a row of white pieces over a row of black ones
+SHEET_SPRITE_SIZE = 105
+LIGHT_SQUARE = (255, 255, 255)
+DARK_SQUARE = (127, 127, 127)
+SELECTED_OUTLINE = (255, 0, 0)
+
+
+class SpriteType(Enum):
+    King = 0
+    Queen = 1
+    Bishop = 2
+    Knight = 3
+    Rook = 4
+    Pawn = 5
+
+
+class SpriteColor(Enum):
+    WHITE = 0
+    BLACK = 1
+
+
+def load_sprites(path: str = './images/pieces.png', size: int = IMAGE_SIZE) -> tuple:
+    """
+    Cuts the piece sprites out of a sprite sheet, reading the sheet from disk once.
+
+    Parameters:
+        path (str): The sprite sheet.
+        size (int): The width and height of a square on the board.
+
+    Returns:
+        tuple: The sprites indexed by the piece's side and type code.
+    """
+    sheet = pg.image.load(path)
+    sprites = ([None] * len(PIECE_TYPES), [None] * len(PIECE_TYPES))
+    for sprite_type in SpriteType:
+        code = PIECE_TYPES.index(sprite_type.name)
+        for player, color in ((Player.BLACK, SpriteColor.BLACK), (Player.WHITE, SpriteColor.WHITE)):
+            area = pg.Rect(SHEET_SPRITE_SIZE * sprite_type.value, SHEET_SPRITE_SIZE * color.value,
+                           SHEET_SPRITE_SIZE, SHEET_SPRITE_SIZE)
+            sprite = pg.Surface((SHEET_SPRITE_SIZE, SHEET_SPRITE_SIZE), pg.SRCALPHA)
+            sprite.blit(sheet, (0, 0), area)
+            sprites[player.value][code] = pg.transform.scale(sprite, (size, size))
+    return sprites
+
+
+class BoardRenderer:
+    def __init__(self, screen, sprites, size: int = IMAGE_SIZE):
+        """
+        Initialize a renderer that paints the board onto the screen. It remembers what every square shows, so each
+        call repaints only the squares whose piece or selection changed since the last one, whether by a move, an
+        undo, a reset or a click.
+
+        Parameters:
+            screen (pygame.Surface): The display surface, with the board in its top left corner.
+            sprites: The piece sprites indexed by side and type code, as returned by load_sprites.
+            size (int): The width and height of a square.
+        """
+        self.__screen = screen
+        # Match the sprites to the display format once, so blits do not convert them every time
+        self.__sprites = tuple(tuple(sprite.convert_alpha() for sprite in side) for side in sprites)
+        self.__rects = [pg.Rect(sq % 8 * size, sq // 8 * size, size, size) for sq in range(64)]
+        self.__pieces = [None] * 64
+        self.__selected = None
+        self.__stale = True
+
+    def invalidate(self):
+        """
+        Marks every square for repainting, such as after the window was covered.
+        """
+        self.__stale = True
+
+    def render(self, board: list, selected=None) -> list:
+        """
+        Repaints the squares that changed.
+
+        Parameters:
+            board (list): The board as 8 rows of 8 pieces or None, such as ChessModel.board.
+            selected (tuple): The (row, col) of the selected piece, or None.
+
+        Returns:
+            list: The rectangles repainted, to pass to pygame.display.update.
+        """
+        pieces = self.__pieces
+        dirty = set(range(64)) if self.__stale else set()
+        for sq in range(64):
+            # Pieces are shared instances, so a square holds the same object until its piece changes
+            if board[sq // 8][sq % 8] is not pieces[sq]:
+                dirty.add(sq)
+        if selected != self.__selected:
+            for square in (self.__selected, selected):
+                if square is not None:
+                    dirty.add(square[0] * 8 + square[1])
+        self.__selected = selected
+        self.__stale = False
+
+        rects = []
+        for sq in sorted(dirty):
+            row, col = divmod(sq, 8)
+            rect = self.__rects[sq]
+            piece = board[row][col]
+            pieces[sq] = piece
+            self.__screen.fill(LIGHT_SQUARE if (row + col) % 2 == 0 else DARK_SQUARE, rect)
+            if (row, col) == selected:
+                pg.draw.rect(self.__screen, SELECTED_OUTLINE, rect, 2)
+            if piece is not None:
+                self.__screen.blit(self.__sprites[piece.side][piece.code], rect)
+            rects.append(rect)
+        return rects
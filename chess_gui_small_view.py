@@ -1,37 +1,40 @@
-import copy
-from enum import Enum
+import argparse
 import pygame as pg
 import pygame_gui as gui
-from chess_model import ChessModel, MoveValidity, UndoException
+from chess_model import ChessModel, MoveValidity, UndoException, GameStatus
 from move import Move
 from player import Player
-
-IMAGE_SIZE = 52  # small format - images 52 X 52
-
-
-class SpriteType(Enum):
-    King = 0
-    Queen = 1
-    Bishop = 2
-    Knight = 3
-    Rook = 4
-    Pawn = 5
-
-
-class SpriteColor(Enum):
-    WHITE = 0
-    BLACK = 1
+from board_renderer import BoardRenderer, load_sprites, IMAGE_SIZE
+from ai_worker import AIWorker
+
+FRAME_RATE = 30
+# With no events to handle the loop sleeps this long at most, in milliseconds, so the side panel still updates
+IDLE_WAIT = 250
+WINDOW_SIZE = (800, 600)
+BACKGROUND = (255, 255, 255)
+# Everything right of the board, where the buttons and messages are
+PANEL_RECT = pg.Rect(8 * IMAGE_SIZE, 0, WINDOW_SIZE[0] - 8 * IMAGE_SIZE, WINDOW_SIZE[1])
+# Events after which the whole window has to be painted again
+_EXPOSE_EVENTS = {pg.VIDEOEXPOSE, getattr(pg, 'WINDOWEXPOSED', pg.VIDEOEXPOSE)}
+# Posted by the AI worker thread with the move it chose
+AI_MOVE_EVENT = pg.event.custom_type()
+AI_TIME_LIMIT = 2.0
 
 
 class GUI:
-    first = True
-
-    def __init__(self) -> None:
+    def __init__(self, ai_player: Player = None, ponder: bool = False) -> None:
         pg.init()
         self.__model = ChessModel()
-        self._screen = pg.display.set_mode((800, 600))
+        # The AI searches on a worker thread, so the window keeps responding while it thinks. Without an AI player
+        # both sides are played by hand.
+        self._ai_player = ai_player
+        self._ai = AIWorker(lambda reply: pg.event.post(pg.event.Event(AI_MOVE_EVENT, reply=reply)), AI_TIME_LIMIT,
+                            ponder=ponder)
+        self._ai_request = None
+        self._screen = pg.display.set_mode(WINDOW_SIZE)
         pg.display.set_caption("Laker Chess")
-        self._ui_manager = gui.UIManager((800, 600))
+        self._renderer = BoardRenderer(self._screen, GUI.sprites)
+        self._ui_manager = gui.UIManager(WINDOW_SIZE)
         self._side_box = gui.elements.UITextBox('<b>Laker Chess</b><br /><br />White moves first.<br />',
                                                 relative_rect=pg.Rect((500, 100), (400, 500)),
                                                 manager=self._ui_manager)
@@ -41,35 +44,40 @@ class GUI:
         self._restart_button = gui.elements.UIButton(relative_rect=pg.Rect((600, 50), (100, 50)),
                                                      text='Reset',
                                                      manager=self._ui_manager)
+        self._ponder_button = gui.elements.UIButton(relative_rect=pg.Rect((500, 50), (100, 50)),
+                                                    text=self.__ponder_text__(),
+                                                    manager=self._ui_manager)
+        if ai_player is None:
+            self._ponder_button.disable()
         self._piece_selected = False
         self._first_selected = (0, 0)
         self._second_selected = (0, 0)
 
     @classmethod
     def load_images(cls):
-        def load_image(color, ptype):
-            SS = pg.image.load('./images/pieces.png')
-            a = 105
-            surf = pg.Surface((a, a), pg.SRCALPHA)
-            surf.blit(SS, (0, 0), pg.rect.Rect(a * ptype.value, color.value * a, a, a))
-            surf_scaled = pg.transform.scale(surf, (IMAGE_SIZE, IMAGE_SIZE))
-            return surf_scaled
-
-        cls.white_sprites = {}
-        cls.black_sprites = {}
-        for st in SpriteType:
-            cls.white_sprites[st.name] = load_image(SpriteColor.WHITE, st)
-            cls.black_sprites[st.name] = load_image(SpriteColor.BLACK, st)
+        # Sprites indexed by the piece's side and type code
+        cls.sprites = load_sprites('./images/pieces.png')
 
     def run_game(self) -> None:
         running = True
-        time_delta = 0
         clock = pg.time.Clock()
+        self._screen.fill(BACKGROUND)
+        self._ui_manager.draw_ui(self._screen)
+        pg.display.flip()
         while running:
-            for event in pg.event.get():
+            events = pg.event.get()
+            if not events:
+                # Sleep until something happens rather than redrawing an unchanged window at frame rate
+                event = pg.event.wait(IDLE_WAIT)
+                if event.type != pg.NOEVENT:
+                    events = [event] + pg.event.get()
+            for event in events:
+                if event.type in _EXPOSE_EVENTS:
+                    self._renderer.invalidate()
                 if event.type == pg.QUIT:
                     running = False
-                if event.type == pg.MOUSEBUTTONDOWN:
+                # The board belongs to the AI from the start of its turn until its reply is played
+                if event.type == pg.MOUSEBUTTONDOWN and not self.__ai_turn__():
                     x, y = pg.mouse.get_pos()
                     y, x = self.__get_coords__(y, x)
                     # Potential Issue
@@ -95,82 +103,104 @@ class GUI:
 
                         else:
                             self._side_box.append_html_text(f'{self.__model.messageCode}<br />')
-                        incheck = self.__model.in_check(self.__model.current_player)
-                        complete = self.__model.is_complete()
-                        stalemate = self.__model.one_vs_one()
-
-                        if incheck:
-                            player_color = self.__model.current_player.name
-                            if complete:
-                                self._side_box.append_html_text(f'{player_color} is in CHECKMATE!<br />GAME OVER!')
-                            else:
-                                self._side_box.append_html_text(f'{player_color} is in CHECK!<br />')
-                        elif complete:
-                            self._side_box.append_html_text(f'Stalemate!<br />GAME OVER!')
+                        self.__report_status__()
                         self._piece_selected = False
                     else:
                         self._piece_selected = False
+                if event.type == AI_MOVE_EVENT and event.reply.request == self._ai_request:
+                    # Replies to cancelled requests can still be queued, so only the latest one is played
+                    self._ai_request = None
+                    move = event.reply.move
+                    # A reply for any other position is dropped, and the AI is asked again below
+                    if (move is not None and event.reply.position == self.__model.to_bytes()
+                            and self.__model.is_valid_move(move)):
+                        piece = self.__model.piece_at(move.from_row, move.from_col)
+                        self.__model.move(move)
+                        self._side_box.append_html_text(f'AI moved {piece}<br />')
+                        if event.reply.ponder is not None:
+                            self._side_box.append_html_text(f'AI expects {event.reply.ponder}<br />')
+                        self.__report_status__()
                 if event.type == gui.UI_BUTTON_PRESSED:
                     if event.ui_element == self._restart_button:
+                        self.__cancel_ai__()
                         self.__model = ChessModel()
                         self._side_box.set_text("Restarting game...<br />")
+                    if event.ui_element == self._ponder_button:
+                        # Thinking on the player's time only starts after the AI's next move
+                        self._ai.ponder = not self._ai.ponder
+                        if not self._ai.ponder and self._ai_request is None:
+                            self._ai.cancel()
+                        self._ponder_button.set_text(self.__ponder_text__())
                     if event.ui_element == self._undo_button:
+                        self.__cancel_ai__()
                         try:
                             self.__model.undo()
+                            # Take back the AI's reply together with the player's move, so the player moves next
+                            if self.__model.current_player == self._ai_player:
+                                self.__model.undo()
                             self._side_box.append_html_text('Undoing move.<br />')
                         except UndoException as e:
                             self._side_box.append_html_text(f'{e}<br />')
 
-            #if self.__model.current_player == Player.BLACK:  # AI plays as black
-            # ai_move = self.__model.ai_move()
-            # if ai_move:
-            #     self.__model.move(ai_move)
+                self._ui_manager.process_events(event)
 
-            self._ui_manager.process_events(event)
+            if (self.__model.current_player == self._ai_player and self._ai_request is None
+                    and not self.__model.status().game_over):
+                self._piece_selected = False
+                self._ai_request = self._ai.request(self.__model)
 
-            self._screen.fill((255, 255, 255))
-            self.__draw_board__()
-            self._ui_manager.draw_ui(self._screen)
+            time_delta = clock.tick(FRAME_RATE) / 1000.0
             self._ui_manager.update(time_delta)
-
-            pg.display.flip()
-            time_delta = clock.tick(30) / 1000.0
+            rects = self.__draw_board__()
+            if events:
+                self._screen.fill(BACKGROUND, PANEL_RECT)
+                self._ui_manager.draw_ui(self._screen)
+                rects.append(PANEL_RECT)
+            if rects:
+                pg.display.update(rects)
+        self._ai.close()
 
     def __get_coords__(self, y, x):
         grid_x = x // IMAGE_SIZE
         grid_y = y // IMAGE_SIZE
         return grid_y, grid_x
 
-    def __draw_board__(self) -> None:
-        count = 0
-        color = (255, 255, 255)
-        for x in range(0, 8):
-            for y in range(0, 8):
-                if count % 2 == 0:
-                    color = (255, 255, 255)
-                else:
-                    color = (127, 127, 127)
-                count = count + 1
-                pg.draw.rect(self._screen, color, pg.rect.Rect(x * IMAGE_SIZE, y * IMAGE_SIZE, IMAGE_SIZE, IMAGE_SIZE))
-                if self._piece_selected and (y, x) == self._first_selected:
-                    pg.draw.rect(self._screen, (255, 0, 0),
-                                 pg.rect.Rect(x * IMAGE_SIZE, y * IMAGE_SIZE, IMAGE_SIZE, IMAGE_SIZE), 2)
-                draw_piece = self.__model.piece_at(y, x)
-                if draw_piece is not None:
-                    if draw_piece.player == Player.BLACK:
-                        d = GUI.black_sprites
-                    else:
-                        d = GUI.white_sprites
-                    self._screen.blit(copy.deepcopy(d[draw_piece.type()]), (x * IMAGE_SIZE, y * IMAGE_SIZE))
-            count = count + 1
-        pg.draw.line(self._screen, (0, 0, 0), (0, 840), (840, 840))
-        pg.draw.line(self._screen, (0, 0, 0), (840, 840), (840, 0))
-        GUI.first = False
+    def __ponder_text__(self):
+        return 'Ponder: On' if self._ai.ponder else 'Ponder: Off'
+
+    def __ai_turn__(self):
+        return self._ai_request is not None or self.__model.current_player == self._ai_player
+
+    def __cancel_ai__(self):
+        # Stops the AI thinking about a position that is about to change
+        self._ai.cancel()
+        self._ai_request = None
+
+    def __report_status__(self):
+        status = self.__model.status()
+        player_color = self.__model.current_player.name
+        if status == GameStatus.Checkmate:
+            self._side_box.append_html_text(f'{player_color} is in CHECKMATE!<br />GAME OVER!')
+        elif status == GameStatus.Check:
+            self._side_box.append_html_text(f'{player_color} is in CHECK!<br />')
+        elif status.game_over:
+            self._side_box.append_html_text(f'{status}<br />GAME OVER!')
+
+    def __draw_board__(self) -> list:
+        # Repaints the squares changed by a move, an undo, a reset or a new selection
+        selected = self._first_selected if self._piece_selected else None
+        return self._renderer.render(self.__model.board, selected)
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Play Laker Chess.')
+    parser.add_argument('--ai', choices=[player.name.lower() for player in Player],
+                        help='side the computer plays; both sides are played by hand if left out')
+    parser.add_argument('--ponder', action='store_true', help='let the computer think on the opponent\'s time')
+    args = parser.parse_args()
+
     GUI.load_images()
-    g = GUI()
+    g = GUI(Player[args.ai.upper()] if args.ai else None, args.ponder)
     g.run_game()
 
 
@@ -8,8 +8,29 @@ from knight import Knight
 from bishop import Bishop
 from queen import Queen
 from king import King
+from bitboard import BitBoard, square, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+from attacks import is_square_attacked, piece_attacks
+from zobrist import PIECE_KEYS, SIDE_KEY
+from search import Searcher
+from position_cache import PositionCache
+from evaluation import Evaluation, DEFAULT_EVALUATION, PHASE_WEIGHTS
 import random
 
+# Piece class of each type code
+_PIECE_CLASSES = (Pawn, Knight, Bishop, Rook, Queen, King)
+_OPPONENT = {Player.WHITE: Player.BLACK, Player.BLACK: Player.WHITE}
+# Material of each piece type, indexed like the bitboards
+_MATERIAL_VALUES = (1, 3, 3, 5, 9, 0)
+# FEN letter of each piece, indexed by side and type code
+_FEN_LETTERS = ('pnbrqk', 'PNBRQK')
+_FEN_PIECES = {letter: _PIECE_CLASSES[code](Player(side))
+               for side, letters in enumerate(_FEN_LETTERS) for code, letter in enumerate(letters)}
+_FEN_PLAYERS = {'w': Player.WHITE, 'b': Player.BLACK}
+# Squares of the same color as a8, where row + col is even
+_LIGHT_SQUARES = sum(1 << sq for sq in range(64) if (sq // 8 + sq % 8) % 2 == 0)
+# The game has no castling or en passant, so those fields are always empty
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1'
+
 
 class MoveValidity(Enum):
     Valid = 1
@@ -32,35 +53,231 @@ class MoveValidity(Enum):
             return 'Test'
 
 
+class GameStatus(Enum):
+    Ongoing = 1
+    Check = 2
+    Checkmate = 3
+    Stalemate = 4
+    InsufficientMaterial = 5
+
+    def __str__(self):
+        if self.value == 2:
+            return 'Check!'
+
+        if self.value == 3:
+            return 'Checkmate!'
+
+        if self.value == 4:
+            return 'Stalemate!'
+
+        if self.value == 5:
+            return 'Draw -- insufficient material.'
+
+        return 'Game in progress.'
+
+    @property
+    def game_over(self) -> bool:
+        """
+        Property to get whether the status ends the game.
+
+        Returns:
+            bool: True for checkmate, stalemate and insufficient material, False otherwise.
+        """
+        return self.value >= 3
+
+
 class UndoException(Exception):
     pass
 
 
+class MoveRecord:
+    """
+    The changes a move made to the board, which is all undo needs to take it back.
+
+    Attributes:
+        move (Move): The move that was made.
+        piece (ChessPiece): The piece that stood on the source square.
+        captured (ChessPiece): The piece that stood on the destination square, or None.
+        placed (ChessPiece): The piece left on the destination square, which differs from piece on a promotion.
+        player (Player): The player whose turn it was before the move.
+    """
+    __slots__ = ('move', 'piece', 'captured', 'placed', 'player')
+
+    def __init__(self, move, piece, captured, placed, player):
+        self.move = move
+        self.piece = piece
+        self.captured = captured
+        self.placed = placed
+        self.player = player
+
+
 class ChessModel:
-    def __init__(self):
+    def __init__(self, cache_size: int = 1024, evaluation: Evaluation = None):
         """
         Initialize the ChessModel class. This sets up the initial board with pieces in starting positions,
         sets the current player to white, defines board dimensions, initializes the message code to 'Valid',
         and prepares an empty move history.
+
+        Parameters:
+            cache_size (int): The number of positions whose legal moves and check status are remembered, or 0 to
+                remember none.
+            evaluation (Evaluation): The piece values and piece-square tables positions are scored with, or None
+                for the defaults.
         """
-        self.board = [[], [], [], [], [], [], [], []]
-        self.board[0] = [Rook(Player.BLACK), Knight(Player.BLACK), Bishop(Player.BLACK), Queen(Player.BLACK),
+        self.__board = [[], [], [], [], [], [], [], []]
+        self.__board[0] = [Rook(Player.BLACK), Knight(Player.BLACK), Bishop(Player.BLACK), Queen(Player.BLACK),
                          King(Player.BLACK), Bishop(Player.BLACK), Knight(Player.BLACK), Rook(Player.BLACK)]
-        self.board[1] = [Pawn(Player.BLACK), Pawn(Player.BLACK), Pawn(Player.BLACK), Pawn(Player.BLACK),
+        self.__board[1] = [Pawn(Player.BLACK), Pawn(Player.BLACK), Pawn(Player.BLACK), Pawn(Player.BLACK),
                          Pawn(Player.BLACK), Pawn(Player.BLACK), Pawn(Player.BLACK), Pawn(Player.BLACK)]
-        self.board[2] = [None, None, None, None, None, None, None, None]
-        self.board[3] = [None, None, None, None, None, None, None, None]
-        self.board[4] = [None, None, None, None, None, None, None, None]
-        self.board[5] = [None, None, None, None, None, None, None, None]
-        self.board[6] = [Pawn(Player.WHITE), Pawn(Player.WHITE), Pawn(Player.WHITE), Pawn(Player.WHITE),
+        self.__board[2] = [None, None, None, None, None, None, None, None]
+        self.__board[3] = [None, None, None, None, None, None, None, None]
+        self.__board[4] = [None, None, None, None, None, None, None, None]
+        self.__board[5] = [None, None, None, None, None, None, None, None]
+        self.__board[6] = [Pawn(Player.WHITE), Pawn(Player.WHITE), Pawn(Player.WHITE), Pawn(Player.WHITE),
                          Pawn(Player.WHITE), Pawn(Player.WHITE), Pawn(Player.WHITE), Pawn(Player.WHITE)]
-        self.board[7] = [Rook(Player.WHITE), Knight(Player.WHITE), Bishop(Player.WHITE), Queen(Player.WHITE),
+        self.__board[7] = [Rook(Player.WHITE), Knight(Player.WHITE), Bishop(Player.WHITE), Queen(Player.WHITE),
                          King(Player.WHITE), Bishop(Player.WHITE), Knight(Player.WHITE), Rook(Player.WHITE)]
         self.__player = Player.WHITE
         self.__nrows = 8
         self.__ncols = 8
         self.__message_code = MoveValidity.Valid
         self.__moves_history = []
+        self.__searcher = None
+        self.__book = None
+        self.__tablebase = None
+        self.__cache = PositionCache(cache_size)
+        self.__use_evaluation(evaluation if evaluation is not None else DEFAULT_EVALUATION)
+        # Move counters of the position the history starts from, as read from FEN
+        self.__start_halfmove = 0
+        self.__start_ply = 0
+
+        # Track the starting pieces through __place so the bitboards, piece lists and counters match the board
+        layout = self.__board
+        self.__board = [[None] * self.__ncols for _ in range(self.__nrows)]
+        self.__reset_tracking()
+        for row in range(self.__nrows):
+            for col in range(self.__ncols):
+                if layout[row][col] is not None:
+                    self.__place(row, col, layout[row][col])
+
+    @property
+    def board(self):
+        """
+        Property to get the board as a list of 8 rows of 8 pieces. The rows must not be modified directly, use
+        set_piece so the bitboards stay in sync.
+
+        Returns:
+            list: The board as a list of lists.
+        """
+        return self.__board
+
+    @property
+    def bitboard(self):
+        """
+        Property to get the bitboards backing the board.
+
+        Returns:
+            BitBoard: The bitboards of the current position.
+        """
+        return self.__bitboard
+
+    @property
+    def position_cache(self):
+        """
+        Property to get the cache of legal moves and check status, keyed by the Zobrist key of the position.
+
+        Returns:
+            PositionCache: The cache of analyzed positions.
+        """
+        return self.__cache
+
+    @property
+    def evaluation(self):
+        """
+        Property to get the piece values and piece-square tables positions are scored with.
+
+        Returns:
+            Evaluation: The evaluation of the model.
+        """
+        return self.__evaluation
+
+    @evaluation.setter
+    def evaluation(self, new):
+        """
+        Setter for the evaluation. The scores of the position are worked out again with the new tables.
+
+        Parameters:
+            new (Evaluation): The new evaluation.
+        """
+        self.__use_evaluation(new)
+        self.__middlegame, self.__endgame, self.__phase = new.score_board(self.__board)
+
+    def __use_evaluation(self, evaluation: Evaluation):
+        self.__evaluation = evaluation
+        self.__middlegame_scores = evaluation.middlegame_scores
+        self.__endgame_scores = evaluation.endgame_scores
+
+    @property
+    def opening_book(self):
+        """
+        Property to get the opening book ai_move plays from before it searches.
+
+        Returns:
+            OpeningBook: The book, or None if the model has none.
+        """
+        return self.__book
+
+    @opening_book.setter
+    def opening_book(self, new):
+        """
+        Setter for the opening book.
+
+        Parameters:
+            new (OpeningBook): The book to play from, or None to always search.
+        """
+        self.__book = new
+
+    @property
+    def tablebase(self):
+        """
+        Property to get the endgame tables ai_move and its search consult once few pieces are left.
+
+        Returns:
+            Tablebase: The tables, or None if the model has none.
+        """
+        return self.__tablebase
+
+    @tablebase.setter
+    def tablebase(self, new):
+        """
+        Setter for the endgame tables.
+
+        Parameters:
+            new (Tablebase): The tables to consult, or None to always search.
+        """
+        self.__tablebase = new
+
+    @property
+    def searcher(self):
+        """
+        Property to get the searcher ai_move runs. It is created on the first search that needs it.
+
+        Returns:
+            Searcher: The searcher, or None if the model has not searched yet.
+        """
+        return self.__searcher
+
+    @searcher.setter
+    def searcher(self, new):
+        """
+        Setter for the searcher. Models of the same game can share one, so its transposition table carries over.
+        A ParallelSearcher splits the search across worker processes instead.
+
+        Parameters:
+            new (Searcher): The searcher to run, such as a Searcher or a ParallelSearcher, or None to create a
+                Searcher on the next search.
+        """
+        self.__searcher = new
 
     @property
     def nrows(self):
@@ -100,8 +317,21 @@ class ChessModel:
         Parameters:
             new (Player): The new current player.
         """
+        if new != self.__player:
+            self.__key ^= SIDE_KEY
         self.__player = new
 
+    @property
+    def zobrist_key(self):
+        """
+        Property to get the Zobrist key of the position, covering the piece placement and the player to move. It
+        is updated incrementally as pieces are placed and moves are made or undone.
+
+        Returns:
+            int: The 64-bit key of the position.
+        """
+        return self.__key
+
     @property
     def messageCode(self):
         """
@@ -128,8 +358,80 @@ class ChessModel:
         """
         for x in range(self.nrows):
             for y in range(self.ncols):
-                self.board[x][y] = None
+                self.__board[x][y] = None
+        self.__reset_tracking()
+
+    def __reset_tracking(self):
+        """
+        Empties the bitboards, piece lists, king squares, material counters, evaluation scores and Zobrist key kept
+        alongside the board.
+        """
+        self.__key = SIDE_KEY if self.__player == Player.BLACK else 0
+        self.__bitboard = BitBoard()
+        self.__piece_squares = [set(), set()]
+        self.__king_squares = [None, None]
+        self.__material = [0, 0]
+        self.__piece_count = [0, 0]
+        # Middlegame and endgame scores for white and the game phase, kept as pieces are placed and removed
+        self.__middlegame = 0
+        self.__endgame = 0
+        self.__phase = 0
+        # Squares attacked by the piece on each square, the union for each player, and the squares changed since
+        # they were last brought up to date
+        self.__attacks = [0] * 64
+        self.__attack_maps = [0, 0]
+        self.__dirty = 0
+
+    def piece_squares(self, p: Player) -> list:
+        """
+        Lists the squares holding the pieces of a player.
 
+        Parameters:
+            p (Player): The player whose pieces are listed.
+
+        Returns:
+            list: A list of (row, col) tuples.
+        """
+        return [divmod(sq, 8) for sq in sorted(self.__piece_squares[p.value])]
+
+    def king_location(self, p: Player):
+        """
+        Finds the king of a player.
+
+        Parameters:
+            p (Player): The owner of the king.
+
+        Returns:
+            tuple: The (row, col) of the king, or None if the player has no king on the board.
+        """
+        king_sq = self.__king_squares[p.value]
+        if king_sq is None:
+            return None
+        return divmod(king_sq, 8)
+
+    def material(self, p: Player) -> int:
+        """
+        Sums the material of a player's pieces, counting pawns as 1, knights and bishops as 3, rooks as 5 and
+        queens as 9.
+
+        Parameters:
+            p (Player): The player whose material is counted.
+
+        Returns:
+            int: The material of the player.
+        """
+        return self.__material[p.value]
+
+    def evaluate(self) -> int:
+        """
+        Scores the position for the player to move from the running middlegame and endgame scores, blended by game
+        phase. The scores are kept up to date as pieces move, so this does not look at the board.
+
+        Returns:
+            int: The score in centipawns, positive when the player to move is ahead.
+        """
+        score = Evaluation.blend(self.__middlegame, self.__endgame, self.__phase)
+        return score if self.__player == Player.WHITE else -score
 
     def copy_board(self):
         """
@@ -139,50 +441,229 @@ class ChessModel:
             list: A copy of the current board as a list of lists.
         """
         new_board = []
-        for row in self.board:
+        for row in self.__board:
             new_row = []
             for col in row:
                 new_row.append(col)
             new_board.append(new_row)
         return new_board
 
-    def one_vs_one(self):
-        # Check if only kings are left to end the game
+    def to_bytes(self) -> bytes:
+        """
+        Packs the position into 65 bytes: one piece code per square followed by the player to move. The move
+        history is not included.
+
+        Returns:
+            bytes: The packed position.
+        """
+        codes = bytearray(65)
         for row in range(self.nrows):
             for col in range(self.ncols):
-                if self.piece_at(row, col) is not None:
-                    if self.piece_at(row,col) and self.piece_at(row,col).type() != "King":
-                        return False
-        return True
+                piece = self.__board[row][col]
+                if piece is not None:
+                    codes[row * 8 + col] = piece.side * 6 + piece.code + 1
+        codes[64] = self.__player.value
+        return bytes(codes)
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        """
+        Builds a model from a position packed by to_bytes.
+
+        Parameters:
+            data (bytes): The packed position.
+
+        Returns:
+            ChessModel: A model with the packed position and an empty move history.
+
+        Raises:
+            ValueError: If the data is not a packed position.
+        """
+        if len(data) != 65 or data[64] > 1 or max(data[:64]) > 12:
+            raise ValueError('Not a packed chess position')
+        model = cls()
+        model.clear_board()
+        for sq in range(64):
+            if data[sq]:
+                side, kind = divmod(data[sq] - 1, 6)
+                model.set_piece(sq // 8, sq % 8, _PIECE_CLASSES[kind](Player(side)))
+        model.current_player = Player(data[64])
+        return model
+
+    @classmethod
+    def from_fen(cls, fen: str):
+        """
+        Builds a model from a position in Forsyth-Edwards Notation.
+
+        Parameters:
+            fen (str): The position, as read by set_fen.
+
+        Returns:
+            ChessModel: A model with the position and an empty move history.
+
+        Raises:
+            ValueError: If the text is not a FEN position.
+        """
+        model = cls()
+        model.set_fen(fen)
+        return model
+
+    def set_fen(self, fen: str):
+        """
+        Replaces the position with one in Forsyth-Edwards Notation and empties the move history. The castling and
+        en passant fields are read but ignored since the game has neither, and the two move counters may be left
+        out. The model is left unchanged if the text is not valid.
+
+        Parameters:
+            fen (str): The position, such as START_FEN.
+
+        Raises:
+            ValueError: If the text is not a FEN position.
+        """
+        fields = fen.split()
+        if not 4 <= len(fields) <= 6 or fields[1] not in _FEN_PLAYERS:
+            raise ValueError(f'Not a FEN position: {fen!r}')
+        rows = fields[0].split('/')
+        if len(rows) != 8:
+            raise ValueError(f'Not a FEN position: {fen!r}')
+        try:
+            halfmove = int(fields[4]) if len(fields) > 4 else 0
+            fullmove = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError(f'Not a FEN position: {fen!r}') from None
+
+        # Read every square before changing anything
+        placed = []
+        for row, text in enumerate(rows):
+            col = 0
+            for char in text:
+                if '1' <= char <= '8':
+                    col += ord(char) - 48
+                else:
+                    piece = _FEN_PIECES.get(char)
+                    if piece is None or col > 7:
+                        raise ValueError(f'Not a FEN position: {fen!r}')
+                    placed.append((row, col, piece))
+                    col += 1
+            if col != 8:
+                raise ValueError(f'Not a FEN position: {fen!r}')
+
+        self.__player = _FEN_PLAYERS[fields[1]]
+        self.clear_board()
+        for row, col, piece in placed:
+            self.__place(row, col, piece)
+        self.__moves_history = []
+        self.__message_code = MoveValidity.Valid
+        self.__start_halfmove = max(halfmove, 0)
+        self.__start_ply = max(fullmove - 1, 0) * 2 + (self.__player == Player.BLACK)
+
+    def to_fen(self) -> str:
+        """
+        Writes the position in Forsyth-Edwards Notation. The castling and en passant fields are always empty. The
+        move counters continue from those the position was read with.
+
+        Returns:
+            str: The position as a FEN string.
+        """
+        rows = []
+        for row in self.__board:
+            text = ''
+            empty = 0
+            for piece in row:
+                if piece is None:
+                    empty += 1
+                else:
+                    if empty:
+                        text += str(empty)
+                        empty = 0
+                    text += _FEN_LETTERS[piece.side][piece.code]
+            if empty:
+                text += str(empty)
+            rows.append(text)
+
+        # Plies since the last capture or pawn move
+        halfmove = 0
+        for record in reversed(self.__moves_history):
+            if record.captured is not None or (record.piece is not None and record.piece.code == PAWN):
+                break
+            halfmove += 1
+        else:
+            halfmove += self.__start_halfmove
+        fullmove = (self.__start_ply + len(self.__moves_history)) // 2 + 1
+        side = 'w' if self.__player == Player.WHITE else 'b'
+        return f"{'/'.join(rows)} {side} - - {halfmove} {fullmove}"
+
+    def one_vs_one(self):
+        # Check if only kings are left to end the game
+        return self.__piece_count[0] == 0 and self.__piece_count[1] == 0
+
+    def insufficient_material(self) -> bool:
+        """
+        Checks if neither player can ever checkmate: no pawns, rooks or queens are left, and either there is at
+        most one knight or bishop on the board, or every minor piece is a bishop on squares of one color.
+
+        Returns:
+            bool: True if the position is a draw by insufficient material, False otherwise.
+        """
+        white = self.__bitboard.pieces[Player.WHITE.value]
+        black = self.__bitboard.pieces[Player.BLACK.value]
+        if white[PAWN] | black[PAWN] | white[ROOK] | black[ROOK] | white[QUEEN] | black[QUEEN]:
+            return False
+        if self.__piece_count[0] + self.__piece_count[1] <= 1:
+            return True
+        bishops = white[BISHOP] | black[BISHOP]
+        if white[KNIGHT] | black[KNIGHT]:
+            return False
+        return not bishops & _LIGHT_SQUARES or not bishops & ~_LIGHT_SQUARES
+
+    def status(self) -> GameStatus:
+        """
+        Finds the state of the game for the player to move in one pass: insufficient material first, then check,
+        then whether any legal move exists. The search for a legal move stops at the first one found, and the
+        result is cached for the position.
+
+        Returns:
+            GameStatus: Ongoing, Check, Checkmate, Stalemate or InsufficientMaterial.
+        """
+        info = self.__cache.lookup(self.__key)
+        if info.status is not None:
+            return info.status
+        if self.insufficient_material():
+            info.status = GameStatus.InsufficientMaterial
+            return info.status
+        if info.check is None:
+            info.check = self.__king_in_attack_map(self.__player)
+        if info.moves is not None:
+            has_move = len(info.moves) > 0
+        else:
+            has_move = self.__has_legal_move()
+        if has_move:
+            info.status = GameStatus.Check if info.check else GameStatus.Ongoing
+        else:
+            info.status = GameStatus.Checkmate if info.check else GameStatus.Stalemate
+        return info.status
+
+    def __has_legal_move(self) -> bool:
+        # Stops at the first move that does not leave the king in check
+        for sq in tuple(self.__piece_squares[self.__player.value]):
+            row, col = divmod(sq, 8)
+            piece = self.__board[row][col]
+            for move in piece.possible_moves(row, col, self.__board):
+                if not self.__exposes_king(move, piece):
+                    return True
+        return False
 
     def is_complete(self) -> bool:
         """
-        Check if the game is complete by checkmate.
+        Check if the game is complete by checkmate, or because only the kings are left. Use status to tell
+        stalemate and other draws apart from a game that goes on.
 
         Returns:
             bool: True if the game is complete, False otherwise.
         """
         if self.one_vs_one():
             return True
-        if self.in_check(self.current_player):
-
-            # Check if any legal move can get the king out of check
-            for row in range(self.nrows):
-                for col in range(self.ncols):
-                    piece = self.piece_at(row, col)
-                    if piece and piece.player == self.current_player:
-                        for dest_row in range(self.nrows):
-                            for dest_col in range(self.ncols):
-                                move = Move(row, col, dest_row, dest_col)
-                                if piece.is_valid_move(move, self.board):
-                                    temp_board = self.copy_board()
-                                    temp_board[dest_row][dest_col] = temp_board[row][col]
-                                    temp_board[row][col] = None
-                                    if not self.in_check_simulation(self.current_player, temp_board):
-                                        return False  # Found a legal move, not checkmate
-            return True  # No legal moves, it's checkmate
-
-        return False
+        return self.status() == GameStatus.Checkmate
 
     def is_valid_move(self, move: Move) -> bool:
         """
@@ -194,6 +675,16 @@ class ChessModel:
         Returns:
             bool: True if the move is valid, False otherwise.
         """
+        # Legal moves of the player to move are answered from the cache, anything else is checked in full to find
+        # the reason it is invalid
+        if self.__cache.size:
+            info = self.__legal_moves()
+            if info.legal is None:
+                info.legal = frozenset(info.moves)
+            if move in info.legal:
+                self.__message_code = MoveValidity.Valid
+                return True
+
         moving_piece = self.piece_at(move.from_row, move.from_col)
 
         # Check if there's a piece at the source location
@@ -202,17 +693,12 @@ class ChessModel:
             return False
 
         # Check if the move is valid for the piece
-        if not moving_piece.is_valid_move(move, self.board):
+        if not moving_piece.is_valid_move(move, self.__board):
             self.__message_code = MoveValidity.Invalid
             return False
 
-        # Simulate the move
-        temp_board = self.copy_board()
-        temp_board[move.to_row][move.to_col] = moving_piece
-        temp_board[move.from_row][move.from_col] = None
-
         # Check if the move results in the player's own king being in check
-        if self.in_check_simulation(moving_piece.player, temp_board):
+        if self.__exposes_king(move, moving_piece):
             # Determine the correct message code based on whether the king is already in check
             if self.in_check(moving_piece.player):
                 self.__message_code = MoveValidity.StayingInCheck
@@ -235,28 +721,103 @@ class ChessModel:
         Returns:
             bool: True if the player is in check, False otherwise.
         """
-        king_position = None
+        if p is not self.__player:
+            return self.__king_in_attack_map(p)
+        info = self.__cache.lookup(self.__key)
+        if info.check is None:
+            info.check = self.__king_in_attack_map(p)
+        return info.check
+
+    def __king_in_attack_map(self, p: Player) -> bool:
+        king_sq = self.__king_squares[p.value]
+        if king_sq is None:
+            return False
+        return bool(self.attack_map(_OPPONENT[p]) >> king_sq & 1)
 
-        # Find the king's position
-        for row in range(self.nrows):
-            for col in range(self.ncols):
-                piece = self.piece_at(row, col)
-                if piece and piece.type() == 'King' and piece.player == p:
-                    king_position = (row, col)
-                    break
+    def __king_attacked(self, p: Player) -> bool:
+        """
+        Checks if the given player's king is attacked, without consulting the cache or the attack maps. Looking
+        outwards from the king is cheaper than bringing the maps up to date for a position that is about to be
+        taken back, as when testing moves for legality.
 
-        king_row, king_col = king_position
+        Parameters:
+            p (Player): The owner of the king.
 
-        # Check if any opposing piece can move to the king's position
-        for row in range(self.nrows):
-            for col in range(self.ncols):
-                piece = self.piece_at(row, col)
-                if piece and piece.player != p:
-                    move = Move(row, col, king_row, king_col)
-                    if piece.is_valid_move(move, self.board):
-                        return True  # The king is in check
+        Returns:
+            bool: True if the king is attacked, False otherwise or if the player has no king.
+        """
+        king_sq = self.__king_squares[p.value]
+        if king_sq is None:
+            return False
+        return is_square_attacked(self.__bitboard, king_sq, _OPPONENT[p])
 
-        return False  # The king is not in check
+    def attack_map(self, p: Player) -> int:
+        """
+        Finds every square a player's pieces attack, including squares holding pieces of either color. The maps
+        are kept between calls; only the pieces on squares that changed since, and the sliders whose attacks
+        reached those squares, are recomputed.
+
+        Parameters:
+            p (Player): The attacking player.
+
+        Returns:
+            int: The bitboard of attacked squares.
+        """
+        if self.__dirty:
+            self.__update_attacks()
+        return self.__attack_maps[p.value]
+
+    def attacks_from(self, row: int, col: int) -> int:
+        """
+        Finds the squares the piece on a square attacks.
+
+        Parameters:
+            row (int): The row of the piece.
+            col (int): The column of the piece.
+
+        Returns:
+            int: The bitboard of attacked squares, or 0 if the square is empty.
+        """
+        if self.__board[row][col] is None:
+            return 0
+        if self.__dirty:
+            self.__update_attacks()
+        return self.__attacks[row * 8 + col]
+
+    def __update_attacks(self):
+        """
+        Brings the attack maps up to date with the squares changed by __place. A piece's attacks can only have
+        changed if it stands on a changed square or its attacks reached one, since a slider's rays end at the
+        first occupied square.
+        """
+        dirty = self.__dirty
+        self.__dirty = 0
+        attacks = self.__attacks
+        board = self.__board
+        occupied = self.__bitboard.occupied[0] | self.__bitboard.occupied[1]
+        maps = [0, 0]
+        for side in (0, 1):
+            combined = 0
+            for sq in self.__piece_squares[side]:
+                if dirty >> sq & 1 or attacks[sq] & dirty:
+                    attacks[sq] = piece_attacks(board[sq >> 3][sq & 7].code, side, sq, occupied)
+                combined |= attacks[sq]
+            maps[side] = combined
+        self.__attack_maps = maps
+
+    def is_square_attacked(self, row: int, col: int, p: Player) -> bool:
+        """
+        Checks if any piece of the given player attacks a square.
+
+        Parameters:
+            row (int): The row of the square.
+            col (int): The column of the square.
+            p (Player): The attacking player.
+
+        Returns:
+            bool: True if the square is attacked by the player, False otherwise.
+        """
+        return is_square_attacked(self.__bitboard, square(row, col), p)
 
     def in_check_simulation(self, player, board):
         """
@@ -269,40 +830,90 @@ class ChessModel:
         Returns:
             bool: True if the player is in check in the simulation, False otherwise.
         """
-        for row in range(self.nrows):
-            for col in range(self.ncols):
-                piece = board[row][col]
-                if piece and piece.player != player:
-                    for king_row in range(self.nrows):
-                        for king_col in range(self.ncols):
-                            king = board[king_row][king_col]
-                            if king and king.type() == 'King' and king.player == player:
-                                if piece.is_valid_move(Move(row, col, king_row, king_col), board):
-                                    return True
-        return False
+        if board is self.__board:
+            return self.in_check(player)
+        bitboard = BitBoard.from_board(board)
+        king_sq = bitboard.king_square(player)
+        if king_sq is None:
+            return False
+        return is_square_attacked(bitboard, king_sq, player.next())
+
+    def __exposes_king(self, move: Move, piece) -> bool:
+        """
+        Checks if making a move would leave the moving player's king attacked, by making and unmaking it in place.
+
+        Parameters:
+            move (Move): The move to test.
+            piece (ChessPiece): The piece standing on the move's source square.
+
+        Returns:
+            bool: True if the player's king would be attacked after the move, False otherwise.
+        """
+        record = self.__make(move)
+        exposed = self.__king_attacked(piece.player)
+        self.__unmake(record)
+        return exposed
 
     def move(self, move: Move):
         """
-        Executes a chess move on the board.
+        Executes a chess move on the board. Only the changes are recorded in the move history, so that undo can
+        take the move back in place.
 
         Parameters:
             move (Move): The move to be executed.
+
+        Returns:
+            MoveRecord: The record of the changes the move made.
         """
-        # Store the current game state before making the move
-        self.__moves_history.append((self.copy_board(), self.current_player))
+        record = self.__make(move)
+        self.__moves_history.append(record)
+        return record
 
-        # Take the player from move.from and set it equal to move.to
-        self.board[move.to_row][move.to_col] = self.board[move.from_row][move.from_col]
+    def __make(self, move: Move) -> MoveRecord:
+        """
+        Makes a move in place and switches to the next player, without touching the move history.
+
+        Parameters:
+            move (Move): The move to make.
 
-        # Take the player from move.from and set it to have no piece
-        self.board[move.from_row][move.from_col] = None
+        Returns:
+            MoveRecord: The record needed by __unmake to take the move back.
+        """
+        piece = self.__board[move.from_row][move.from_col]
+        captured = self.__board[move.to_row][move.to_col]
+        placed = piece
+
+        # Takes instance of pawn and checks if it is moving to the end of the board. If so then promote it to the
+        # piece named by the move, or to a queen.
+        if piece is not None and piece.code == PAWN and (move.to_row == 0 or move.to_row == 7):
+            if move.promotion is not None:
+                placed = _PIECE_CLASSES[move.promotion](piece.player)
+            else:
+                placed = Queen(piece.player)
 
-        # Takes instance of pawn and checks if it is moving to the end of the board. If so then promote it to a queen.
-        if isinstance(self.board[move.to_row][move.to_col], Pawn) and (move.to_row == 0 or move.to_row == 7):
-            self.board[move.to_row][move.to_col] = Queen(self.__player)
+        # Take the piece from move.from and put it on move.to, leaving move.from empty
+        self.__place(move.to_row, move.to_col, placed)
+        self.__place(move.from_row, move.from_col, None)
 
+        record = MoveRecord(move, piece, captured, placed, self.__player)
         # Switch to the next player
-        self.set_next_player()
+        self.__player = _OPPONENT[self.__player]
+        self.__key ^= SIDE_KEY
+        return record
+
+    def __unmake(self, record: MoveRecord):
+        """
+        Takes back a move made by __make.
+
+        Parameters:
+            record (MoveRecord): The record returned when the move was made.
+        """
+        move = record.move
+        self.__place(move.from_row, move.from_col, record.piece)
+        self.__place(move.to_row, move.to_col, record.captured)
+        if record.player is not self.__player:
+            self.__key ^= SIDE_KEY
+        self.__player = record.player
 
     def piece_at(self, row: int, col: int):
         """
@@ -316,7 +927,7 @@ class ChessModel:
             ChessPiece: The chess piece at the specified location, or None if no piece is present.
         """
         if 0 <= row < self.nrows and 0 <= col < self.ncols:
-            return self.board[row][col]
+            return self.__board[row][col]
         else:
             return None
 
@@ -346,11 +957,60 @@ class ChessModel:
         if row < 0 or col < 0:
             raise ValueError
 
-        self.board[row][col] = piece
+        self.__place(row, col, piece)
+
+    def __place(self, row: int, col: int, piece):
+        """
+        Puts a piece (or None) on a square, keeping the board, the bitboards, the piece lists, the king squares, the
+        material counters, the evaluation scores and the Zobrist key in sync. The square is marked as changed for the attack maps.
+
+        Parameters:
+            row (int): The row of the square.
+            col (int): The column of the square.
+            piece (ChessPiece): The piece to put on the square, or None to empty it.
+        """
+        sq = row * 8 + col
+        bit = 1 << sq
+        bitboard = self.__bitboard
+        old = self.__board[row][col]
+        self.__dirty |= bit
+        if old is not None:
+            side = old.side
+            kind = old.code
+            bitboard.pieces[side][kind] ^= bit
+            bitboard.occupied[side] ^= bit
+            self.__key ^= PIECE_KEYS[side][kind][sq]
+            self.__middlegame -= self.__middlegame_scores[side][kind][sq]
+            self.__endgame -= self.__endgame_scores[side][kind][sq]
+            self.__phase -= PHASE_WEIGHTS[kind]
+            self.__piece_squares[side].discard(sq)
+            if kind == KING:
+                if self.__king_squares[side] == sq:
+                    self.__king_squares[side] = bitboard.king_square(old.player)
+            else:
+                self.__material[side] -= _MATERIAL_VALUES[kind]
+                self.__piece_count[side] -= 1
+        self.__board[row][col] = piece
+        if piece is not None:
+            side = piece.side
+            kind = piece.code
+            bitboard.pieces[side][kind] |= bit
+            bitboard.occupied[side] |= bit
+            self.__key ^= PIECE_KEYS[side][kind][sq]
+            self.__middlegame += self.__middlegame_scores[side][kind][sq]
+            self.__endgame += self.__endgame_scores[side][kind][sq]
+            self.__phase += PHASE_WEIGHTS[kind]
+            self.__piece_squares[side].add(sq)
+            if kind == KING:
+                self.__king_squares[side] = sq
+            else:
+                self.__material[side] += _MATERIAL_VALUES[kind]
+                self.__piece_count[side] += 1
 
     def undo(self):
         """
-        Undoes the last move made in the game.
+        Undoes the last move made in the game. Only the squares the move changed are restored, so pieces placed
+        with set_piece after the move stay where they are.
 
         Raises:
             UndoException: If there are no moves left to undo.
@@ -358,41 +1018,93 @@ class ChessModel:
         if len(self.__moves_history) == 0:
             raise UndoException("No moves left to undo")
 
-        # Restore the game state to the most recent item in the moves history
-        self.board, self.current_player = self.__moves_history.pop()
+        # Take back the most recent move in the moves history
+        self.__unmake(self.__moves_history.pop())
 
     def generate_all_valid_moves(self):
         """
-        This method iterates over the entire chess board, finding all
-        possible moves for the pieces of the current player. It checks each
-        potential move for validity based on the rules of chess and the current
-        state of the board.
+        This method asks each piece of the current player for the moves it
+        can make, then keeps the ones that do not leave the player's king in
+        check.
 
         Returns:
             list: A list of Move objects representing all valid moves for the current player.
                   If no valid moves are available, returns an empty list.
         """
+        return list(self.__legal_moves().moves)
+
+    def __legal_moves(self):
+        """
+        Finds the cache entry of the position, generating its legal moves if they are not cached yet.
+
+        Returns:
+            PositionInfo: The entry of the position, with its moves filled in.
+        """
+        info = self.__cache.lookup(self.__key)
+        if info.moves is None:
+            info.moves = tuple(self.__generate_moves())
+        return info
+
+    def __generate_moves(self) -> list:
+        # Every move of the player to move that does not leave its king in check
         player = self.current_player
         valid_moves = []
-        for row in range(self.nrows):
-            for col in range(self.ncols):
-                piece = self.piece_at(row, col)
-                if piece and piece.player == player:
-                    for dest_row in range(self.nrows):
-                        for dest_col in range(self.ncols):
-                            move = Move(row, col, dest_row, dest_col)
-                            if piece.is_valid_move(move, self.board) and self.is_valid_move(move):
-                                valid_moves.append(move)
+        # Only the kings are left, so the game is over
+        if self.one_vs_one():
+            return valid_moves
+        for sq in tuple(self.__piece_squares[player.value]):
+            row, col = divmod(sq, 8)
+            piece = self.__board[row][col]
+            for move in piece.possible_moves(row, col, self.__board):
+                if not self.__exposes_king(move, piece):
+                    valid_moves.append(move)
         return valid_moves
 
-    def ai_move(self):
+    def ai_move(self, time_limit: float = None, node_limit: int = None, max_depth: int = None, stop_event=None):
         """
-        This method calls generate_all_valid_moves to get a list of all
-        valid moves available for the current player. It then selects one move
-        at random. If there are no valid moves available, the method will not execute any move.
+        This method picks a move for the current player and makes it. Without
+        limits it selects one of the moves from generate_all_valid_moves at
+        random. With a time, node or depth limit it runs an alpha-beta search
+        with iterative deepening and plays the best move of the last completed
+        depth. If the model has an opening book and the position is in it, a
+        book move is played instead, and if it has endgame tables covering the
+        position, the best move from the tables is. If there are no valid
+        moves available, the method will not execute any move.
+
+        Parameters:
+            time_limit (float): The wall-clock budget of the search in seconds.
+            node_limit (int): The budget of positions the search may visit.
+            max_depth (int): The deepest iteration the search may run.
+            stop_event (threading.Event): An event that cuts the search short when set, or None. The move of the
+                last completed depth is still made.
+
+        Returns:
+            Move: The move that was made, or None if there was no valid move.
         """
-        valid_moves = self.generate_all_valid_moves()
-        if valid_moves:
-            random_move = random.choice(valid_moves)
-            self.move(random_move)
+        if self.__book is not None:
+            chosen = self.__book.choose(self)
+            if chosen is not None:
+                self.move(chosen)
+                return chosen
+        if self.__tablebase is not None:
+            chosen = self.__tablebase.best_move(self)
+            if chosen is not None:
+                self.move(chosen)
+                return chosen
+        if time_limit is None and node_limit is None and max_depth is None:
+            valid_moves = self.generate_all_valid_moves()
+            if not valid_moves:
+                return None
+            chosen = random.choice(valid_moves)
+        else:
+            if self.__searcher is None:
+                self.__searcher = Searcher()
+            self.__searcher.tablebase = self.__tablebase
+            result = self.__searcher.search(self, max_depth=max_depth if max_depth is not None else 64,
+                                            time_limit=time_limit, node_limit=node_limit, stop_event=stop_event)
+            chosen = result.move
+            if chosen is None:
+                return None
+        self.move(chosen)
+        return chosen
 
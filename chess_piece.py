@@ -4,17 +4,46 @@ from player import Player
 
 
 class ChessPiece(ABC):
-    def __init__(self, player: Player):
-        self.__player = player
+    """
+    A piece is shared: there is one instance of every piece class for each player, so constructing a piece
+    returns the existing one and pieces cannot be changed. The type code and side are plain attributes so the
+    model can index its tables without calling type() or reading the player's enum value.
+
+    Attributes:
+        code (int): The type code of the piece, indexed like the bitboards (PAWN to KING).
+        side (int): The value of the player that owns the piece.
+    """
+    __slots__ = ('__player', 'side')
+    code = None
+    # The shared piece of every (class, player) pair
+    _instances = {}
+
+    def __new__(cls, player: Player):
+        piece = ChessPiece._instances.get((cls, player))
+        if piece is None:
+            piece = super().__new__(cls)
+            object.__setattr__(piece, '_ChessPiece__player', player)
+            object.__setattr__(piece, 'side', player.value)
+            ChessPiece._instances[(cls, player)] = piece
+        return piece
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Pieces are shared and cannot be changed')
+
+    def __reduce__(self):
+        # Unpickling looks up the shared piece instead of making a copy
+        return type(self), (self.__player,)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     @property
     def player(self):
         return self.__player
 
-    @player.setter
-    def player(self, new):
-        self.__player = new
-
     @abstractmethod
     def __str__(self) -> str:
         pass
@@ -23,6 +52,53 @@ class ChessPiece(ABC):
     def type(self) -> str:
         pass
 
+    @abstractmethod
+    def possible_moves(self, row: int, col: int, board: list) -> list:
+        """
+        Lists the moves this piece can make from a square, following the same rules as is_valid_move. Whether the
+        move leaves the player's king in check is not considered.
+
+        Parameters:
+            row (int): The row the piece stands on.
+            col (int): The column the piece stands on.
+            board (list): The board the piece stands on.
+
+        Returns:
+            list: A list of Move objects.
+        """
+        pass
+
+    def _step_moves(self, row: int, col: int, board: list, steps) -> list:
+        # Moves that jump straight to a square a fixed offset away, such as the knight and king
+        moves = []
+        for dr, dc in steps:
+            to_row = row + dr
+            to_col = col + dc
+            if 0 <= to_row < len(board) and 0 <= to_col < len(board[0]):
+                target = board[to_row][to_col]
+                if target is None:
+                    moves.append(Move(row, col, to_row, to_col))
+                elif target.player != self.player:
+                    moves.append(Move(row, col, to_row, to_col, capture=True))
+        return moves
+
+    def _slide_moves(self, row: int, col: int, board: list, directions) -> list:
+        # Moves along each direction until the edge of the board or the first piece, which may be captured
+        moves = []
+        for dr, dc in directions:
+            to_row = row + dr
+            to_col = col + dc
+            while 0 <= to_row < len(board) and 0 <= to_col < len(board[0]):
+                target = board[to_row][to_col]
+                if target is not None:
+                    if target.player != self.player:
+                        moves.append(Move(row, col, to_row, to_col, capture=True))
+                    break
+                moves.append(Move(row, col, to_row, to_col))
+                to_row += dr
+                to_col += dc
+        return moves
+
     def is_valid_move(self, move: Move, board: list) -> bool:
         """
         :param move:
@@ -1,7 +1,15 @@
+import copy
+import json
+import os
+import pickle
+import random
+import queue
+import tempfile
+import threading
 import unittest
 import pawn
 from pawn import Pawn
-from chess_model import ChessModel
+from chess_model import ChessModel, START_FEN
 from rook import Rook
 from king import King
 from bishop import Bishop
@@ -10,7 +18,28 @@ from queen import Queen
 from chess_piece import ChessPiece
 from player import Player
 from move import Move
-from chess_model import UndoException
+from chess_model import UndoException, MoveValidity, GameStatus
+from bitboard import BitBoard, square, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+from attacks import KNIGHT_ATTACKS, PAWN_ATTACKS, rook_attacks, piece_attacks
+from zobrist import hash_board, SIDE_KEY
+from transposition_table import TranspositionTable, Bound, ENTRY_BYTES
+from perft import perft, divide, check_reference
+from search import Searcher, MATE_BOUND, MATE_SCORE
+from parallel_search import ParallelSearcher
+from tournament import parse_engine, play_game, run_tournament, summarize
+from move import pack_moves, unpack_moves
+from fen import read_fens, write_fens
+from pgn import PgnReader, parse_san, square_name
+from position_cache import PositionCache
+from evaluation import Evaluation, DEFAULT_EVALUATION, MAX_PHASE
+from tablebase import Tablebase, parse_material, material_name, decode
+from ai_worker import AIWorker
+from opening_book import BookBuilder, OpeningBook, ENTRY, ENTRY_BYTES as BOOK_ENTRY_BYTES, MAX_WEIGHT
+try:
+    import numpy
+    import batch_eval
+except ImportError:
+    numpy = batch_eval = None
 
 
 class PawnTest(unittest.TestCase):
@@ -677,5 +706,1267 @@ class MoveTest(unittest.TestCase):
         pass
 
 
+class BitBoardTest(unittest.TestCase):
+    def test_initial_occupancy(self):
+        chess_model = ChessModel()
+        self.assertEqual(chess_model.bitboard.occupied[Player.BLACK.value], (1 << 16) - 1)
+        self.assertEqual(chess_model.bitboard.occupied[Player.WHITE.value], ((1 << 16) - 1) << 48)
+        self.assertEqual(chess_model.bitboard.king_square(Player.WHITE), square(7, 4))
+
+    def test_set_piece_updates_bitboards(self):
+        chess_model = ChessModel()
+        chess_model.set_piece(6, 0, Rook(Player.BLACK))
+        self.assertTrue(chess_model.bitboard.pieces[Player.BLACK.value][ROOK] & (1 << square(6, 0)))
+        self.assertFalse(chess_model.bitboard.pieces[Player.WHITE.value][PAWN] & (1 << square(6, 0)))
+
+    def test_undo_restores_bitboards(self):
+        chess_model = ChessModel()
+        before = chess_model.bitboard.copy()
+        chess_model.move(Move(6, 4, 4, 4))
+        chess_model.move(Move(1, 3, 3, 3))
+        chess_model.move(Move(4, 4, 3, 3))
+        chess_model.undo()
+        chess_model.undo()
+        chess_model.undo()
+        self.assertEqual(chess_model.bitboard.pieces, before.pieces)
+        self.assertEqual(chess_model.bitboard.occupied, before.occupied)
+
+    def test_from_board_matches_model(self):
+        chess_model = ChessModel()
+        chess_model.move(Move(6, 4, 4, 4))
+        self.assertEqual(BitBoard.from_board(chess_model.board).pieces, chess_model.bitboard.pieces)
+
+
+class AttackTableTest(unittest.TestCase):
+    def test_knight_attacks_corner(self):
+        self.assertEqual(KNIGHT_ATTACKS[square(0, 0)], (1 << square(1, 2)) | (1 << square(2, 1)))
+
+    def test_pawn_attacks_direction(self):
+        self.assertEqual(PAWN_ATTACKS[Player.WHITE.value][square(6, 0)], 1 << square(5, 1))
+        self.assertEqual(PAWN_ATTACKS[Player.BLACK.value][square(1, 0)], 1 << square(2, 1))
+
+    def test_rook_attacks_stop_at_blocker(self):
+        occupied = 1 << square(4, 4)
+        attacks = rook_attacks(square(4, 0), occupied)
+        self.assertTrue(attacks & (1 << square(4, 4)))
+        self.assertFalse(attacks & (1 << square(4, 5)))
+
+    def test_square_attacked_by_player(self):
+        chess_model = ChessModel()
+        self.assertTrue(chess_model.is_square_attacked(5, 0, Player.WHITE))
+        self.assertFalse(chess_model.is_square_attacked(4, 0, Player.WHITE))
+        self.assertTrue(chess_model.is_square_attacked(2, 5, Player.BLACK))
+
+    def test_in_check_simulation_other_board(self):
+        chess_model = ChessModel()
+        board = chess_model.copy_board()
+        board[1][5] = Pawn(Player.WHITE)
+        self.assertTrue(chess_model.in_check_simulation(Player.BLACK, board))
+        self.assertFalse(chess_model.in_check(Player.BLACK))
+
+
+class PossibleMovesTest(unittest.TestCase):
+    def test_initial_position_move_count(self):
+        chess_model = ChessModel()
+        self.assertEqual(len(chess_model.generate_all_valid_moves()), 20)
+
+    def test_possible_moves_match_is_valid_move(self):
+        chess_model = ChessModel()
+        chess_model.move(Move(6, 4, 4, 4))
+        chess_model.move(Move(1, 3, 3, 3))
+        board = chess_model.board
+        for row in range(8):
+            for col in range(8):
+                piece = board[row][col]
+                if piece is None:
+                    continue
+                generated = {(m.to_row, m.to_col) for m in piece.possible_moves(row, col, board)}
+                expected = {(r, c) for r in range(8) for c in range(8)
+                            if piece.is_valid_move(Move(row, col, r, c), board)}
+                self.assertEqual(generated, expected)
+
+    def test_pawn_double_step_blocked(self):
+        chess_model = ChessModel()
+        chess_model.set_piece(4, 0, Knight(Player.BLACK))
+        pawn = chess_model.piece_at(6, 0)
+        moves = [(m.to_row, m.to_col) for m in pawn.possible_moves(6, 0, chess_model.board)]
+        self.assertEqual(moves, [(5, 0)])
+
+    def test_pinned_piece_has_no_moves(self):
+        chess_model = ChessModel()
+        chess_model.clear_board()
+        chess_model.set_piece(7, 4, King(Player.WHITE))
+        chess_model.set_piece(6, 4, Rook(Player.WHITE))
+        chess_model.set_piece(0, 4, Rook(Player.BLACK))
+        chess_model.set_piece(0, 0, King(Player.BLACK))
+        moves = [(m.from_row, m.from_col, m.to_row, m.to_col) for m in chess_model.generate_all_valid_moves()]
+        self.assertNotIn((6, 4, 6, 0), moves)
+        self.assertIn((6, 4, 0, 4), moves)
+
+
+class MoveRecordTest(unittest.TestCase):
+    def test_move_records_capture(self):
+        chess_model = ChessModel()
+        chess_model.move(Move(6, 4, 4, 4))
+        chess_model.move(Move(1, 3, 3, 3))
+        pawn = chess_model.piece_at(3, 3)
+        record = chess_model.move(Move(4, 4, 3, 3))
+        self.assertIs(record.captured, pawn)
+        self.assertIs(record.placed, record.piece)
+        self.assertEqual(record.player, Player.WHITE)
+
+    def test_move_records_promotion(self):
+        chess_model = ChessModel()
+        pawn = Pawn(Player.WHITE)
+        chess_model.set_piece(1, 0, pawn)
+        record = chess_model.move(Move(1, 0, 0, 1))
+        self.assertIs(record.piece, pawn)
+        self.assertIsInstance(record.placed, Queen)
+        self.assertIsInstance(record.captured, Knight)
+
+    def test_undo_restores_player_and_capture(self):
+        chess_model = ChessModel()
+        chess_model.move(Move(6, 4, 4, 4))
+        chess_model.move(Move(1, 3, 3, 3))
+        pawn = chess_model.piece_at(3, 3)
+        chess_model.move(Move(4, 4, 3, 3))
+        chess_model.undo()
+        self.assertIs(chess_model.piece_at(3, 3), pawn)
+        self.assertEqual(chess_model.current_player, Player.WHITE)
+
+    def test_is_valid_move_leaves_board_unchanged(self):
+        chess_model = ChessModel()
+        before = chess_model.copy_board()
+        chess_model.is_valid_move(Move(6, 4, 4, 4))
+        chess_model.generate_all_valid_moves()
+        self.assertEqual(chess_model.board, before)
+        self.assertEqual(chess_model.current_player, Player.WHITE)
+
+
+class PieceTrackingTest(unittest.TestCase):
+    def test_initial_tracking(self):
+        chess_model = ChessModel()
+        self.assertEqual(chess_model.king_location(Player.WHITE), (7, 4))
+        self.assertEqual(chess_model.king_location(Player.BLACK), (0, 4))
+        self.assertEqual(chess_model.material(Player.WHITE), 39)
+        self.assertEqual(len(chess_model.piece_squares(Player.BLACK)), 16)
+
+    def test_capture_updates_material(self):
+        chess_model = ChessModel()
+        chess_model.move(Move(6, 4, 4, 4))
+        chess_model.move(Move(1, 3, 3, 3))
+        chess_model.move(Move(4, 4, 3, 3))
+        self.assertEqual(chess_model.material(Player.BLACK), 38)
+        self.assertNotIn((4, 4), chess_model.piece_squares(Player.WHITE))
+        self.assertIn((3, 3), chess_model.piece_squares(Player.WHITE))
+        chess_model.undo()
+        self.assertEqual(chess_model.material(Player.BLACK), 39)
+        self.assertIn((3, 3), chess_model.piece_squares(Player.BLACK))
+
+    def test_king_move_and_promotion(self):
+        chess_model = ChessModel()
+        chess_model.clear_board()
+        chess_model.set_piece(7, 4, King(Player.WHITE))
+        chess_model.set_piece(0, 0, King(Player.BLACK))
+        chess_model.set_piece(1, 7, Pawn(Player.WHITE))
+        self.assertEqual(chess_model.material(Player.WHITE), 1)
+        chess_model.move(Move(1, 7, 0, 7))
+        self.assertEqual(chess_model.material(Player.WHITE), 9)
+        chess_model.move(Move(0, 0, 1, 0))
+        self.assertEqual(chess_model.king_location(Player.BLACK), (1, 0))
+        chess_model.undo()
+        chess_model.undo()
+        self.assertEqual(chess_model.king_location(Player.BLACK), (0, 0))
+        self.assertEqual(chess_model.material(Player.WHITE), 1)
+
+    def test_clear_board_resets_tracking(self):
+        chess_model = ChessModel()
+        chess_model.clear_board()
+        self.assertIsNone(chess_model.king_location(Player.WHITE))
+        self.assertEqual(chess_model.material(Player.BLACK), 0)
+        self.assertEqual(chess_model.piece_squares(Player.WHITE), [])
+        self.assertTrue(chess_model.one_vs_one())
+
+
+class ZobristTest(unittest.TestCase):
+    def test_initial_key_matches_full_hash(self):
+        chess_model = ChessModel()
+        self.assertEqual(chess_model.zobrist_key, hash_board(chess_model.board, Player.WHITE))
+
+    def test_key_restored_by_undo(self):
+        chess_model = ChessModel()
+        key = chess_model.zobrist_key
+        chess_model.move(Move(6, 4, 4, 4))
+        self.assertNotEqual(chess_model.zobrist_key, key)
+        self.assertEqual(chess_model.zobrist_key, hash_board(chess_model.board, Player.BLACK))
+        chess_model.undo()
+        self.assertEqual(chess_model.zobrist_key, key)
+
+    def test_transposition_same_key(self):
+        first = ChessModel()
+        first.move(Move(7, 1, 5, 2))
+        first.move(Move(0, 1, 2, 2))
+        first.move(Move(7, 6, 5, 5))
+        second = ChessModel()
+        second.move(Move(7, 6, 5, 5))
+        second.move(Move(0, 1, 2, 2))
+        second.move(Move(7, 1, 5, 2))
+        self.assertEqual(first.zobrist_key, second.zobrist_key)
+
+    def test_side_to_move_changes_key(self):
+        chess_model = ChessModel()
+        key = chess_model.zobrist_key
+        chess_model.current_player = Player.BLACK
+        self.assertEqual(chess_model.zobrist_key, key ^ SIDE_KEY)
+
+    def test_set_piece_updates_key(self):
+        chess_model = ChessModel()
+        chess_model.set_piece(4, 4, Queen(Player.BLACK))
+        chess_model.set_piece(6, 0, None)
+        self.assertEqual(chess_model.zobrist_key, hash_board(chess_model.board, Player.WHITE))
+
+
+class TranspositionTableTest(unittest.TestCase):
+    def test_store_and_probe(self):
+        table = TranspositionTable(1)
+        table.store(12345, 4, -250, Bound.LOWER, Move(6, 4, 4, 4))
+        depth, score, bound, move = table.probe(12345)
+        self.assertEqual((depth, score, bound), (4, -250, Bound.LOWER))
+        self.assertEqual((move.from_row, move.from_col, move.to_row, move.to_col), (6, 4, 4, 4))
+        self.assertIsNone(table.probe(54321))
+        self.assertEqual((table.hits, table.misses), (1, 1))
+
+    def test_size_follows_budget(self):
+        table = TranspositionTable(1)
+        self.assertEqual(table.size * ENTRY_BYTES, 1024 * 1024)
+        with self.assertRaises(ValueError):
+            TranspositionTable(0)
+
+    def test_deeper_entry_kept(self):
+        table = TranspositionTable(1)
+        same_bucket = 1 + table.size // 2
+        table.store(1, 8, 10, Bound.EXACT)
+        table.store(same_bucket, 2, 20, Bound.EXACT)
+        table.store(same_bucket * 2 - 1, 3, 30, Bound.EXACT)
+        self.assertEqual(table.probe(1)[0], 8)
+        self.assertIsNone(table.probe(same_bucket))
+        self.assertEqual(table.probe(same_bucket * 2 - 1)[1], 30)
+
+    def test_new_search_allows_replacing_old_entries(self):
+        table = TranspositionTable(1)
+        same_bucket = 1 + table.size // 2
+        table.store(1, 8, 10, Bound.EXACT)
+        table.new_search()
+        table.store(same_bucket, 2, 20, Bound.UPPER)
+        self.assertEqual(table.probe(same_bucket)[2], Bound.UPPER)
+        self.assertIsNone(table.probe(1))
+
+
+class PerftTest(unittest.TestCase):
+    def test_start_position_counts(self):
+        chess_model = ChessModel()
+        self.assertEqual([perft(chess_model, depth) for depth in range(4)], [1, 20, 400, 8902])
+
+    def test_perft_leaves_model_unchanged(self):
+        chess_model = ChessModel()
+        key = chess_model.zobrist_key
+        perft(chess_model, 2)
+        self.assertEqual(chess_model.zobrist_key, key)
+        with self.assertRaises(UndoException):
+            chess_model.undo()
+
+    def test_divide_sums_to_perft(self):
+        chess_model = ChessModel()
+        counts = divide(chess_model, 2)
+        self.assertEqual(len(counts), 20)
+        self.assertEqual(sum(count for _, count in counts), 400)
+
+    def test_reference_positions(self):
+        self.assertEqual(check_reference(3), [])
+
+
+class SearchTest(unittest.TestCase):
+    def test_finds_mate_in_one(self):
+        chess_model = ChessModel()
+        chess_model.clear_board()
+        chess_model.set_piece(0, 0, King(Player.BLACK))
+        chess_model.set_piece(2, 1, King(Player.WHITE))
+        chess_model.set_piece(7, 7, Rook(Player.WHITE))
+        result = Searcher().search(chess_model, max_depth=3)
+        self.assertEqual((result.move.to_row, result.move.to_col), (0, 7))
+        self.assertGreaterEqual(result.score, MATE_BOUND)
+
+    def test_captures_hanging_queen(self):
+        chess_model = ChessModel()
+        chess_model.move(Move(6, 4, 4, 4))
+        chess_model.move(Move(1, 3, 3, 3))
+        chess_model.move(Move(7, 3, 3, 7))
+        chess_model.move(Move(0, 3, 3, 3))
+        result = Searcher().search(chess_model, max_depth=2)
+        # Either the pawn or the queen can take it; the piece-square tables decide between them
+        self.assertEqual((result.move.to_row, result.move.to_col), (3, 3))
+        self.assertGreater(result.score, 800)
+
+    def test_node_limit_returns_completed_depth(self):
+        chess_model = ChessModel()
+        result = Searcher().search(chess_model, node_limit=300)
+        self.assertGreaterEqual(result.depth, 1)
+        self.assertIsNotNone(result.move)
+        self.assertEqual(chess_model.zobrist_key, ChessModel().zobrist_key)
+
+    def test_ai_move_search_mode(self):
+        chess_model = ChessModel()
+        move = chess_model.ai_move(max_depth=1)
+        self.assertIsNotNone(move)
+        self.assertEqual(chess_model.current_player, Player.BLACK)
+
+    def test_ai_move_no_moves(self):
+        chess_model = ChessModel()
+        chess_model.clear_board()
+        chess_model.set_piece(0, 0, King(Player.BLACK))
+        chess_model.set_piece(7, 7, King(Player.WHITE))
+        self.assertIsNone(chess_model.ai_move())
+        self.assertIsNone(chess_model.ai_move(time_limit=0.1))
+
+
+class PackedPositionTest(unittest.TestCase):
+    def test_round_trip(self):
+        chess_model = ChessModel()
+        chess_model.move(Move(6, 4, 4, 4))
+        data = chess_model.to_bytes()
+        self.assertEqual(len(data), 65)
+        copy = ChessModel.from_bytes(data)
+        self.assertEqual(copy.zobrist_key, chess_model.zobrist_key)
+        self.assertEqual(copy.current_player, Player.BLACK)
+
+    def test_invalid_data(self):
+        with self.assertRaises(ValueError):
+            ChessModel.from_bytes(b'\x00' * 64)
+        with self.assertRaises(ValueError):
+            ChessModel.from_bytes(bytes([13]) + b'\x00' * 64)
+
+    def test_search_depth_skips_shallower_iterations(self):
+        chess_model = ChessModel()
+        chess_model.move(Move(6, 4, 4, 4))
+        result = Searcher().search_depth(chess_model, 2)
+        self.assertEqual(result.depth, 2)
+        self.assertEqual(result.score, Searcher().search(chess_model, max_depth=2).score)
+        stop = threading.Event()
+        stop.set()
+        # Unlike search, the limits apply to the only iteration
+        self.assertIsNone(Searcher().search_depth(chess_model, 3, stop_event=stop))
+
+
+class ParallelSearchTest(unittest.TestCase):
+    def test_matches_single_process_score(self):
+        chess_model = ChessModel()
+        chess_model.move(Move(6, 4, 4, 4))
+        chess_model.move(Move(1, 3, 3, 3))
+        serial = Searcher().search(chess_model, max_depth=2)
+        with ParallelSearcher(2, size_mb=1) as searcher:
+            parallel = searcher.search(chess_model, max_depth=2)
+        self.assertEqual(parallel.score, serial.score)
+        self.assertEqual(parallel.depth, 2)
+        self.assertIn((parallel.move.from_row, parallel.move.from_col, parallel.move.to_row, parallel.move.to_col),
+                      [(m.from_row, m.from_col, m.to_row, m.to_col) for m in chess_model.generate_all_valid_moves()])
+
+    def test_ai_move_with_parallel_searcher(self):
+        chess_model = ChessModel.from_fen('k7/8/1K6/8/8/8/8/7R w - - 0 1')
+        with ParallelSearcher(2, size_mb=1) as searcher:
+            chess_model.searcher = searcher
+            move = chess_model.ai_move(max_depth=3, node_limit=100000, stop_event=threading.Event())
+        self.assertEqual(move, Move(7, 7, 0, 7))
+        self.assertEqual(chess_model.status(), GameStatus.Checkmate)
+
+    def test_limits_stop_after_first_iteration(self):
+        stop = threading.Event()
+        stop.set()
+        with ParallelSearcher(2, size_mb=1) as searcher:
+            stopped = searcher.search(ChessModel(), max_depth=4, stop_event=stop)
+            limited = searcher.search(ChessModel(), max_depth=4, node_limit=1)
+        self.assertEqual(stopped.depth, 1)
+        self.assertEqual(limited.depth, 1)
+        self.assertIsNotNone(stopped.move)
+
+
+class TournamentTest(unittest.TestCase):
+    def test_parse_engine(self):
+        self.assertEqual(parse_engine('random'), {'name': 'random'})
+        self.assertEqual(parse_engine('depth=2,time=0.5'), {'name': 'depth=2,time=0.5', 'max_depth': 2,
+                                                             'time_limit': 0.5})
+        with self.assertRaises(ValueError):
+            parse_engine('speed=3')
+
+    def test_play_game_is_seeded(self):
+        engine = parse_engine('random')
+        first = play_game(0, engine, engine, seed=5, max_plies=40)
+        second = play_game(0, engine, engine, seed=5, max_plies=40)
+        self.assertEqual((first['result'], first['reason'], first['plies']),
+                         (second['result'], second['reason'], second['plies']))
+        self.assertLessEqual(first['plies'], 40)
+
+    def test_results_stream_and_resume(self):
+        engine_a = parse_engine('random')
+        engine_b = parse_engine('depth=1')
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'results.jsonl')
+            summary = run_tournament(engine_a, engine_b, 2, path, workers=1, max_plies=20)
+            self.assertEqual(summary['games'], 2)
+            summary = run_tournament(engine_a, engine_b, 3, path, workers=1, max_plies=20)
+            self.assertEqual(summary['games'], 3)
+            with open(path) as file:
+                records = [json.loads(line) for line in file]
+            self.assertEqual(records[0]['config']['engine_b'], engine_b)
+            games = sorted(record['game'] for record in records[1:])
+            self.assertEqual(games, [0, 1, 2])
+            self.assertEqual(summary['wins'] + summary['draws'] + summary['losses'], 3)
+
+    def test_resume_refuses_other_configuration(self):
+        engine = parse_engine('random')
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'results.jsonl')
+            run_tournament(engine, engine, 1, path, workers=1, max_plies=10)
+            with self.assertRaises(ValueError):
+                run_tournament(engine, engine, 2, path, workers=1, seed=1, max_plies=10)
+            with self.assertRaises(ValueError):
+                run_tournament(engine, parse_engine('depth=1'), 2, path, workers=1, max_plies=10)
+            self.assertEqual(run_tournament(engine, engine, 2, path, workers=1, max_plies=10)['games'], 2)
+
+    def test_wins_credited_by_color_not_name(self):
+        games = [{'game': 0, 'white': 'random', 'black': 'random', 'result': '1-0', 'plies': 10, 'time': 1.0,
+                  'engine_a': 'white'},
+                 {'game': 1, 'white': 'random', 'black': 'random', 'result': '1-0', 'plies': 10, 'time': 1.0,
+                  'engine_a': 'black'}]
+        summary = summarize(games)
+        self.assertEqual((summary['wins'], summary['draws'], summary['losses']), (1, 0, 1))
+
+
+class PackedMoveTest(unittest.TestCase):
+    def test_pack_round_trip(self):
+        move = Move(6, 4, 4, 4)
+        self.assertLess(move.packed, 1 << 16)
+        copy = Move.from_packed(move.packed)
+        self.assertEqual((copy.from_row, copy.from_col, copy.to_row, copy.to_col), (6, 4, 4, 4))
+        self.assertEqual(copy, move)
+
+    def test_equality_and_hash(self):
+        self.assertEqual(Move(1, 2, 3, 4), Move(1, 2, 3, 4, capture=True))
+        self.assertNotEqual(Move(1, 0, 0, 0), Move(1, 0, 0, 0, promotion=KNIGHT))
+        self.assertEqual(len({Move(1, 2, 3, 4), Move(1, 2, 3, 4), Move(4, 3, 2, 1)}), 2)
+        self.assertEqual(Move(7, 0, 8, -1), Move(7, 0, 8, -1))
+        self.assertIsNone(Move(7, 0, 8, -1).packed)
+
+    def test_promotion_piece_is_checked(self):
+        for promotion in (KNIGHT, BISHOP, ROOK, QUEEN):
+            move = Move(1, 0, 0, 0, promotion=promotion)
+            self.assertEqual(Move.from_packed(move.packed).promotion, promotion)
+        self.assertEqual(unpack_moves(pack_moves([Move(1, 0, 0, 0, promotion=QUEEN)])),
+                         [Move(1, 0, 0, 0, promotion=QUEEN)])
+        for promotion in (PAWN, KING, -1):
+            with self.assertRaises(ValueError):
+                Move(1, 0, 0, 0, promotion=promotion)
+
+    def test_no_instance_dict(self):
+        with self.assertRaises(AttributeError):
+            Move(1, 2, 3, 4).extra = 1
+
+    def test_move_list_buffer_and_pickle(self):
+        moves = ChessModel().generate_all_valid_moves()
+        buffer = pack_moves(moves)
+        self.assertEqual(buffer.typecode, 'H')
+        self.assertEqual(unpack_moves(buffer), moves)
+        self.assertEqual(pickle.loads(pickle.dumps(moves)), moves)
+
+    def test_generated_capture_flag(self):
+        chess_model = ChessModel()
+        chess_model.move(Move(6, 4, 4, 4))
+        chess_model.move(Move(1, 3, 3, 3))
+        captures = [move for move in chess_model.generate_all_valid_moves() if move.is_capture]
+        self.assertEqual(captures, [Move(4, 4, 3, 3)])
+
+    def test_under_promotion(self):
+        chess_model = ChessModel()
+        chess_model.set_piece(1, 0, Pawn(Player.WHITE))
+        chess_model.move(Move(1, 0, 0, 1, promotion=KNIGHT))
+        self.assertIsInstance(chess_model.piece_at(0, 1), Knight)
+        chess_model.undo()
+        self.assertIsInstance(chess_model.piece_at(1, 0), Pawn)
+
+
+class FlyweightPieceTest(unittest.TestCase):
+    def test_pieces_are_shared(self):
+        self.assertIs(Pawn(Player.WHITE), Pawn(Player.WHITE))
+        self.assertIsNot(Pawn(Player.WHITE), Pawn(Player.BLACK))
+        self.assertIsNot(Rook(Player.WHITE), Queen(Player.WHITE))
+        self.assertIs(ChessModel().piece_at(7, 0), ChessModel().piece_at(7, 7))
+
+    def test_type_codes(self):
+        pieces = (Pawn, Knight, Bishop, Rook, Queen, King)
+        self.assertEqual([piece(Player.WHITE).code for piece in pieces], [PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING])
+        self.assertEqual(King(Player.BLACK).side, Player.BLACK.value)
+        self.assertEqual(King(Player.WHITE).side, Player.WHITE.value)
+
+    def test_pieces_are_immutable(self):
+        queen = Queen(Player.WHITE)
+        with self.assertRaises(AttributeError):
+            queen.player = Player.BLACK
+        with self.assertRaises(AttributeError):
+            queen.extra = 1
+        self.assertEqual(queen.player, Player.WHITE)
+
+    def test_copy_and_pickle_keep_identity(self):
+        knight = Knight(Player.BLACK)
+        self.assertIs(copy.deepcopy(knight), knight)
+        self.assertIs(pickle.loads(pickle.dumps(knight)), knight)
+
+
+class FenTest(unittest.TestCase):
+    def test_start_position(self):
+        self.assertEqual(ChessModel().to_fen(), START_FEN)
+        self.assertEqual(ChessModel.from_fen(START_FEN).zobrist_key, ChessModel().zobrist_key)
+
+    def test_round_trip_matches_set_piece(self):
+        chess_model = ChessModel()
+        chess_model.clear_board()
+        chess_model.set_piece(0, 0, King(Player.BLACK))
+        chess_model.set_piece(7, 7, King(Player.WHITE))
+        chess_model.set_piece(1, 1, Queen(Player.BLACK))
+        chess_model.set_piece(4, 4, Knight(Player.WHITE))
+        chess_model.current_player = Player.BLACK
+        fen = chess_model.to_fen()
+        self.assertEqual(fen, 'k7/1q6/8/8/4N3/8/8/7K b - - 0 1')
+        loaded = ChessModel.from_fen(fen)
+        self.assertEqual(loaded.board, chess_model.board)
+        self.assertEqual(loaded.current_player, Player.BLACK)
+        self.assertEqual(loaded.zobrist_key, chess_model.zobrist_key)
+        self.assertEqual(loaded.material(Player.BLACK), 9)
+
+    def test_move_counters(self):
+        chess_model = ChessModel()
+        chess_model.move(Move(6, 4, 4, 4))
+        chess_model.move(Move(0, 6, 2, 5))
+        chess_model.move(Move(7, 6, 5, 5))
+        self.assertEqual(chess_model.to_fen(), 'rnbqkb1r/pppppppp/5n2/8/4P3/5N2/PPPP1PPP/RNBQKB1R b - - 2 2')
+        loaded = ChessModel.from_fen('4k3/8/8/8/8/8/8/R3K3 w - - 10 40')
+        loaded.move(Move(7, 0, 6, 0))
+        self.assertEqual(loaded.to_fen(), '4k3/8/8/8/8/8/R7/4K3 b - - 11 40')
+        loaded.undo()
+        self.assertEqual(loaded.to_fen(), '4k3/8/8/8/8/8/8/R3K3 w - - 10 40')
+
+    def test_counters_optional(self):
+        self.assertEqual(ChessModel.from_fen('8/8/8/8/8/8/8/K6k w - -').to_fen(), '8/8/8/8/8/8/8/K6k w - - 0 1')
+
+    def test_invalid_fen_leaves_model_unchanged(self):
+        chess_model = ChessModel()
+        for fen in ('', 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w - - 0 1',
+                    'rnbqkbnr/pppppppp/9/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1',
+                    'rnbqkbnr/ppppxppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1',
+                    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x - - 0 1',
+                    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - a 1'):
+            with self.assertRaises(ValueError):
+                chess_model.set_fen(fen)
+        self.assertEqual(chess_model.to_fen(), START_FEN)
+
+    def test_read_fens(self):
+        lines = ['# positions', START_FEN, '', 'k7/1q6/8/8/4N3/8/8/7K b - - 0 1; id "test"']
+        fens = [model.to_fen() for model in read_fens(lines)]
+        self.assertEqual(fens, [START_FEN, 'k7/1q6/8/8/4N3/8/8/7K b - - 0 1'])
+        reused = ChessModel()
+        self.assertTrue(all(model is reused for model in read_fens(lines, reused)))
+        with self.assertRaisesRegex(ValueError, 'Line 2'):
+            list(read_fens([START_FEN, 'not a fen']))
+
+    def test_write_and_read_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'positions.fen')
+            models = [ChessModel(), ChessModel.from_fen('k7/8/8/8/8/8/8/7K b - - 3 9')]
+            self.assertEqual(write_fens(models, path), 2)
+            self.assertEqual([model.to_fen() for model in read_fens(path)], [model.to_fen() for model in models])
+
+
+_PGN_GAMES = '''[Event "One"]
+[White "A \\"quoted\\" name"]
+[Result "1-0"]
+
+1. e4 e5 2. Qh5 {attack} Nc6 (2... Nf6 3. Qxe5+) 3. Bc4 $1 Nf6?? 4. Qxf7# 1-0
+
+[Event "Two"]
+[FEN "4k3/P7/8/8/8/8/8/4K3 w - - 0 1"]
+
+1. a8=N Kd7 2. Nb6+ *
+
+[Event "Three"]
+
+1.d4 d5 2.c4 dxc4 3.O-O 1/2-1/2
+'''
+
+
+class PgnTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'games.pgn')
+        with open(self.path, 'w') as file:
+            file.write(_PGN_GAMES)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_parse_san(self):
+        chess_model = ChessModel()
+        self.assertEqual(parse_san(chess_model, 'e4'), Move(6, 4, 4, 4))
+        self.assertEqual(parse_san(chess_model, 'Nf3+'), Move(7, 6, 5, 5))
+        with self.assertRaises(ValueError):
+            parse_san(chess_model, 'e5')
+        with self.assertRaises(ValueError):
+            parse_san(chess_model, 'O-O')
+
+    def test_parse_san_disambiguation(self):
+        chess_model = ChessModel.from_fen('k7/8/8/8/8/8/4K3/R6R w - - 0 1')
+        with self.assertRaisesRegex(ValueError, 'Ambiguous'):
+            parse_san(chess_model, 'Rd1')
+        self.assertEqual(parse_san(chess_model, 'Rad1'), Move(7, 0, 7, 3))
+        self.assertEqual(parse_san(chess_model, 'Rhf1'), Move(7, 7, 7, 5))
+
+    def test_parse_san_promotion(self):
+        chess_model = ChessModel.from_fen('7k/P7/8/8/8/8/8/K7 w - - 0 1')
+        self.assertEqual(parse_san(chess_model, 'a8=N').promotion, KNIGHT)
+        self.assertEqual(parse_san(chess_model, 'a8').promotion, QUEEN)
+        self.assertEqual(square_name(0, 0), 'a8')
+
+    def test_records(self):
+        reader = PgnReader(self.path)
+        records = [(header['Event'], position.to_fen(), move) for header, position, move in
+                   reader.records(skip_invalid=True)]
+        self.assertEqual([event for event, _, _ in records], ['One'] * 7 + ['Two'] * 3 + ['Three'] * 4)
+        self.assertEqual(records[0][1], START_FEN)
+        self.assertEqual(records[7][1], '4k3/P7/8/8/8/8/8/4K3 w - - 0 1')
+        self.assertEqual(records[8][1], 'N3k3/8/8/8/8/8/8/4K3 b - - 0 1')
+        self.assertEqual(records[6][2], Move(3, 7, 1, 5))
+
+    def test_headers(self):
+        header, movetext = next(PgnReader(self.path).games())
+        self.assertEqual(header, {'Event': 'One', 'White': 'A "quoted" name', 'Result': '1-0'})
+        self.assertIn('Qxf7#', movetext)
+
+    def test_invalid_move_names_game(self):
+        with self.assertRaisesRegex(ValueError, 'Game 2: .*O-O'):
+            list(PgnReader(self.path).records())
+
+    def test_index(self):
+        reader = PgnReader(self.path)
+        self.assertEqual([header['Event'] for header, _ in reader.games(2)], ['Three'])
+        self.assertEqual(reader.indexed_games, 3)
+        self.assertEqual(len(reader), 3)
+        self.assertEqual(reader.offset(0), 0)
+        with open(self.path, 'rb') as file:
+            file.seek(reader.offset(1))
+            self.assertEqual(file.readline(), b'[Event "Two"]\n')
+        self.assertEqual([header['Event'] for header, _ in reader.games(1)], ['Two', 'Three'])
+        with self.assertRaises(IndexError):
+            reader.offset(3)
+
+
+class PositionCacheTest(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = PositionCache(2)
+        cache.lookup(1).check = True
+        cache.lookup(2)
+        cache.lookup(1)
+        cache.lookup(3)
+        self.assertIn(1, cache)
+        self.assertNotIn(2, cache)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (1, 3, 1))
+        self.assertTrue(cache.lookup(1).check)
+
+    def test_size_zero_keeps_nothing(self):
+        cache = PositionCache(0)
+        cache.lookup(1).check = True
+        self.assertIsNone(cache.lookup(1).check)
+        self.assertEqual(len(cache), 0)
+        with self.assertRaises(ValueError):
+            PositionCache(-1)
+
+    def test_model_reuses_analysis_after_undo(self):
+        chess_model = ChessModel(cache_size=16)
+        cache = chess_model.position_cache
+        moves = chess_model.generate_all_valid_moves()
+        chess_model.move(Move(6, 4, 4, 4))
+        chess_model.undo()
+        hits = cache.hits
+        self.assertTrue(chess_model.is_valid_move(Move(6, 3, 4, 3)))
+        self.assertFalse(chess_model.in_check(Player.WHITE))
+        self.assertFalse(chess_model.is_complete())
+        self.assertEqual(chess_model.generate_all_valid_moves(), moves)
+        self.assertEqual(cache.hits, hits + 4)
+
+    def test_cached_moves_are_copied(self):
+        chess_model = ChessModel()
+        chess_model.generate_all_valid_moves().clear()
+        self.assertEqual(len(chess_model.generate_all_valid_moves()), 20)
+
+    def test_cache_follows_set_piece(self):
+        chess_model = ChessModel()
+        self.assertFalse(chess_model.in_check(Player.WHITE))
+        chess_model.set_piece(5, 3, Knight(Player.BLACK))
+        self.assertTrue(chess_model.in_check(Player.WHITE))
+        self.assertFalse(chess_model.is_valid_move(Move(6, 0, 5, 0)))
+        self.assertEqual(chess_model.messageCode, MoveValidity.StayingInCheck)
+
+    def test_checkmate_from_cached_moves(self):
+        chess_model = ChessModel.from_fen('k7/8/8/8/8/8/5PPP/3r2K1 w - - 0 1')
+        self.assertEqual(chess_model.generate_all_valid_moves(), [])
+        self.assertTrue(chess_model.is_complete())
+
+
+class AttackMapTest(unittest.TestCase):
+    def full_map(self, chess_model, player):
+        occupied = chess_model.bitboard.all
+        attacked = 0
+        for row, col in chess_model.piece_squares(player):
+            piece = chess_model.piece_at(row, col)
+            attacked |= piece_attacks(piece.code, piece.side, row * 8 + col, occupied)
+        return attacked
+
+    def test_start_position(self):
+        chess_model = ChessModel()
+        self.assertEqual(chess_model.attack_map(Player.WHITE), 0x7EFFFF << 40)
+        self.assertEqual(chess_model.attack_map(Player.BLACK), 0xFFFF7E)
+        self.assertEqual(chess_model.attacks_from(7, 1), (1 << 40) | (1 << 42) | (1 << 51))
+        self.assertEqual(chess_model.attacks_from(4, 4), 0)
+
+    def test_maps_follow_moves_and_undo(self):
+        rng = random.Random(3)
+        chess_model = ChessModel()
+        for ply in range(120):
+            moves = chess_model.generate_all_valid_moves()
+            if not moves or rng.random() < 0.2 and ply:
+                chess_model.undo()
+            else:
+                chess_model.move(rng.choice(moves))
+            for player in Player:
+                self.assertEqual(chess_model.attack_map(player), self.full_map(chess_model, player))
+                board = chess_model.copy_board()
+                self.assertEqual(chess_model.in_check(player), chess_model.in_check_simulation(player, board))
+
+    def test_slider_rays_reopen(self):
+        chess_model = ChessModel.from_fen('k7/8/8/8/8/8/8/R2N3K w - - 0 1')
+        self.assertFalse(chess_model.attack_map(Player.WHITE) >> 60 & 1)
+        chess_model.set_piece(7, 3, None)
+        self.assertTrue(chess_model.attack_map(Player.WHITE) >> 60 & 1)
+        self.assertEqual(chess_model.attack_map(Player.WHITE), self.full_map(chess_model, Player.WHITE))
+
+
+class GameStatusTest(unittest.TestCase):
+    def test_ongoing_and_check(self):
+        self.assertEqual(ChessModel().status(), GameStatus.Ongoing)
+        chess_model = ChessModel.from_fen('k7/8/8/8/8/8/8/r5K1 w - - 0 1')
+        self.assertEqual(chess_model.status(), GameStatus.Check)
+        self.assertFalse(chess_model.status().game_over)
+
+    def test_checkmate(self):
+        chess_model = ChessModel.from_fen('k7/8/8/8/8/8/5PPP/3r2K1 w - - 0 1')
+        self.assertEqual(chess_model.status(), GameStatus.Checkmate)
+        self.assertTrue(chess_model.is_complete())
+
+    def test_stalemate_is_not_complete(self):
+        chess_model = ChessModel.from_fen('k7/2Q5/1K6/8/8/8/8/8 b - - 0 1')
+        self.assertEqual(chess_model.status(), GameStatus.Stalemate)
+        self.assertTrue(chess_model.status().game_over)
+        self.assertFalse(chess_model.is_complete())
+
+    def test_insufficient_material(self):
+        for fen in ('k7/8/8/8/8/8/8/7K w - - 0 1', 'k7/8/8/8/8/8/8/6NK w - - 0 1',
+                    'kb6/8/8/8/8/8/8/6BK w - - 0 1'):
+            self.assertEqual(ChessModel.from_fen(fen).status(), GameStatus.InsufficientMaterial)
+        for fen in ('k7/8/8/8/8/8/8/5NNK w - - 0 1', 'kb6/8/8/8/8/8/8/5B1K w - - 0 1',
+                    'k7/8/8/8/8/8/P7/7K w - - 0 1'):
+            self.assertEqual(ChessModel.from_fen(fen).status(), GameStatus.Ongoing)
+
+    def test_status_is_cached(self):
+        chess_model = ChessModel()
+        chess_model.status()
+        hits = chess_model.position_cache.hits
+        self.assertEqual(chess_model.status(), GameStatus.Ongoing)
+        self.assertEqual(chess_model.position_cache.hits, hits + 1)
+        chess_model.move(Move(6, 5, 5, 5))
+        chess_model.move(Move(1, 4, 3, 4))
+        chess_model.move(Move(6, 6, 4, 6))
+        chess_model.move(Move(0, 3, 4, 7))
+        self.assertEqual(chess_model.status(), GameStatus.Checkmate)
+        chess_model.undo()
+        self.assertEqual(chess_model.status(), GameStatus.Ongoing)
+
+
+class EvaluationTest(unittest.TestCase):
+    def assert_scores_match_board(self, chess_model):
+        middlegame, endgame, phase = chess_model.evaluation.score_board(chess_model.board)
+        score = Evaluation.blend(middlegame, endgame, phase)
+        if chess_model.current_player == Player.BLACK:
+            score = -score
+        self.assertEqual(chess_model.evaluate(), score)
+
+    def test_start_position_is_level(self):
+        chess_model = ChessModel()
+        self.assertEqual(chess_model.evaluate(), 0)
+        self.assertEqual(chess_model.evaluation.score_board(chess_model.board)[2], MAX_PHASE)
+
+    def test_incremental_scores_match_full_recompute(self):
+        rng = random.Random(5)
+        chess_model = ChessModel()
+        for _ in range(60):
+            moves = chess_model.generate_all_valid_moves()
+            if not moves:
+                break
+            chess_model.move(rng.choice(moves))
+            self.assert_scores_match_board(chess_model)
+        while True:
+            try:
+                chess_model.undo()
+            except UndoException:
+                break
+            self.assert_scores_match_board(chess_model)
+        self.assertEqual(chess_model.evaluate(), 0)
+
+    def test_promotion_and_set_piece_update_scores(self):
+        chess_model = ChessModel.from_fen('k7/4P3/8/8/8/8/8/K7 w - - 0 1')
+        chess_model.move(Move(1, 4, 0, 4, promotion=QUEEN))
+        self.assert_scores_match_board(chess_model)
+        chess_model.set_piece(4, 4, Rook(Player.WHITE))
+        self.assert_scores_match_board(chess_model)
+        chess_model.undo()
+        self.assert_scores_match_board(chess_model)
+
+    def test_phase_blends_middlegame_and_endgame(self):
+        self.assertEqual(Evaluation.blend(100, 200, MAX_PHASE), 100)
+        self.assertEqual(Evaluation.blend(100, 200, 0), 200)
+        self.assertEqual(Evaluation.blend(100, 200, MAX_PHASE // 2), 150)
+        self.assertEqual(Evaluation.blend(100, 200, MAX_PHASE + 8), 100)
+        # A king belongs in the center once the pieces are off
+        corner = ChessModel.from_fen('k7/8/8/8/8/8/8/K7 w - - 0 1')
+        center = ChessModel.from_fen('k7/8/8/8/3K4/8/8/8 w - - 0 1')
+        self.assertGreater(center.evaluate(), corner.evaluate())
+
+    def test_score_is_for_player_to_move(self):
+        white = ChessModel.from_fen('k7/8/8/8/8/8/8/Q6K w - - 0 1')
+        black = ChessModel.from_fen('k7/8/8/8/8/8/8/Q6K b - - 0 1')
+        self.assertGreater(white.evaluate(), 800)
+        self.assertEqual(black.evaluate(), -white.evaluate())
+
+    def test_load_and_save_tables(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'tables.json')
+            with open(path, 'w') as file:
+                json.dump({'middlegame_values': [100, 300, 300, 500, 900, 0]}, file)
+            loaded = Evaluation.load(path)
+            self.assertEqual(loaded.middlegame_values, (100, 300, 300, 500, 900, 0))
+            self.assertEqual(loaded.endgame_tables, DEFAULT_EVALUATION.endgame_tables)
+            loaded.save(path)
+            again = Evaluation.load(path)
+            self.assertEqual(again.middlegame_scores, loaded.middlegame_scores)
+            self.assertEqual(again.endgame_scores, loaded.endgame_scores)
+            with open(path, 'w') as file:
+                json.dump({'endgame_tables': [[0] * 63] * 6}, file)
+            with self.assertRaises(ValueError):
+                Evaluation.load(path)
+
+    def test_changing_evaluation_rescores_position(self):
+        flat = Evaluation(middlegame_tables=[[0] * 64] * 6, endgame_tables=[[0] * 64] * 6)
+        chess_model = ChessModel(evaluation=flat)
+        chess_model.move(Move(6, 4, 4, 4))
+        self.assertEqual(chess_model.evaluate(), 0)
+        chess_model.evaluation = DEFAULT_EVALUATION
+        self.assert_scores_match_board(chess_model)
+        self.assertLess(chess_model.evaluate(), 0)
+        chess_model.undo()
+        self.assertEqual(chess_model.evaluate(), 0)
+
+
+class OpeningBookTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'book.bin')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def build(self, games, max_plies=20):
+        builder = BookBuilder(max_plies)
+        for movetext in games:
+            builder.add_movetext(movetext)
+        return builder.write(self.path)
+
+    def test_lookup_finds_weighted_moves(self):
+        self.build(['1. e4 e5 2. Nf3', '1. e4 c5', '1. d4 d5'])
+        with OpeningBook(self.path) as book:
+            moves = {str(move): weight for move, weight in book.moves(ChessModel())}
+            self.assertEqual(moves, {str(Move(6, 4, 4, 4)): 2, str(Move(6, 3, 4, 3)): 1})
+            chess_model = ChessModel()
+            chess_model.move(Move(6, 4, 4, 4))
+            self.assertEqual(sorted(weight for _, weight in book.moves(chess_model)), [1, 1])
+            chess_model.move(Move(1, 4, 3, 4))
+            self.assertEqual([move for move, _ in book.moves(chess_model)], [Move(7, 6, 5, 5)])
+            self.assertEqual(book.lookup(12345), [])
+
+    def test_promotions_are_played_as_stored(self):
+        builder = BookBuilder()
+        builder.add_movetext('1. e8=Q', 'k7/4P3/8/8/8/8/8/K7 w - - 0 1')
+        builder.add_movetext('1. a8=N', '8/P7/8/8/8/8/8/K1k5 w - - 0 1')
+        builder.write(self.path)
+        with OpeningBook(self.path) as book:
+            chess_model = ChessModel.from_fen('k7/4P3/8/8/8/8/8/K7 w - - 0 1')
+            self.assertEqual(book.moves(chess_model), [(Move(1, 4, 0, 4, promotion=QUEEN), 1)])
+            chess_model = ChessModel.from_fen('8/P7/8/8/8/8/8/K1k5 w - - 0 1')
+            move = book.choose(chess_model)
+            self.assertEqual(move, Move(1, 0, 0, 0, promotion=KNIGHT))
+            chess_model.move(move)
+            self.assertEqual(chess_model.piece_at(0, 0).code, KNIGHT)
+
+    def test_file_is_sorted_fixed_size_entries(self):
+        count = self.build(['1. e4 e5 2. Nf3 Nc6', '1. d4 Nf6 2. c4 e6'])
+        self.assertEqual(count, 8)
+        with open(self.path, 'rb') as file:
+            data = file.read()
+        self.assertEqual(len(data), count * BOOK_ENTRY_BYTES)
+        keys = [ENTRY.unpack_from(data, i * BOOK_ENTRY_BYTES)[0] for i in range(count)]
+        self.assertEqual(keys, sorted(keys))
+
+    def test_max_plies_and_illegal_moves_end_game(self):
+        builder = BookBuilder(max_plies=2)
+        self.assertEqual(builder.add_movetext('1. e4 e5 2. Nf3 Nc6'), 2)
+        self.assertEqual(builder.add_movetext('1. e4 Ke7 2. Qh5'), 1)
+        self.assertEqual(builder.add_game([Move(6, 3, 4, 3), Move(1, 3, 3, 3)]), 2)
+        self.assertEqual(builder.write(self.path), 4)
+        self.assertEqual(len(OpeningBook(self.path)), 4)
+
+    def test_weights_are_scaled_to_fit(self):
+        builder = BookBuilder(max_plies=1)
+        builder.add_game(['e4'], weight=MAX_WEIGHT * 2)
+        builder.add_game(['d4'], weight=MAX_WEIGHT)
+        builder.write(self.path)
+        with OpeningBook(self.path) as book:
+            weights = sorted(weight for _, weight in book.moves(ChessModel()))
+        self.assertEqual(weights, [MAX_WEIGHT // 2, MAX_WEIGHT])
+
+    def test_empty_and_invalid_books(self):
+        self.assertEqual(self.build([]), 0)
+        with OpeningBook(self.path) as book:
+            self.assertEqual(len(book), 0)
+            self.assertIsNone(book.choose(ChessModel()))
+        with open(self.path, 'wb') as file:
+            file.write(b'\0' * (BOOK_ENTRY_BYTES + 1))
+        with self.assertRaises(ValueError):
+            OpeningBook(self.path)
+
+    def test_add_pgn_and_move_lists(self):
+        pgn_path = os.path.join(self.directory.name, 'games.pgn')
+        with open(pgn_path, 'w') as file:
+            file.write('[White "A"]\n\n1. e4 e5 1-0\n\n[White "B"]\n[FEN "k7/8/8/8/8/8/8/K6R w - - 0 1"]\n\n1. Rh8# 1-0\n')
+        lists_path = os.path.join(self.directory.name, 'games.txt')
+        with open(lists_path, 'w') as file:
+            file.write('# openings\n1. e4 e5\n\nd4 d5\n')
+        builder = BookBuilder()
+        self.assertEqual(builder.add_pgn(pgn_path), 2)
+        self.assertEqual(builder.add_move_lists(lists_path), 2)
+        self.assertEqual(builder.write(self.path), 5)
+        with OpeningBook(self.path) as book:
+            weights = {str(move): weight for move, weight in book.moves(ChessModel())}
+            self.assertEqual(weights[str(Move(6, 4, 4, 4))], 2)
+            endgame = ChessModel.from_fen('k7/8/8/8/8/8/8/K6R w - - 0 1')
+            self.assertEqual([move for move, _ in book.moves(endgame)], [Move(7, 7, 0, 7)])
+
+    def test_ai_move_plays_from_book(self):
+        self.build(['1. e4 e5'])
+        chess_model = ChessModel()
+        chess_model.opening_book = OpeningBook(self.path)
+        self.assertEqual(chess_model.ai_move(max_depth=1), Move(6, 4, 4, 4))
+        self.assertEqual(chess_model.ai_move(max_depth=1), Move(1, 4, 3, 4))
+        # Out of book, so the search picks the move
+        self.assertIsNotNone(chess_model.ai_move(max_depth=1))
+        chess_model.opening_book.close()
+
+    def test_book_pickles_by_path(self):
+        self.build(['1. e4'])
+        with OpeningBook(self.path) as book:
+            copy_of_book = pickle.loads(pickle.dumps(book))
+            self.assertEqual(copy_of_book.lookup(ChessModel().zobrist_key), book.lookup(ChessModel().zobrist_key))
+            copy_of_book.close()
+
+
+class TablebaseTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.tablebase = Tablebase(cls.directory.name)
+        # KPvK needs KQvK for its promotions, and both need KvK
+        cls.generated = cls.tablebase.generate('KPvK')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tablebase.close()
+        cls.directory.cleanup()
+
+    def probe(self, fen):
+        return self.tablebase.probe(ChessModel.from_fen(fen))
+
+    def test_generates_dependencies(self):
+        self.assertEqual(self.generated, 3)
+        for name in ('KvK', 'KQvK', 'KPvK'):
+            self.assertTrue(self.tablebase.available(name))
+        self.assertFalse(self.tablebase.available('KRvK'))
+        self.assertEqual(self.tablebase.generate('KvKP'), 0)
+
+    def test_material_names(self):
+        self.assertEqual(parse_material('KQvK'), ((KING, QUEEN), (KING,)))
+        self.assertEqual(parse_material('krvkn'), ((KING, ROOK), (KING, KNIGHT)))
+        self.assertEqual(material_name((QUEEN, KING), (KING,)), 'KQvK')
+        for name in ('KQK', 'QvK', 'KKvK', 'KQRvKR', 'KXvK'):
+            with self.assertRaises(ValueError):
+                parse_material(name)
+
+    def test_known_results(self):
+        self.assertEqual(self.probe('k7/8/8/8/8/8/8/7K w - - 0 1'), (0, 0))
+        self.assertEqual(self.probe('k7/1Q6/1K6/8/8/8/8/8 b - - 0 1'), (-1, 0))
+        self.assertEqual(self.probe('k7/8/1K6/8/8/8/7Q/8 w - - 0 1'), (1, 1))
+        # Stalemate
+        self.assertEqual(self.probe('k7/2Q5/1K6/8/8/8/8/8 b - - 0 1'), (0, 0))
+        # A king on the sixth rank ahead of its pawn wins whoever is to move, but a rook pawn cannot drive the
+        # defending king out of the corner
+        self.assertEqual(self.probe('4k3/8/4K3/4P3/8/8/8/8 w - - 0 1')[0], 1)
+        self.assertEqual(self.probe('4k3/8/4K3/4P3/8/8/8/8 b - - 0 1')[0], -1)
+        self.assertEqual(self.probe('k7/8/8/8/8/8/P7/K7 w - - 0 1'), (0, 0))
+        # The longest mate with king and queen is ten moves
+        with open(self.tablebase.path('KQvK'), 'rb') as file:
+            data = file.read()
+        self.assertEqual(max(plies for result, plies in map(decode, data[1::2]) if result > 0), 19)
+
+    def test_colors_and_sides_are_mirrored(self):
+        self.assertEqual(self.probe('8/8/8/8/8/8/1k6/K6q w - - 0 1'), self.probe('k6Q/1K6/8/8/8/8/8/8 b - - 0 1'))
+        self.assertEqual(self.probe('8/8/8/4p3/4k3/8/4K3/8 w - - 0 1'), self.probe('8/4k3/8/4K3/4P3/8/8/8 b - - 0 1'))
+        self.assertEqual(self.probe('7k/8/6K1/8/8/8/Q7/8 w - - 0 1'), self.probe('k7/8/1K6/8/8/8/7Q/8 w - - 0 1'))
+
+    def test_results_follow_move_rules(self):
+        # The value of every position is the best of the values its legal moves lead to
+        rng = random.Random(3)
+        checked = 0
+        while checked < 150:
+            chess_model = ChessModel(cache_size=0)
+            chess_model.clear_board()
+            squares = rng.sample(range(8, 56), 3)
+            chess_model.set_piece(squares[0] // 8, squares[0] % 8, King(Player.WHITE))
+            chess_model.set_piece(squares[1] // 8, squares[1] % 8, King(Player.BLACK))
+            chess_model.set_piece(squares[2] // 8, squares[2] % 8, rng.choice((Pawn, Queen))(rng.choice(list(Player))))
+            chess_model.current_player = rng.choice(list(Player))
+            if chess_model.in_check(chess_model.current_player.next()):
+                continue
+            checked += 1
+            moves = chess_model.generate_all_valid_moves()
+            if not moves:
+                expected = (-1, 0) if chess_model.in_check(chess_model.current_player) else (0, 0)
+            else:
+                children = []
+                for move in moves:
+                    chess_model.move(move)
+                    children.append(self.tablebase.probe(chess_model))
+                    chess_model.undo()
+                result = -min(result for result, _ in children)
+                if result > 0:
+                    expected = (1, min(plies for child, plies in children if child < 0) + 1)
+                elif result < 0:
+                    expected = (-1, max(plies for _, plies in children) + 1)
+                else:
+                    expected = (0, 0)
+            self.assertEqual(self.tablebase.probe(chess_model), expected, chess_model.to_fen())
+
+    def test_uncovered_positions(self):
+        self.assertIsNone(self.tablebase.probe(ChessModel()))
+        self.assertIsNone(self.probe('k7/8/8/8/8/8/8/R6K w - - 0 1'))
+        self.assertIsNone(self.tablebase.best_move(ChessModel()))
+
+    def test_ai_move_mates_in_table_distance(self):
+        chess_model = ChessModel.from_fen('7k/8/8/8/8/8/8/KQ6 w - - 0 1')
+        chess_model.tablebase = self.tablebase
+        _, plies = self.tablebase.probe(chess_model)
+        for _ in range(plies):
+            self.assertIsNotNone(chess_model.ai_move())
+        self.assertEqual(chess_model.status(), GameStatus.Checkmate)
+
+    def test_search_scores_mates_from_table(self):
+        chess_model = ChessModel.from_fen('7k/8/8/8/8/8/8/KQ6 w - - 0 1')
+        _, plies = self.tablebase.probe(chess_model)
+        result = Searcher(tablebase=self.tablebase).search(chess_model, max_depth=2)
+        self.assertEqual(result.score, MATE_SCORE - plies)
+
+
+class AIWorkerTest(unittest.TestCase):
+    def setUp(self):
+        self.replies = queue.Queue()
+        self.worker = AIWorker(self.replies.put, time_limit=None, max_depth=2)
+
+    def tearDown(self):
+        self.worker.close()
+
+    def test_replies_with_a_legal_move_for_the_snapshot(self):
+        chess_model = ChessModel.from_fen('k7/8/8/8/8/8/8/K6R w - - 0 1')
+        number = self.worker.request(chess_model)
+        # The model belongs to the caller again as soon as the request is made
+        chess_model.move(Move(7, 7, 6, 7))
+        reply = self.replies.get(timeout=30)
+        self.assertEqual(reply.request, number)
+        self.assertEqual(reply.position, ChessModel.from_fen('k7/8/8/8/8/8/8/K6R w - - 0 1').to_bytes())
+        self.assertIn(reply.move, ChessModel.from_bytes(reply.position).generate_all_valid_moves())
+
+    def test_no_move_when_mated(self):
+        self.worker.request(ChessModel.from_fen('k6R/8/1K6/8/8/8/8/8 b - - 0 1'))
+        self.assertIsNone(self.replies.get(timeout=30).move)
+
+    def test_cancelled_request_is_not_posted(self):
+        self.worker.max_depth = None
+        self.worker.time_limit = 60
+        started = threading.Event()
+        searcher = self.worker.searcher
+        original = searcher.search
+
+        def search(*args, **kwargs):
+            started.set()
+            return original(*args, **kwargs)
+
+        searcher.search = search
+        self.worker.request(ChessModel())
+        self.assertTrue(started.wait(30))
+        self.worker.cancel()
+        searcher.search = original
+        self.worker.max_depth = 1
+        number = self.worker.request(ChessModel())
+        # The search stops at the cancel, so the next request is answered long before the time limit
+        reply = self.replies.get(timeout=30)
+        self.assertEqual(reply.request, number)
+        self.assertTrue(self.replies.empty())
+
+    def test_new_request_replaces_pending_one(self):
+        self.worker.max_depth = None
+        self.worker.time_limit = 60
+        first = self.worker.request(ChessModel())
+        self.worker.max_depth = 1
+        second = self.worker.request(ChessModel.from_fen('k7/8/8/8/8/8/8/K6R w - - 0 1'))
+        reply = self.replies.get(timeout=30)
+        self.assertNotEqual(first, second)
+        self.assertEqual(reply.request, second)
+
+    def ponder(self, time_limit, max_depth):
+        # Replaces the worker with a pondering one that counts its searches, and gets its first reply
+        self.worker.close()
+        self.worker = AIWorker(self.replies.put, time_limit=time_limit, max_depth=max_depth, ponder=True)
+        self.searches = 0
+        original = self.worker.searcher.search
+
+        def search(*args, **kwargs):
+            self.searches += 1
+            return original(*args, **kwargs)
+
+        self.worker.searcher.search = search
+        chess_model = ChessModel.from_fen('r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w - - 0 1')
+        self.worker.request(chess_model)
+        reply = self.replies.get(timeout=30)
+        self.assertIsNotNone(reply.ponder)
+        chess_model.move(reply.move)
+        # No pondering after the next reply, so the searches can be counted
+        self.worker.ponder = False
+        return chess_model, reply.ponder
+
+    def test_ponder_hit_keeps_finished_search(self):
+        chess_model, predicted = self.ponder(None, 2)
+        chess_model.move(predicted)
+        number = self.worker.request(chess_model)
+        reply = self.replies.get(timeout=30)
+        self.assertEqual(reply.request, number)
+        self.assertIn(reply.move, chess_model.generate_all_valid_moves())
+        self.assertEqual(self.searches, 2)
+
+    def test_ponder_hit_continues_running_search(self):
+        chess_model, predicted = self.ponder(0.3, None)
+        chess_model.move(predicted)
+        number = self.worker.request(chess_model)
+        reply = self.replies.get(timeout=30)
+        self.assertEqual(reply.request, number)
+        self.assertIn(reply.move, chess_model.generate_all_valid_moves())
+        self.assertEqual(self.searches, 2)
+
+    def test_ponder_miss_searches_again(self):
+        chess_model, predicted = self.ponder(0.3, None)
+        other = next(move for move in chess_model.generate_all_valid_moves() if move != predicted)
+        chess_model.move(other)
+        number = self.worker.request(chess_model)
+        reply = self.replies.get(timeout=30)
+        self.assertEqual(reply.request, number)
+        self.assertIn(reply.move, chess_model.generate_all_valid_moves())
+        self.assertEqual(self.searches, 3)
+
+
+@unittest.skipIf(batch_eval is None, 'NumPy is not installed')
+class BatchEvalTest(unittest.TestCase):
+    def reference_score(self, chess_model):
+        # The model's own score for white plus empty reachable squares, one piece at a time
+        score = chess_model.evaluate()
+        if chess_model.current_player == Player.BLACK:
+            score = -score
+        occupied = chess_model.bitboard.all
+        for player in Player:
+            sign = 1 if player == Player.WHITE else -1
+            for row, col in chess_model.piece_squares(player):
+                piece = chess_model.piece_at(row, col)
+                reach = 0
+                if piece.code in (KNIGHT, BISHOP, ROOK, QUEEN):
+                    reach = piece_attacks(piece.code, piece.side, row * 8 + col, 0)
+                score += sign * batch_eval.MOBILITY_WEIGHTS[piece.code] * bin(reach & ~occupied).count('1')
+        return score
+
+    def test_encodings_agree(self):
+        chess_model = ChessModel()
+        chess_model.move(Move(6, 4, 4, 4))
+        codes = batch_eval.model_to_array(chess_model)
+        self.assertEqual(codes.dtype, numpy.uint8)
+        self.assertEqual(codes.shape, (64,))
+        self.assertTrue((codes == batch_eval.board_to_array(chess_model.board)).all())
+        self.assertTrue((codes == batch_eval.fen_to_array(chess_model.to_fen())).all())
+        self.assertEqual(codes[60], 1 * 6 + KING + 1)
+        self.assertEqual(codes[4], 0 * 6 + KING + 1)
+
+    def test_fens_to_array(self):
+        positions, players = batch_eval.fens_to_array([START_FEN, 'k7/8/8/8/8/8/8/7K b - - 0 1'])
+        self.assertEqual(positions.shape, (2, 64))
+        self.assertEqual(list(players), [1, 0])
+        with self.assertRaises(ValueError):
+            batch_eval.fens_to_array(['k7/8/8/8/8/8/8/7X w - - 0 1'])
+        with self.assertRaises(ValueError):
+            batch_eval.fens_to_array(['k7/8/8/8/8/8/8/6K w - - 0 1'])
+
+    def test_matches_reference(self):
+        rng = random.Random(11)
+        models = []
+        chess_model = ChessModel()
+        for _ in range(40):
+            moves = chess_model.generate_all_valid_moves()
+            if not moves:
+                break
+            chess_model.move(rng.choice(moves))
+            models.append(ChessModel.from_fen(chess_model.to_fen()))
+        positions = numpy.stack([batch_eval.model_to_array(model) for model in models])
+        scores = batch_eval.evaluate_batch(positions, chunk_size=7)
+        self.assertEqual(list(scores), [self.reference_score(model) for model in models])
+
+    def test_popcount_fallback(self):
+        masks = numpy.array([0, 1, 0x8000000000000001, (1 << 64) - 1, 0x0F0F00000000F0F0], dtype=numpy.uint64)
+        self.assertEqual(list(batch_eval._popcount_bytes(masks)), [0, 1, 2, 64, 16])
+        self.assertEqual(list(batch_eval._popcount(masks)), [0, 1, 2, 64, 16])
+
+    def test_start_position_is_level_and_side_to_move(self):
+        self.assertEqual(batch_eval.evaluate_batch(batch_eval.model_to_array(ChessModel()))[0], 0)
+        positions, players = batch_eval.fens_to_array(['k7/8/8/8/8/8/8/Q6K w - - 0 1', 'k7/8/8/8/8/8/8/Q6K b - - 0 1'])
+        white, black = batch_eval.evaluate_batch(positions, players)
+        self.assertGreater(white, 800)
+        self.assertEqual(black, -white)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,209 @@
+import json
+from bitboard import KNIGHT, BISHOP, ROOK, QUEEN
+
+# Weight of each piece type in the game phase, indexed by type code. The starting position has the full phase and
+# a board with only kings and pawns has none, which is pure endgame.
+PHASE_WEIGHTS = (0, 1, 1, 2, 4, 0)
+MAX_PHASE = 24
+
+MIDDLEGAME_VALUES = (100, 320, 330, 500, 900, 0)
+ENDGAME_VALUES = (120, 300, 320, 520, 940, 0)
+# Piece-square bonuses in centipawns for white, laid out as the board is drawn with row 0 (black's back rank) at the
+# top. Black uses the same tables mirrored top to bottom.
+MIDDLEGAME_TABLES = (
+    # Pawn
+    (0, 0, 0, 0, 0, 0, 0, 0,
+     50, 50, 50, 50, 50, 50, 50, 50,
+     10, 10, 20, 30, 30, 20, 10, 10,
+     5, 5, 10, 25, 25, 10, 5, 5,
+     0, 0, 0, 20, 20, 0, 0, 0,
+     5, -5, -10, 0, 0, -10, -5, 5,
+     5, 10, 10, -20, -20, 10, 10, 5,
+     0, 0, 0, 0, 0, 0, 0, 0),
+    # Knight
+    (-50, -40, -30, -30, -30, -30, -40, -50,
+     -40, -20, 0, 0, 0, 0, -20, -40,
+     -30, 0, 10, 15, 15, 10, 0, -30,
+     -30, 5, 15, 20, 20, 15, 5, -30,
+     -30, 0, 15, 20, 20, 15, 0, -30,
+     -30, 5, 10, 15, 15, 10, 5, -30,
+     -40, -20, 0, 5, 5, 0, -20, -40,
+     -50, -40, -30, -30, -30, -30, -40, -50),
+    # Bishop
+    (-20, -10, -10, -10, -10, -10, -10, -20,
+     -10, 0, 0, 0, 0, 0, 0, -10,
+     -10, 0, 5, 10, 10, 5, 0, -10,
+     -10, 5, 5, 10, 10, 5, 5, -10,
+     -10, 0, 10, 10, 10, 10, 0, -10,
+     -10, 10, 10, 10, 10, 10, 10, -10,
+     -10, 5, 0, 0, 0, 0, 5, -10,
+     -20, -10, -10, -10, -10, -10, -10, -20),
+    # Rook
+    (0, 0, 0, 0, 0, 0, 0, 0,
+     5, 10, 10, 10, 10, 10, 10, 5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     -5, 0, 0, 0, 0, 0, 0, -5,
+     0, 0, 0, 5, 5, 0, 0, 0),
+    # Queen
+    (-20, -10, -10, -5, -5, -10, -10, -20,
+     -10, 0, 0, 0, 0, 0, 0, -10,
+     -10, 0, 5, 5, 5, 5, 0, -10,
+     -5, 0, 5, 5, 5, 5, 0, -5,
+     0, 0, 5, 5, 5, 5, 0, -5,
+     -10, 5, 5, 5, 5, 5, 0, -10,
+     -10, 0, 5, 0, 0, 0, 0, -10,
+     -20, -10, -10, -5, -5, -10, -10, -20),
+    # King
+    (-30, -40, -40, -50, -50, -40, -40, -30,
+     -30, -40, -40, -50, -50, -40, -40, -30,
+     -30, -40, -40, -50, -50, -40, -40, -30,
+     -30, -40, -40, -50, -50, -40, -40, -30,
+     -20, -30, -30, -40, -40, -30, -30, -20,
+     -10, -20, -20, -20, -20, -20, -20, -10,
+     20, 20, 0, 0, 0, 0, 20, 20,
+     20, 30, 10, 0, 0, 10, 30, 20),
+)
+# In the endgame pawns are worth more the closer they are to promoting and the king belongs in the center; the
+# other pieces keep their middlegame bonuses
+ENDGAME_TABLES = (
+    # Pawn
+    (0, 0, 0, 0, 0, 0, 0, 0,
+     80, 80, 80, 80, 80, 80, 80, 80,
+     50, 50, 50, 50, 50, 50, 50, 50,
+     30, 30, 30, 30, 30, 30, 30, 30,
+     15, 15, 15, 15, 15, 15, 15, 15,
+     5, 5, 5, 5, 5, 5, 5, 5,
+     0, 0, 0, 0, 0, 0, 0, 0,
+     0, 0, 0, 0, 0, 0, 0, 0),
+    MIDDLEGAME_TABLES[KNIGHT],
+    MIDDLEGAME_TABLES[BISHOP],
+    MIDDLEGAME_TABLES[ROOK],
+    MIDDLEGAME_TABLES[QUEEN],
+    # King
+    (-50, -40, -30, -20, -20, -30, -40, -50,
+     -30, -20, -10, 0, 0, -10, -20, -30,
+     -30, -10, 20, 30, 30, 20, -10, -30,
+     -30, -10, 30, 40, 40, 30, -10, -30,
+     -30, -10, 30, 40, 40, 30, -10, -30,
+     -30, -10, 20, 30, 30, 20, -10, -30,
+     -30, -30, 0, 0, 0, 0, -30, -30,
+     -50, -30, -30, -30, -30, -30, -30, -50),
+)
+
+
+class Evaluation:
+    def __init__(self, middlegame_values=MIDDLEGAME_VALUES, endgame_values=ENDGAME_VALUES,
+                 middlegame_tables=MIDDLEGAME_TABLES, endgame_tables=ENDGAME_TABLES):
+        """
+        Initialize the material values and piece-square tables used to score positions. Every position gets a
+        middlegame and an endgame score, which are blended by how much material is left. The score of each piece
+        on each square is worked out here once, so a model can add and remove pieces from its running totals with
+        a single lookup.
+
+        Parameters:
+            middlegame_values: The middlegame value of each piece type in centipawns, indexed by type code.
+            endgame_values: The endgame value of each piece type.
+            middlegame_tables: A table of 64 middlegame bonuses per piece type, for white with row 0 first.
+            endgame_tables: A table of 64 endgame bonuses per piece type.
+
+        Raises:
+            ValueError: If a list of values or tables does not have one entry per piece type, or a table does not
+                have 64 bonuses.
+        """
+        for values in (middlegame_values, endgame_values):
+            if len(values) != 6:
+                raise ValueError('Piece values need one value per piece type')
+        for tables in (middlegame_tables, endgame_tables):
+            if len(tables) != 6 or any(len(table) != 64 for table in tables):
+                raise ValueError('Piece-square tables need 64 bonuses for each piece type')
+        self.middlegame_values = tuple(int(value) for value in middlegame_values)
+        self.endgame_values = tuple(int(value) for value in endgame_values)
+        self.middlegame_tables = tuple(tuple(int(bonus) for bonus in table) for table in middlegame_tables)
+        self.endgame_tables = tuple(tuple(int(bonus) for bonus in table) for table in endgame_tables)
+        self.middlegame_scores = self.__signed_scores(self.middlegame_values, self.middlegame_tables)
+        self.endgame_scores = self.__signed_scores(self.endgame_values, self.endgame_tables)
+
+    @staticmethod
+    def __signed_scores(values, tables) -> tuple:
+        # Value plus bonus of every piece on every square, indexed by side, type code and square, positive for
+        # white and negative for black
+        black = tuple(tuple(-(values[kind] + tables[kind][sq ^ 56]) for sq in range(64)) for kind in range(6))
+        white = tuple(tuple(values[kind] + tables[kind][sq] for sq in range(64)) for kind in range(6))
+        return black, white
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Reads values and tables from a JSON file, as written by save. Anything the file leaves out keeps its
+        default.
+
+        Parameters:
+            path (str): The file to read.
+
+        Returns:
+            Evaluation: The evaluation described by the file.
+
+        Raises:
+            ValueError: If the file is not valid JSON or its values or tables have the wrong size.
+        """
+        with open(path) as file:
+            data = json.load(file)
+        return cls(data.get('middlegame_values', MIDDLEGAME_VALUES), data.get('endgame_values', ENDGAME_VALUES),
+                   data.get('middlegame_tables', MIDDLEGAME_TABLES), data.get('endgame_tables', ENDGAME_TABLES))
+
+    def save(self, path: str):
+        """
+        Writes the values and tables to a JSON file, so they can be tuned by hand and read back with load.
+
+        Parameters:
+            path (str): The file to write.
+        """
+        data = {'middlegame_values': self.middlegame_values, 'endgame_values': self.endgame_values,
+                'middlegame_tables': self.middlegame_tables, 'endgame_tables': self.endgame_tables}
+        with open(path, 'w') as file:
+            json.dump(data, file)
+
+    def score_board(self, board: list) -> tuple:
+        """
+        Adds up the scores of a whole board. Models keep these totals as pieces move, so this is only needed to
+        start them off or to check them.
+
+        Parameters:
+            board (list): The board as 8 rows of 8 pieces or None, such as ChessModel.board.
+
+        Returns:
+            tuple: The middlegame score, the endgame score and the game phase, with scores positive for white.
+        """
+        middlegame = endgame = phase = 0
+        for row in range(8):
+            for col in range(8):
+                piece = board[row][col]
+                if piece is not None:
+                    middlegame += self.middlegame_scores[piece.side][piece.code][row * 8 + col]
+                    endgame += self.endgame_scores[piece.side][piece.code][row * 8 + col]
+                    phase += PHASE_WEIGHTS[piece.code]
+        return middlegame, endgame, phase
+
+    @staticmethod
+    def blend(middlegame: int, endgame: int, phase: int) -> int:
+        """
+        Interpolates between the middlegame and endgame scores by game phase.
+
+        Parameters:
+            middlegame (int): The middlegame score.
+            endgame (int): The endgame score.
+            phase (int): The phase, from 0 in a bare endgame up to MAX_PHASE with all pieces on the board.
+                Promotions can push it past MAX_PHASE, which counts as MAX_PHASE.
+
+        Returns:
+            int: The blended score, rounded down.
+        """
+        if phase > MAX_PHASE:
+            phase = MAX_PHASE
+        return (middlegame * phase + endgame * (MAX_PHASE - phase)) // MAX_PHASE
+
+
+DEFAULT_EVALUATION = Evaluation()
@@ -0,0 +1,75 @@
+import argparse
+import time
+from chess_model import ChessModel
+
+
+def read_fens(source, model: ChessModel = None):
+    """
+    Streams the positions of a file with one FEN per line. Lines are read one at a time, so files of any size
+    can be loaded. Blank lines, lines starting with '#' and anything after a ';' (EPD operations) are skipped.
+
+    Parameters:
+        source: The path of the file, or an open text file or other iterable of lines.
+        model (ChessModel): A model to load every position into in turn, or None to build a new model per line.
+            Reusing a model avoids building one per position, but it only holds the latest position.
+
+    Returns:
+        generator: The model of every position, in file order.
+
+    Raises:
+        ValueError: If a line is not a FEN position, naming the line.
+    """
+    if isinstance(source, str):
+        with open(source) as file:
+            yield from read_fens(file, model)
+        return
+    for number, line in enumerate(source, 1):
+        fen = line.partition(';')[0].strip()
+        if not fen or fen[0] == '#':
+            continue
+        try:
+            if model is None:
+                yield ChessModel.from_fen(fen)
+            else:
+                model.set_fen(fen)
+                yield model
+        except ValueError as error:
+            raise ValueError(f'Line {number}: {error}') from None
+
+
+def write_fens(models, path: str) -> int:
+    """
+    Writes positions to a file with one FEN per line.
+
+    Parameters:
+        models: An iterable of the models to write.
+        path (str): The file to write.
+
+    Returns:
+        int: The number of positions written.
+    """
+    count = 0
+    with open(path, 'w') as file:
+        for model in models:
+            file.write(model.to_fen() + '\n')
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load every position of a FEN file and report the speed.')
+    parser.add_argument('path', help='file with one FEN per line')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = 0
+    for _ in read_fens(args.path, ChessModel()):
+        count += 1
+    elapsed = time.perf_counter() - start
+    print(f'Positions: {count}')
+    print(f'Time: {elapsed:.3f}s')
+    print(f'Positions/second: {count / elapsed if elapsed else 0:.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,21 @@
 from chess_piece import ChessPiece
+from bitboard import KING
 from move import Move
 
 
 class King(ChessPiece):
+    __slots__ = ()
+    code = KING
+
     def __str__(self) -> str:
         return 'King'
 
     def type(self) -> str:
         return 'King'
 
+    def possible_moves(self, row: int, col: int, board) -> list:
+        return self._step_moves(row, col, board, ((1, 1), (1, 0), (1, -1), (0, 1), (0, -1), (-1, 1), (-1, 0), (-1, -1)))
+
     def is_valid_move(self, move: Move, board) -> bool:
         # Inherits from parent function to check basic move validity (like moving within board bounds)
         if not super().is_valid_move(move, board):
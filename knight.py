@@ -1,14 +1,21 @@
 from chess_piece import ChessPiece
+from bitboard import KNIGHT
 from move import Move
 
 
 class Knight(ChessPiece):
+    __slots__ = ()
+    code = KNIGHT
+
     def __str__(self) -> str:
         return 'Knight'
 
     def type(self) -> str:
         return 'Knight'
 
+    def possible_moves(self, row: int, col: int, board) -> list:
+        return self._step_moves(row, col, board, ((2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2)))
+
     # FIX ME
     # Knight moves two squares vertically or horizontally, and then one more square the opposite axis.
     def is_valid_move(self, move: Move, board) -> bool:
@@ -1,11 +1,127 @@
+from array import array
+from bitboard import KNIGHT, QUEEN
+
+# Layout of a packed move: destination square in bits 0-5, source square in bits 6-11, promotion piece type in
+# bits 12-13 (knight, bishop, rook, queen), then a promotion flag and a capture flag
+_TO_MASK = 0x3F
+_FROM_SHIFT = 6
+_PROMOTION_SHIFT = 12
+PROMOTION_FLAG = 1 << 14
+CAPTURE_FLAG = 1 << 15
+# Bits that identify a move; the capture flag only describes it
+_IDENTITY_MASK = CAPTURE_FLAG - 1
+
+
 class Move:
-    def __init__(self, from_row, from_col, to_row, to_col):
+    __slots__ = ('from_row', 'from_col', 'to_row', 'to_col', 'packed')
+
+    def __init__(self, from_row, from_col, to_row, to_col, promotion=None, capture=False):
         self.from_row = from_row
         self.from_col = from_col
         self.to_row = to_row
         self.to_col = to_col
+        if promotion is not None and not KNIGHT <= promotion <= QUEEN:
+            raise ValueError(f'A pawn cannot promote to piece type {promotion}')
+        # Moves that leave the board cannot be packed; they are never valid and only compare by their squares
+        if not (0 <= from_row < 8 and 0 <= from_col < 8 and 0 <= to_row < 8 and 0 <= to_col < 8):
+            self.packed = None
+            return
+        packed = (from_row * 8 + from_col) << _FROM_SHIFT | (to_row * 8 + to_col)
+        if promotion is not None:
+            packed |= PROMOTION_FLAG | (promotion - 1) << _PROMOTION_SHIFT
+        if capture:
+            packed |= CAPTURE_FLAG
+        self.packed = packed
+
+    @classmethod
+    def from_packed(cls, packed: int):
+        """
+        Unpacks a move from its 16-bit form.
+
+        Parameters:
+            packed (int): The packed move.
+
+        Returns:
+            Move: The move.
+        """
+        move = cls.__new__(cls)
+        from_sq = packed >> _FROM_SHIFT & 0x3F
+        to_sq = packed & _TO_MASK
+        move.from_row = from_sq >> 3
+        move.from_col = from_sq & 7
+        move.to_row = to_sq >> 3
+        move.to_col = to_sq & 7
+        move.packed = packed
+        return move
+
+    @property
+    def promotion(self):
+        """
+        Property to get the piece type a pawn is promoted to, as a bitboard piece type index.
+
+        Returns:
+            int: The piece type, or None if the move does not name a promotion.
+        """
+        if self.packed is None or not self.packed & PROMOTION_FLAG:
+            return None
+        return (self.packed >> _PROMOTION_SHIFT & 3) + 1
+
+    @property
+    def is_capture(self) -> bool:
+        """
+        Property to get whether the move was generated as a capture.
+
+        Returns:
+            bool: True if the move captures a piece.
+        """
+        return self.packed is not None and bool(self.packed & CAPTURE_FLAG)
+
+    def __eq__(self, other):
+        if not isinstance(other, Move):
+            return NotImplemented
+        if self.packed is None or other.packed is None:
+            return (self.from_row, self.from_col, self.to_row, self.to_col) == \
+                (other.from_row, other.from_col, other.to_row, other.to_col)
+        return self.packed & _IDENTITY_MASK == other.packed & _IDENTITY_MASK
+
+    def __hash__(self):
+        if self.packed is None:
+            return hash((self.from_row, self.from_col, self.to_row, self.to_col))
+        return self.packed & _IDENTITY_MASK
+
+    def __reduce__(self):
+        # Pickled as the 16-bit form, which keeps move lists small when sent to worker processes
+        if self.packed is None:
+            return Move, (self.from_row, self.from_col, self.to_row, self.to_col)
+        return Move.from_packed, (self.packed,)
 
     def __str__(self):
         output = f'Move [from_row={self.from_row}, from_col={self.from_col}'
         output += f', to_row={self.to_row}, to_col={self.to_col}]'
-        return output	
+        return output
+
+
+def pack_moves(moves) -> array:
+    """
+    Stores moves in a compact buffer of 16-bit integers. Every move must be on the board.
+
+    Parameters:
+        moves (list): The moves to store.
+
+    Returns:
+        array: An array('H') holding the packed moves.
+    """
+    return array('H', [move.packed for move in moves])
+
+
+def unpack_moves(buffer) -> list:
+    """
+    Reads moves stored by pack_moves.
+
+    Parameters:
+        buffer (array): The packed moves.
+
+    Returns:
+        list: The moves.
+    """
+    return [Move.from_packed(packed) for packed in buffer]
@@ -0,0 +1,298 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+from chess_model import ChessModel
+from bitboard import PAWN
+from move import Move, CAPTURE_FLAG, PROMOTION_FLAG
+from pgn import PgnReader, parse_san, san_moves
+
+# One entry per book move: the Zobrist key of the position, the packed move without its capture flag and the
+# weight of the move. Big-endian, so the file sorts the same way byte by byte as by key.
+ENTRY = struct.Struct('>QHH')
+ENTRY_BYTES = ENTRY.size
+MAX_WEIGHT = 0xFFFF
+_KEY = struct.Struct('>Q')
+# The from and to squares of a packed move, which is all a generated move has to match a book move on
+_SQUARES = 0xFFF
+
+
+class BookBuilder:
+    def __init__(self, max_plies: int = 20):
+        """
+        Initialize a builder that counts how often each move is played in each position of a set of games, to be
+        written out as an opening book.
+
+        Parameters:
+            max_plies (int): The number of plies of each game that go into the book.
+        """
+        self.max_plies = max_plies
+        self.games = 0
+        self.__weights = {}
+
+    def __len__(self):
+        return len(self.__weights)
+
+    def add_game(self, moves, fen: str = None, weight: int = 1) -> int:
+        """
+        Replays a game and adds its opening moves to the book. The game stops counting at the first move that is
+        not legal.
+
+        Parameters:
+            moves: The moves of the game, as Move objects or in standard algebraic notation.
+            fen (str): The position the game starts from, or None for the starting position.
+            weight (int): The weight added to every move of the game.
+
+        Returns:
+            int: The number of moves added.
+        """
+        model = ChessModel.from_fen(fen) if fen else ChessModel()
+        weights = self.__weights
+        added = 0
+        for move in moves:
+            if added >= self.max_plies:
+                break
+            try:
+                if isinstance(move, str):
+                    move = parse_san(model, move)
+                elif not model.is_valid_move(move):
+                    break
+            except ValueError:
+                break
+            entry = (model.zobrist_key, move.packed & ~CAPTURE_FLAG)
+            weights[entry] = weights.get(entry, 0) + weight
+            model.move(move)
+            added += 1
+        self.games += 1
+        return added
+
+    def add_movetext(self, movetext: str, fen: str = None) -> int:
+        """
+        Adds a game written as PGN movetext or a plain list of moves, such as '1. e4 e5 2. Nf3 Nc6'.
+
+        Parameters:
+            movetext (str): The moves of the game.
+            fen (str): The position the game starts from, or None for the starting position.
+
+        Returns:
+            int: The number of moves added.
+        """
+        return self.add_game(san_moves(movetext), fen)
+
+    def add_pgn(self, path: str) -> int:
+        """
+        Adds every game of a PGN file.
+
+        Parameters:
+            path (str): The PGN file.
+
+        Returns:
+            int: The number of games added.
+        """
+        count = 0
+        for header, movetext in PgnReader(path).games():
+            self.add_movetext(movetext, header.get('FEN'))
+            count += 1
+        return count
+
+    def add_move_lists(self, path: str) -> int:
+        """
+        Adds the games of a text file with one game per line, each a list of moves in standard algebraic notation.
+        Blank lines and lines starting with '#' are skipped.
+
+        Parameters:
+            path (str): The file of move lists.
+
+        Returns:
+            int: The number of games added.
+        """
+        count = 0
+        with open(path) as file:
+            for line in file:
+                line = line.strip()
+                if line and line[0] != '#':
+                    self.add_movetext(line)
+                    count += 1
+        return count
+
+    def write(self, path: str, min_weight: int = 1) -> int:
+        """
+        Writes the book sorted by position key. Weights too large for an entry are scaled down with the other moves
+        of the same position, so their proportions are kept. The file is replaced in one step, so books open in
+        other processes are not disturbed.
+
+        Parameters:
+            path (str): The book file to write.
+            min_weight (int): The weight below which moves are left out of the book.
+
+        Returns:
+            int: The number of entries written.
+        """
+        entries = sorted((key, move, weight) for (key, move), weight in self.__weights.items()
+                         if weight >= min_weight)
+        largest = {}
+        for key, _, weight in entries:
+            if weight > largest.get(key, 0):
+                largest[key] = weight
+        data = bytearray(len(entries) * ENTRY_BYTES)
+        for index, (key, move, weight) in enumerate(entries):
+            if largest[key] > MAX_WEIGHT:
+                weight = max(1, weight * MAX_WEIGHT // largest[key])
+            ENTRY.pack_into(data, index * ENTRY_BYTES, key, move, weight)
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(data)
+        os.replace(temporary, path)
+        return len(entries)
+
+
+class OpeningBook:
+    def __init__(self, path: str):
+        """
+        Opens a book written by BookBuilder. The file is memory-mapped rather than read, so opening is instant
+        whatever its size, and processes using the same book share its pages.
+
+        Parameters:
+            path (str): The book file.
+
+        Raises:
+            ValueError: If the file size is not a whole number of entries.
+        """
+        self.path = path
+        with open(path, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            if size % ENTRY_BYTES:
+                raise ValueError(f'Not an opening book: {path}')
+            # An empty file cannot be mapped, and has nothing to look up anyway
+            self.__data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self.__count = size // ENTRY_BYTES
+
+    def __len__(self):
+        return self.__count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __reduce__(self):
+        # Worker processes map the file again rather than receiving a copy of it
+        return OpeningBook, (self.path,)
+
+    def close(self):
+        """
+        Unmaps the book file.
+        """
+        if isinstance(self.__data, mmap.mmap):
+            self.__data.close()
+        self.__data = b''
+        self.__count = 0
+
+    def lookup(self, key: int) -> list:
+        """
+        Finds the book entries of a position by binary search.
+
+        Parameters:
+            key (int): The Zobrist key of the position.
+
+        Returns:
+            list: A (packed move, weight) tuple per book move, without capture flags.
+        """
+        data = self.__data
+        low, high = 0, self.__count
+        while low < high:
+            middle = (low + high) // 2
+            if _KEY.unpack_from(data, middle * ENTRY_BYTES)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        while low < self.__count:
+            entry_key, move, weight = ENTRY.unpack_from(data, low * ENTRY_BYTES)
+            if entry_key != key:
+                break
+            entries.append((move, weight))
+            low += 1
+        return entries
+
+    def moves(self, model: ChessModel) -> list:
+        """
+        Lists the book moves of a position that are legal in it, which also guards against two positions sharing a
+        key.
+
+        Parameters:
+            model (ChessModel): The position.
+
+        Returns:
+            list: A (Move, weight) tuple per book move.
+        """
+        entries = self.lookup(model.zobrist_key)
+        if not entries:
+            return []
+        legal = {move.packed & _SQUARES: move for move in model.generate_all_valid_moves()}
+        moves = []
+        for packed, weight in entries:
+            move = legal.get(packed & _SQUARES)
+            if move is None or not weight:
+                continue
+            if packed & PROMOTION_FLAG:
+                # Generated moves leave the promotion piece out, so the one the book names is put back
+                piece = model.piece_at(move.from_row, move.from_col)
+                if piece.code != PAWN or move.to_row not in (0, 7):
+                    continue
+                move = Move(move.from_row, move.from_col, move.to_row, move.to_col,
+                            promotion=Move.from_packed(packed).promotion, capture=move.is_capture)
+            moves.append((move, weight))
+        return moves
+
+    def choose(self, model: ChessModel, rng: random.Random = None) -> Move:
+        """
+        Picks a book move at random, each in proportion to its weight.
+
+        Parameters:
+            model (ChessModel): The position.
+            rng (random.Random): The source of randomness, or None for the random module.
+
+        Returns:
+            Move: The chosen move, or None if the position is not in the book.
+        """
+        moves = self.moves(model)
+        if not moves:
+            return None
+        return (rng or random).choices([move for move, _ in moves], [weight for _, weight in moves])[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build an opening book, or list the book moves of a position.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='compile games into a book')
+    build.add_argument('book', help='book file to write')
+    build.add_argument('inputs', nargs='+', help='PGN files, or text files with one list of moves per line')
+    build.add_argument('--plies', type=int, default=20, help='plies of each game that go into the book')
+    build.add_argument('--min-weight', type=int, default=1, help='weight below which moves are left out')
+    probe = commands.add_parser('probe', help='list the book moves of a position')
+    probe.add_argument('book', help='book file to read')
+    probe.add_argument('fen', nargs='?', help='position to look up; the starting position if left out')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        builder = BookBuilder(args.plies)
+        for path in args.inputs:
+            if path.lower().endswith('.pgn'):
+                builder.add_pgn(path)
+            else:
+                builder.add_move_lists(path)
+        count = builder.write(args.book, args.min_weight)
+        print(f'Games: {builder.games}')
+        print(f'Entries: {count}')
+    else:
+        model = ChessModel.from_fen(args.fen) if args.fen else ChessModel()
+        with OpeningBook(args.book) as book:
+            for move, weight in sorted(book.moves(model), key=lambda item: -item[1]):
+                print(f'{move}: {weight}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+import argparse
+import multiprocessing
+import os
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, wait
+from chess_model import ChessModel
+from move import pack_moves, unpack_moves
+from search import Searcher, SearchResult, MATE_SCORE, MATE_BOUND
+from tablebase import Tablebase
+
+# How often the driver checks the caller's stop event while the workers search, in seconds
+_POLL_INTERVAL = 0.05
+
+# Searcher of each worker process, kept between tasks so its transposition table is reused
+_worker_searcher = None
+# Set by the driver to stop every worker's search at once
+_worker_stop = None
+
+
+def _init_worker(size_mb: float, stop):
+    global _worker_searcher, _worker_stop
+    _worker_searcher = Searcher(size_mb=size_mb)
+    _worker_stop = stop
+
+
+def _search_chunk(position: bytes, moves, depth: int, time_limit: float, node_limit: int, tablebase: str):
+    # Runs in a worker: the position and the moves arrive packed and the line goes back packed. Only the requested
+    # depth is searched, the table holding what the worker found at shallower depths.
+    searcher = _worker_searcher
+    if depth == 1:
+        searcher.table.new_search()
+    if tablebase is None:
+        searcher.tablebase = None
+    elif searcher.tablebase is None or searcher.tablebase.directory != tablebase:
+        searcher.tablebase = Tablebase(tablebase)
+    model = ChessModel.from_bytes(position)
+    # The first iteration always completes, so there is a move to play
+    limited = depth > 1
+    result = searcher.search_depth(model, depth, time_limit=time_limit if limited else None,
+                                   node_limit=node_limit if limited else None,
+                                   stop_event=_worker_stop if limited else None, root_moves=unpack_moves(moves))
+    if result is None:
+        return False, 0, b'', searcher.nodes
+    return True, result.score, pack_moves(result.pv), result.nodes
+
+
+class ParallelSearcher:
+    def __init__(self, workers: int = None, size_mb: float = 16, tablebase: Tablebase = None):
+        """
+        Initialize a searcher that splits the root moves across a pool of worker processes. Each worker runs the
+        ordinary alpha-beta search over its share of the moves and keeps its own transposition table. It takes
+        the same arguments to search as Searcher, so it can be set as ChessModel.searcher.
+
+        Parameters:
+            workers (int): The number of worker processes, or None for one per CPU.
+            size_mb (float): The memory budget of each worker's transposition table.
+            tablebase (Tablebase): Endgame tables that score the positions they cover exactly, or None. Workers
+                open the same directory themselves.
+        """
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.tablebase = tablebase
+        self.nodes = 0
+        self.__stop = multiprocessing.Event()
+        self.__pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                          initargs=(size_mb, self.__stop))
+
+    def close(self):
+        """
+        Shuts down the worker processes.
+        """
+        self.__pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def search(self, model: ChessModel, max_depth: int = 64, time_limit: float = None, node_limit: int = None,
+               stop_event=None, root_moves: list = None) -> SearchResult:
+        """
+        Searches a position one ply deeper at a time. Every iteration hands each worker a share of the root
+        moves, best moves of the previous iteration spread across workers first, and keeps the best score.
+        Workers search only the new depth, as their tables already hold the shallower ones. The first iteration
+        always completes, and the move of the last completed iteration is returned.
+
+        Parameters:
+            model (ChessModel): The position to search. It is left unchanged.
+            max_depth (int): The deepest iteration to run.
+            time_limit (float): The wall-clock budget in seconds, or None for no limit.
+            node_limit (int): The budget of positions visited by all workers together, or None for no limit.
+            stop_event (threading.Event): An event that stops the search when set, or None.
+            root_moves (list): The moves to choose from at the root, or None for every legal move.
+
+        Returns:
+            SearchResult: The best move with its score and the nodes searched by all workers.
+        """
+        start = time.perf_counter()
+        self.__stop.clear()
+        moves = model.generate_all_valid_moves()
+        if root_moves is not None:
+            moves = [move for move in moves if move in root_moves]
+        result = SearchResult(None, 0, 0, 0, 0.0, [])
+        if not moves:
+            result.score = -MATE_SCORE if model.in_check(model.current_player) else 0
+            return result
+        position = model.to_bytes()
+        tablebase = self.tablebase.directory if self.tablebase is not None else None
+        ordered = [move.packed for move in moves]
+        nodes = 0
+        for depth in range(1, max_depth + 1):
+            remaining = None
+            budget = None
+            if depth > 1:
+                if stop_event is not None and stop_event.is_set():
+                    break
+                if time_limit is not None:
+                    remaining = start + time_limit - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                if node_limit is not None and nodes >= node_limit:
+                    break
+            chunks = [ordered[i::self.workers] for i in range(self.workers) if ordered[i::self.workers]]
+            if node_limit is not None and depth > 1:
+                # Each worker gets an equal share of what is left of the budget
+                budget = max(1, (node_limit - nodes) // len(chunks))
+            futures = [self.__pool.submit(_search_chunk, position, array('H', chunk), depth, remaining, budget,
+                                          tablebase)
+                       for chunk in chunks]
+            self.__wait(futures, stop_event if depth > 1 else None)
+            scored = []
+            complete = True
+            for future in futures:
+                chunk_complete, score, pv, chunk_nodes = future.result()
+                nodes += chunk_nodes
+                complete = complete and chunk_complete
+                if pv:
+                    scored.append((score, pv))
+            if not complete:
+                break
+            scored.sort(key=lambda item: item[0], reverse=True)
+            score, pv = scored[0]
+            line = unpack_moves(pv)
+            result = SearchResult(line[0], score, depth, nodes, 0.0, line)
+            # Order the next iteration by this one's results
+            first = [pv[0] for _, pv in scored]
+            ordered = first + [move for move in ordered if move not in first]
+            if abs(score) >= MATE_BOUND:
+                break
+        self.nodes = nodes
+        result.nodes = nodes
+        result.time = time.perf_counter() - start
+        return result
+
+    def __wait(self, futures: list, stop_event):
+        # Waits for every worker, passing the caller's stop event on to them when it is set
+        if stop_event is None:
+            wait(futures)
+            return
+        while wait(futures, timeout=_POLL_INTERVAL).not_done:
+            if stop_event.is_set():
+                self.__stop.set()
+                wait(futures)
+                return
+
+
+def measure_speedup(model: ChessModel, depth: int, workers: int) -> dict:
+    """
+    Times a fixed-depth search of a position with the single-process searcher and with the root-split searcher.
+
+    Parameters:
+        model (ChessModel): The position to search.
+        depth (int): The depth of both searches.
+        workers (int): The number of worker processes of the parallel search.
+
+    Returns:
+        dict: The time and node count of both searches and the speedup of the parallel one.
+    """
+    serial = Searcher().search(model, max_depth=depth)
+    with ParallelSearcher(workers) as searcher:
+        # Start the workers before timing so process start-up is not counted
+        searcher.search(model, max_depth=1)
+        parallel = searcher.search(model, max_depth=depth)
+    return {'depth': depth, 'workers': workers,
+            'serial_time': serial.time, 'serial_nodes': serial.nodes, 'serial_score': serial.score,
+            'parallel_time': parallel.time, 'parallel_nodes': parallel.nodes, 'parallel_score': parallel.score,
+            'speedup': serial.time / parallel.time if parallel.time else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the single-process and root-split searches.')
+    parser.add_argument('--depth', type=int, default=3, help='depth of both searches')
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4], help='worker counts to measure')
+    args = parser.parse_args()
+    for workers in args.workers:
+        report = measure_speedup(ChessModel(), args.depth, workers)
+        print(f"{workers} workers: serial {report['serial_time']:.2f}s, parallel {report['parallel_time']:.2f}s, "
+              f"speedup {report['speedup']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
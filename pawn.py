@@ -1,11 +1,12 @@
 from chess_piece import ChessPiece
+from bitboard import PAWN
 from player import Player
 from move import Move
 
 
 class Pawn(ChessPiece):
-    def __init__(self, player):
-        super().__init__(player)
+    __slots__ = ()
+    code = PAWN
 
     def __str__(self) -> str:
         return f"pawn"
@@ -13,6 +14,33 @@ class Pawn(ChessPiece):
     def type(self) -> str:
         return 'Pawn'
 
+    def possible_moves(self, row: int, col: int, board) -> list:
+        if self.player == Player.BLACK:
+            direction = 1
+            starting_row = 1
+        else:
+            direction = -1
+            starting_row = 6
+
+        moves = []
+        to_row = row + direction
+        if not 0 <= to_row < len(board):
+            return moves
+
+        # Move forward one square, or two from the starting row, if the squares are empty
+        if board[to_row][col] is None:
+            moves.append(Move(row, col, to_row, col))
+            if row == starting_row and 0 <= to_row + direction < len(board) and board[to_row + direction][col] is None:
+                moves.append(Move(row, col, to_row + direction, col))
+
+        # Capture diagonally
+        for to_col in (col - 1, col + 1):
+            if 0 <= to_col < len(board[0]):
+                target = board[to_row][to_col]
+                if target is not None and target.player != self.player:
+                    moves.append(Move(row, col, to_row, to_col, capture=True))
+        return moves
+
     # First move pawns can move forward two squares, then only one. They capture diagonally + en passant lol
     def is_valid_move(self, move: Move, board) -> bool:
         if not super().is_valid_move(move, board):
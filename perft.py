@@ -0,0 +1,127 @@
+import argparse
+import time
+from chess_model import ChessModel, START_FEN
+
+
+def perft(model: ChessModel, depth: int) -> int:
+    """
+    Counts the leaf nodes of the move tree to a fixed depth, using generate_all_valid_moves, move and undo exactly
+    as the engine does.
+
+    Parameters:
+        model (ChessModel): The position to count from. It is left unchanged.
+        depth (int): The number of plies to search.
+
+    Returns:
+        int: The number of positions reached after depth plies.
+    """
+    if depth == 0:
+        return 1
+    moves = model.generate_all_valid_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        model.move(move)
+        nodes += perft(model, depth - 1)
+        model.undo()
+    return nodes
+
+
+def divide(model: ChessModel, depth: int) -> list:
+    """
+    Splits a perft count by the first move, which helps to find the move where two move generators disagree.
+
+    Parameters:
+        model (ChessModel): The position to count from. It is left unchanged.
+        depth (int): The number of plies to search, at least 1.
+
+    Returns:
+        list: A list of (move, nodes) tuples, one per legal move.
+    """
+    results = []
+    for move in model.generate_all_valid_moves():
+        model.move(move)
+        results.append((move, perft(model, depth - 1)))
+        model.undo()
+    return results
+
+
+# Reference positions as (name, FEN, {depth: nodes}). The starting position matches the published perft counts,
+# which involve no castling, en passant or under-promotion up to depth 4. The other counts are not published
+# figures: they were taken from the original square-by-square move generator and follow this game's rules, where
+# pawns always promote to a queen.
+REFERENCE_POSITIONS = [
+    ('start', START_FEN, {1: 20, 2: 400, 3: 8902, 4: 197281}),
+    ('promotion', '4k2n/P5P1/8/8/8/8/1p6/R3K3 w - - 0 1', {1: 16, 2: 102, 3: 1770, 4: 15887}),
+    ('check-evasion', 'k7/1q6/5p2/2P5/4N3/8/6B1/3r3K w - - 0 1', {1: 2, 2: 70, 3: 735, 4: 20119}),
+]
+
+
+def check_reference(max_depth: int = 3) -> list:
+    """
+    Runs perft on every reference position and compares the counts with the expected ones.
+
+    Parameters:
+        max_depth (int): The deepest depth to check.
+
+    Returns:
+        list: A list of (name, depth, expected, counted) tuples for every count that did not match.
+    """
+    failures = []
+    for name, fen, expected in REFERENCE_POSITIONS:
+        for depth, nodes in sorted(expected.items()):
+            if depth > max_depth:
+                continue
+            counted = perft(ChessModel.from_fen(fen), depth)
+            if counted != nodes:
+                failures.append((name, depth, nodes, counted))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Count move tree leaf nodes to measure move generation.')
+    parser.add_argument('depth', type=int, nargs='?', default=3, help='number of plies to search')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--position', default='start', choices=[name for name, _, _ in REFERENCE_POSITIONS],
+                        help='reference position to search from')
+    source.add_argument('--fen', help='position to search from, in Forsyth-Edwards Notation')
+    parser.add_argument('--expect', type=int, help='node count the search should reach; exits with 1 if it does not')
+    parser.add_argument('--divide', action='store_true', help='print the node count of every root move')
+    parser.add_argument('--check', action='store_true', help='check every reference position up to depth')
+    args = parser.parse_args()
+
+    if args.check:
+        failures = check_reference(args.depth)
+        for name, depth, expected, counted in failures:
+            print(f'{name} depth {depth}: expected {expected}, counted {counted}')
+        print('OK' if not failures else f'{len(failures)} mismatches')
+        raise SystemExit(1 if failures else 0)
+
+    if args.fen:
+        try:
+            model = ChessModel.from_fen(args.fen)
+        except ValueError as e:
+            parser.error(str(e))
+    else:
+        fen = next(fen for name, fen, _ in REFERENCE_POSITIONS if name == args.position)
+        model = ChessModel.from_fen(fen)
+    start = time.perf_counter()
+    if args.divide:
+        nodes = 0
+        for move, count in divide(model, args.depth):
+            print(f'{move}: {count}')
+            nodes += count
+    else:
+        nodes = perft(model, args.depth)
+    elapsed = time.perf_counter() - start
+    print(f'Nodes: {nodes}')
+    print(f'Time: {elapsed:.3f}s')
+    print(f'Nodes/second: {nodes / elapsed if elapsed else 0:.0f}')
+    if args.expect is not None and nodes != args.expect:
+        print(f'Expected {args.expect} nodes, counted {nodes}')
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
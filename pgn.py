@@ -0,0 +1,285 @@
+import argparse
+import re
+import time
+from array import array
+from chess_model import ChessModel
+from move import Move
+from bitboard import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+
+_TAG = re.compile(rb'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+# Comments, variation brackets, annotation glyphs, move numbers and everything else as a single token
+_TOKEN = re.compile(r'\{[^}]*\}|;[^\n]*|[()]|\$\d+|\d+\.+|[^\s(){};.]+')
+_SAN = re.compile(r'([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?[+#!?]*')
+_RESULTS = {'1-0', '0-1', '1/2-1/2', '*'}
+_SAN_PIECES = {'N': KNIGHT, 'B': BISHOP, 'R': ROOK, 'Q': QUEEN, 'K': KING}
+
+
+def square_name(row: int, col: int) -> str:
+    """
+    Names a square in algebraic notation. Row 0 is the eighth rank, where black starts.
+
+    Parameters:
+        row (int): The row of the square.
+        col (int): The column of the square.
+
+    Returns:
+        str: The name of the square, such as 'e4'.
+    """
+    return 'abcdefgh'[col] + str(8 - row)
+
+
+def parse_san(model: ChessModel, san: str, moves: list = None) -> Move:
+    """
+    Finds the legal move a move in standard algebraic notation stands for. A pawn reaching the last rank without
+    a promotion piece is promoted to a queen.
+
+    Parameters:
+        model (ChessModel): The position the move is played in.
+        san (str): The move, such as 'e4', 'Nbd7', 'exd5' or 'a8=N+'.
+        moves (list): The legal moves of the position, or None to generate them.
+
+    Returns:
+        Move: The move, naming its promotion piece if it promotes.
+
+    Raises:
+        ValueError: If the text is not a move, or it matches no legal move or more than one.
+    """
+    match = _SAN.fullmatch(san)
+    if match is None:
+        # Castling and null moves land here too, since the game has neither
+        raise ValueError(f'Not a legal move: {san}')
+    piece, from_file, from_rank, target, promotion = match.groups()
+    code = _SAN_PIECES[piece] if piece else PAWN
+    to_row = 8 - int(target[1])
+    to_col = ord(target[0]) - 97
+    from_col = ord(from_file) - 97 if from_file else None
+    from_row = 8 - int(from_rank) if from_rank else None
+
+    board = model.board
+    if moves is None:
+        # Only moves of the named piece type to the target square need checking for legality
+        moves = [move for row, col in model.piece_squares(model.current_player) if board[row][col].code == code
+                 for move in board[row][col].possible_moves(row, col, board)
+                 if move.to_row == to_row and move.to_col == to_col and model.is_valid_move(move)]
+    found = None
+    for move in moves:
+        if (move.to_row == to_row and move.to_col == to_col and board[move.from_row][move.from_col].code == code
+                and (from_col is None or move.from_col == from_col)
+                and (from_row is None or move.from_row == from_row)):
+            if found is not None:
+                raise ValueError(f'Ambiguous move: {san}')
+            found = move
+    if found is None:
+        raise ValueError(f'Not a legal move: {san}')
+    if code == PAWN and to_row in (0, 7):
+        promoted = _SAN_PIECES[promotion] if promotion else QUEEN
+        return Move(found.from_row, found.from_col, to_row, to_col, promotion=promoted, capture=found.is_capture)
+    if promotion:
+        raise ValueError(f'Not a legal move: {san}')
+    return found
+
+
+class PgnReader:
+    def __init__(self, path: str):
+        """
+        Initialize a reader of a PGN file. Games are read one at a time, so the file can be far larger than memory.
+        The byte offset of every game seen is kept in a compact index, so going back to a game, or past it to a
+        later one, does not read the games before it again.
+
+        Parameters:
+            path (str): The PGN file to read.
+        """
+        self.path = path
+        self.__offsets = array('Q')
+        # Whether the index reaches the end of the file
+        self.__complete = False
+        self.__end = 0
+
+    @property
+    def indexed_games(self) -> int:
+        """
+        Property to get the number of games in the index so far.
+
+        Returns:
+            int: The number of games whose offset is known.
+        """
+        return len(self.__offsets)
+
+    def __len__(self):
+        if not self.__complete:
+            self.build_index()
+        return len(self.__offsets)
+
+    def build_index(self):
+        """
+        Reads the rest of the file to find the offset of every game.
+        """
+        for _ in self.__scan(self.indexed_games, parse=False):
+            pass
+
+    def offset(self, index: int) -> int:
+        """
+        Finds the byte offset at which a game starts, reading ahead as far as needed.
+
+        Parameters:
+            index (int): The number of the game, counting from 0.
+
+        Returns:
+            int: The offset of the game's first line.
+
+        Raises:
+            IndexError: If the file has fewer games.
+        """
+        if index >= len(self.__offsets):
+            for _ in self.__scan(len(self.__offsets), parse=False):
+                if index < len(self.__offsets):
+                    break
+        if not 0 <= index < len(self.__offsets):
+            raise IndexError(f'No game {index} in {self.path}')
+        return self.__offsets[index]
+
+    def games(self, start: int = 0):
+        """
+        Reads games one at a time.
+
+        Parameters:
+            start (int): The number of the first game to read, counting from 0.
+
+        Returns:
+            generator: A (header, movetext) tuple per game, where the header is a dict of the game's tags.
+        """
+        if start and start >= len(self.__offsets):
+            self.offset(start - 1)
+        for _, header, movetext in self.__scan(start):
+            yield header, movetext
+
+    def records(self, start: int = 0, skip_invalid: bool = False):
+        """
+        Replays games through the model, one move at a time. A game with a FEN tag starts from that position.
+
+        Parameters:
+            start (int): The number of the first game to replay, counting from 0.
+            skip_invalid (bool): Whether to move on to the next game when a move cannot be played, instead of
+                raising.
+
+        Returns:
+            generator: A (header, position, move) tuple per move. The position is the model before the move is
+                made; it is the same object for the whole game and changes when the generator resumes.
+
+        Raises:
+            ValueError: If a move is not legal and skip_invalid is False, naming the game and move.
+        """
+        for number, (header, movetext) in enumerate(self.games(start), start):
+            model = ChessModel.from_fen(header['FEN']) if 'FEN' in header else ChessModel()
+            for san in san_moves(movetext):
+                try:
+                    move = parse_san(model, san)
+                except ValueError as error:
+                    if skip_invalid:
+                        break
+                    raise ValueError(f'Game {number}: {error}') from None
+                yield header, model, move
+                model.move(move)
+
+    def __scan(self, start: int, parse: bool = True):
+        # Reads games from the start of game start, adding new games to the index as they are found
+        if start < len(self.__offsets):
+            offset = self.__offsets[start]
+        elif start == len(self.__offsets) and not self.__complete:
+            offset = self.__end
+        else:
+            return
+        index = start
+        with open(self.path, 'rb') as file:
+            file.seek(offset)
+            position = offset
+            game_start = None
+            in_movetext = False
+            header = {}
+            movetext = []
+            for line in file:
+                line_start = position
+                position += len(line)
+                text = line.strip()
+                if not text or text[0] == 37:
+                    # Blank lines and '%' escape lines
+                    continue
+                if text[0] == 91:
+                    if in_movetext or game_start is None:
+                        # A tag after movetext starts the next game
+                        if game_start is not None:
+                            yield self.__found(index, game_start, line_start), header, '\n'.join(movetext)
+                            index += 1
+                            header = {}
+                            movetext = []
+                        game_start = line_start
+                        in_movetext = False
+                    match = _TAG.match(text) if parse else None
+                    if match:
+                        value = match.group(2).decode('utf-8', 'replace')
+                        header[match.group(1).decode()] = value.replace('\\"', '"')
+                else:
+                    if game_start is None:
+                        game_start = line_start
+                    in_movetext = True
+                    if parse:
+                        movetext.append(text.decode('utf-8', 'replace'))
+            if game_start is not None:
+                yield self.__found(index, game_start, position), header, '\n'.join(movetext)
+        self.__complete = True
+
+    def __found(self, index: int, offset: int, end: int) -> int:
+        if index == len(self.__offsets):
+            self.__offsets.append(offset)
+            self.__end = end
+        return offset
+
+
+def san_moves(movetext: str):
+    """
+    Picks the moves of the main line out of PGN movetext, skipping comments, variations, annotations, move numbers
+    and the result. A plain list of moves such as '1. e4 e5 2. Nf3' is movetext too.
+
+    Parameters:
+        movetext (str): The movetext of a game.
+
+    Returns:
+        generator: The moves in standard algebraic notation, in the order they were played.
+    """
+    depth = 0
+    for token in _TOKEN.findall(movetext):
+        first = token[0]
+        if first == '(':
+            depth += 1
+        elif first == ')':
+            depth -= 1
+        elif depth or first in '{;$' or token[-1] == '.':
+            continue
+        elif token in _RESULTS:
+            return
+        else:
+            yield token
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay the games of a PGN file and check every move is legal.')
+    parser.add_argument('path', help='PGN file')
+    parser.add_argument('--start', type=int, default=0, help='number of the first game to replay')
+    args = parser.parse_args()
+
+    reader = PgnReader(args.path)
+    start = time.perf_counter()
+    moves = 0
+    try:
+        for _ in reader.records(args.start):
+            moves += 1
+    except ValueError as error:
+        print(error)
+    elapsed = time.perf_counter() - start
+    print(f'Games: {reader.indexed_games - args.start}')
+    print(f'Moves: {moves}')
+    print(f'Moves/second: {moves / elapsed if elapsed else 0:.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+from collections import OrderedDict
+
+
+class PositionInfo:
+    """
+    What is known about one position. Each attribute is None until it is first worked out.
+
+    Attributes:
+        moves (tuple): The legal moves of the player to move.
+        legal (frozenset): The same moves as a set, for membership tests.
+        check (bool): Whether the player to move is in check.
+        status (GameStatus): The state of the game for the player to move.
+    """
+    __slots__ = ('moves', 'legal', 'check', 'status')
+
+    def __init__(self):
+        self.moves = None
+        self.legal = None
+        self.check = None
+        self.status = None
+
+
+class PositionCache:
+    def __init__(self, size: int = 1024):
+        """
+        Initialize a least-recently-used cache of what is known about positions, keyed by Zobrist key. Once the
+        cache is full, the position used least recently is dropped to make room for a new one.
+
+        Parameters:
+            size (int): The number of positions to keep, or 0 to keep none.
+
+        Raises:
+            ValueError: If the size is negative.
+        """
+        if size < 0:
+            raise ValueError('Cache size cannot be negative')
+        self.__size = size
+        self.__entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def size(self) -> int:
+        """
+        Property to get the number of positions the cache can hold.
+
+        Returns:
+            int: The capacity of the cache.
+        """
+        return self.__size
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, key: int):
+        return key in self.__entries
+
+    def lookup(self, key: int) -> PositionInfo:
+        """
+        Finds the entry of a position, adding an empty one if the position is not cached.
+
+        Parameters:
+            key (int): The Zobrist key of the position.
+
+        Returns:
+            PositionInfo: The entry of the position, to read from and fill in.
+        """
+        entries = self.__entries
+        info = entries.get(key)
+        if info is not None:
+            self.hits += 1
+            entries.move_to_end(key)
+            return info
+        self.misses += 1
+        info = PositionInfo()
+        if self.__size:
+            if len(entries) >= self.__size:
+                entries.popitem(last=False)
+                self.evictions += 1
+            entries[key] = info
+        return info
+
+    def clear(self):
+        """
+        Empties the cache and resets the statistics.
+        """
+        self.__entries.clear()
+        self.hits = self.misses = self.evictions = 0
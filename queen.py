@@ -1,14 +1,21 @@
 from chess_piece import ChessPiece
+from bitboard import QUEEN
 from move import Move
 
 
 class Queen(ChessPiece):
+    __slots__ = ()
+    code = QUEEN
+
     def __str__(self) -> str:
         return 'Queen'
 
     def type(self) -> str:
         return 'Queen'
 
+    def possible_moves(self, row: int, col: int, board) -> list:
+        return self._slide_moves(row, col, board, ((1, 1), (1, -1), (-1, 1), (-1, -1), (1, 0), (-1, 0), (0, 1), (0, -1)))
+
     # FIX ME
     def is_valid_move(self, move: Move, board) -> bool:
         if not super().is_valid_move(move, board):
@@ -0,0 +1,341 @@
+import time
+from transposition_table import TranspositionTable, Bound
+
+MATE_SCORE = 100000
+# Scores beyond this are mates, counted in plies from the root
+MATE_BOUND = MATE_SCORE - 1000
+# Value of each piece type for capture ordering, indexed by type code
+_ORDER_VALUES = (1, 3, 3, 5, 9, 100)
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class SearchResult:
+    """
+    The outcome of a search.
+
+    Attributes:
+        move (Move): The best move found, or None if the player has no legal move.
+        score (int): The score of the best move for the player to move, in centipawns.
+        depth (int): The deepest iteration that completed.
+        nodes (int): The number of positions visited.
+        time (float): The time the search took in seconds.
+        pv (list): The expected line of play starting with move.
+    """
+    __slots__ = ('move', 'score', 'depth', 'nodes', 'time', 'pv')
+
+    def __init__(self, move, score, depth, nodes, time, pv):
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.time = time
+        self.pv = pv
+
+
+def evaluate(model) -> int:
+    """
+    Scores a position for the player to move with the model's piece values and piece-square tables. The model
+    keeps the scores up to date as moves are made and undone, so this costs the same however many pieces are left.
+
+    Parameters:
+        model (ChessModel): The position to score.
+
+    Returns:
+        int: The score in centipawns, positive when the player to move is ahead.
+    """
+    return model.evaluate()
+
+
+class Searcher:
+    def __init__(self, table: TranspositionTable = None, size_mb: float = 16, tablebase=None):
+        """
+        Initialize a searcher that runs negamax alpha-beta with iterative deepening. The transposition table is
+        kept between searches, so later moves of the same game reuse earlier results.
+
+        Parameters:
+            table (TranspositionTable): The table to use, or None to create one.
+            size_mb (float): The memory budget of the table created when none is given.
+            tablebase (Tablebase): Endgame tables that score the positions they cover exactly, or None.
+        """
+        self.table = table if table is not None else TranspositionTable(size_mb)
+        self.tablebase = tablebase
+        self.nodes = 0
+        self.__deadline = None
+        self.__node_limit = None
+        self.__stop_event = None
+        self.__root_moves = None
+
+    def search(self, model, max_depth: int = 64, time_limit: float = None, node_limit: int = None,
+               stop_event=None, root_moves: list = None) -> SearchResult:
+        """
+        Searches a position one ply deeper at a time until a limit is reached. The first iteration always
+        completes, and the move of the last completed iteration is returned.
+
+        Parameters:
+            model (ChessModel): The position to search. It is left unchanged.
+            max_depth (int): The deepest iteration to run.
+            time_limit (float): The wall-clock budget in seconds, or None for no limit.
+            node_limit (int): The budget of visited positions, or None for no limit.
+            stop_event (threading.Event): An event that stops the search when set, or None.
+            root_moves (list): The moves to choose from at the root, or None for every legal move.
+
+        Returns:
+            SearchResult: The best move with its score and search statistics.
+        """
+        start = time.perf_counter()
+        self.nodes = 0
+        self.table.new_search()
+        self.__root_moves = set(root_moves) if root_moves is not None else None
+        result = SearchResult(None, 0, 0, 0, 0.0, [])
+        for depth in range(1, max_depth + 1):
+            # Let the first iteration finish so there is always a move to play
+            if depth > 1:
+                self.__deadline = start + time_limit if time_limit is not None else None
+                self.__node_limit = node_limit
+                self.__stop_event = stop_event
+            else:
+                self.__deadline = None
+                self.__node_limit = None
+                self.__stop_event = None
+            try:
+                score, move = self.__root(model, depth)
+            except SearchTimeout:
+                break
+            result = SearchResult(move, score, depth, self.nodes, 0.0, self.__line(model, move, depth))
+            if move is None or abs(score) >= MATE_BOUND:
+                break
+            if stop_event is not None and stop_event.is_set():
+                break
+        result.nodes = self.nodes
+        result.time = time.perf_counter() - start
+        return result
+
+    def search_depth(self, model, depth: int, time_limit: float = None, node_limit: int = None, stop_event=None,
+                     root_moves: list = None) -> SearchResult:
+        """
+        Searches a position to one depth without the shallower iterations, for callers that run iterative deepening
+        themselves. Results of earlier, shallower searches of the position left in the transposition table order
+        the moves. Unlike search, the limits apply from the start.
+
+        Parameters:
+            model (ChessModel): The position to search. It is left unchanged.
+            depth (int): The depth to search.
+            time_limit (float): The wall-clock budget in seconds, or None for no limit.
+            node_limit (int): The budget of visited positions, or None for no limit.
+            stop_event (threading.Event): An event that stops the search when set, or None.
+            root_moves (list): The moves to choose from at the root, or None for every legal move.
+
+        Returns:
+            SearchResult: The best move with its score and search statistics, or None if a limit was reached first.
+        """
+        start = time.perf_counter()
+        self.nodes = 0
+        self.__deadline = start + time_limit if time_limit is not None else None
+        self.__node_limit = node_limit
+        self.__stop_event = stop_event
+        self.__root_moves = set(root_moves) if root_moves is not None else None
+        try:
+            score, move = self.__root(model, depth)
+        except SearchTimeout:
+            return None
+        return SearchResult(move, score, depth, self.nodes, time.perf_counter() - start,
+                            self.__line(model, move, depth))
+
+    def principal_variation(self, model, max_length: int) -> list:
+        """
+        Follows the best moves stored in the transposition table from a position.
+
+        Parameters:
+            model (ChessModel): The position to start from. It is left unchanged.
+            max_length (int): The longest line to return.
+
+        Returns:
+            list: The moves of the expected line of play.
+        """
+        line = []
+        seen = set()
+        while len(line) < max_length and model.zobrist_key not in seen:
+            seen.add(model.zobrist_key)
+            entry = self.table.probe(model.zobrist_key)
+            if entry is None or entry[3] is None:
+                break
+            move = next((m for m in model.generate_all_valid_moves() if m == entry[3]), None)
+            if move is None:
+                break
+            line.append(move)
+            model.move(move)
+        for _ in line:
+            model.undo()
+        return line
+
+    def __line(self, model, move, length: int) -> list:
+        # The expected line of play after the chosen root move
+        if move is None:
+            return []
+        model.move(move)
+        line = [move] + self.principal_variation(model, length - 1)
+        model.undo()
+        return line
+
+    def __check_limits(self):
+        if self.__deadline is not None and time.perf_counter() >= self.__deadline:
+            raise SearchTimeout()
+        if self.__node_limit is not None and self.nodes >= self.__node_limit:
+            raise SearchTimeout()
+        if self.__stop_event is not None and self.__stop_event.is_set():
+            raise SearchTimeout()
+
+    def __ordered(self, model, moves: list, best) -> list:
+        # Best move from the table first, then captures of valuable pieces by cheap ones, then the rest
+        board = model.board
+
+        def priority(move):
+            if move == best:
+                return -1000
+            target = board[move.to_row][move.to_col]
+            if target is None:
+                return 0
+            return _ORDER_VALUES[board[move.from_row][move.from_col].code] - 10 * _ORDER_VALUES[target.code]
+
+        return sorted(moves, key=priority)
+
+    def __root(self, model, depth: int):
+        moves = model.generate_all_valid_moves()
+        if self.__root_moves is not None:
+            moves = [move for move in moves if move in self.__root_moves]
+        if not moves:
+            return self.__terminal_score(model, 0), None
+        entry = self.table.probe(model.zobrist_key)
+        moves = self.__ordered(model, moves, entry[3] if entry else None)
+        alpha = -MATE_SCORE
+        best_move = moves[0]
+        for move in moves:
+            model.move(move)
+            try:
+                score = -self.__negamax(model, depth - 1, -MATE_SCORE, -alpha, 1)
+            finally:
+                model.undo()
+            if score > alpha:
+                alpha = score
+                best_move = move
+        # A score over only some of the root moves is not the score of the position
+        if self.__root_moves is None:
+            self.table.store(model.zobrist_key, depth, alpha, Bound.EXACT, best_move)
+        return alpha, best_move
+
+    def __terminal_score(self, model, ply: int) -> int:
+        # No legal moves: checkmate is scored by distance from the root, anything else is a draw
+        if model.in_check(model.current_player):
+            return -MATE_SCORE + ply
+        return 0
+
+    def __negamax(self, model, depth: int, alpha: int, beta: int, ply: int) -> int:
+        if self.tablebase is not None:
+            found = self.tablebase.probe(model)
+            if found is not None:
+                self.nodes += 1
+                return _tablebase_score(found, ply)
+        if depth <= 0:
+            return self.__quiescence(model, alpha, beta, ply)
+        self.nodes += 1
+        if self.nodes & 255 == 0:
+            self.__check_limits()
+        if model.one_vs_one():
+            return 0
+
+        key = model.zobrist_key
+        entry = self.table.probe(key)
+        best = None
+        if entry is not None:
+            entry_depth, score, bound, best = entry
+            if entry_depth >= depth:
+                score = _score_from_table(score, ply)
+                if bound == Bound.EXACT:
+                    return score
+                if bound == Bound.LOWER and score >= beta:
+                    return score
+                if bound == Bound.UPPER and score <= alpha:
+                    return score
+
+        moves = model.generate_all_valid_moves()
+        if not moves:
+            return self.__terminal_score(model, ply)
+
+        original_alpha = alpha
+        best_score = -MATE_SCORE
+        best_move = None
+        for move in self.__ordered(model, moves, best):
+            model.move(move)
+            try:
+                score = -self.__negamax(model, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                model.undo()
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if best_score <= original_alpha:
+            bound = Bound.UPPER
+        elif best_score >= beta:
+            bound = Bound.LOWER
+        else:
+            bound = Bound.EXACT
+        self.table.store(key, depth, _score_to_table(best_score, ply), bound, best_move)
+        return best_score
+
+    def __quiescence(self, model, alpha: int, beta: int, ply: int) -> int:
+        # Only captures are searched past the horizon, so exchanges are not cut off half way
+        self.nodes += 1
+        if self.nodes & 255 == 0:
+            self.__check_limits()
+        stand_pat = evaluate(model)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        captures = [move for move in model.generate_all_valid_moves() if move.is_capture]
+        for move in self.__ordered(model, captures, None):
+            model.move(move)
+            try:
+                score = -self.__quiescence(model, -beta, -alpha, ply + 1)
+            finally:
+                model.undo()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+
+def _score_to_table(score: int, ply: int) -> int:
+    # Mate scores are stored relative to the position rather than the root
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _score_from_table(score: int, ply: int) -> int:
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+def _tablebase_score(found: tuple, ply: int) -> int:
+    # A tablebase result as a search score, with mates counted from the root like those found by searching
+    result, plies = found
+    if result > 0:
+        return MATE_SCORE - ply - plies
+    if result < 0:
+        return -MATE_SCORE + ply + plies
+    return 0
@@ -0,0 +1,545 @@
+import argparse
+import itertools
+import mmap
+import os
+import time
+from bitboard import PAWN, BISHOP, ROOK, QUEEN, KING
+from attacks import piece_attacks, PAWN_ATTACKS, RAYS
+
+MAX_PIECES = 4
+# Stored for every position: 0 for a draw, otherwise the number of plies to mate plus one. An odd number of plies
+# to mate means the player to move wins and an even number that it is mated.
+DRAW = 0
+_MAX_STORED = 255
+_LETTERS = 'PNBRQK'
+_UNKNOWN = 255
+_ILLEGAL = 255
+
+
+def parse_material(name: str) -> tuple:
+    """
+    Reads the name of an ending, such as 'KQvK' or 'KRvKN', with white's pieces before the 'v'.
+
+    Parameters:
+        name (str): The name of the ending.
+
+    Returns:
+        tuple: The piece type codes of white and of black, each a tuple with the king first.
+
+    Raises:
+        ValueError: If the name is not an ending of 2 to MAX_PIECES pieces with one king per side.
+    """
+    white, sep, black = name.upper().partition('V')
+    if not sep or any(letter not in _LETTERS for letter in white + black):
+        raise ValueError(f'Not an ending: {name}')
+    sides = tuple(tuple(sorted((_LETTERS.index(letter) for letter in letters), reverse=True))
+                  for letters in (white, black))
+    if any(kinds.count(KING) != 1 for kinds in sides) or len(white + black) > MAX_PIECES:
+        raise ValueError(f'Not an ending: {name}')
+    return sides
+
+
+def material_name(white, black) -> str:
+    """
+    Names an ending from the piece types of both sides.
+
+    Parameters:
+        white: The piece type codes of white's pieces, in any order.
+        black: The piece type codes of black's pieces.
+
+    Returns:
+        str: The name of the ending, such as 'KQvK'.
+    """
+    return 'v'.join(''.join(_LETTERS[kind] for kind in sorted(kinds, reverse=True)) for kinds in (white, black))
+
+
+def _table_order(pieces) -> list:
+    # White's pieces then black's, each side's king first and then the strongest piece first, which is the order
+    # the squares of a table index are in
+    return sorted(pieces, key=lambda piece: (-piece[0], -piece[1], piece[2]))
+
+
+def _needs_flip(white, black) -> bool:
+    # Tables are kept with the stronger side as white; the other colors are probed by flipping the board
+    white = sorted(white, reverse=True)
+    black = sorted(black, reverse=True)
+    return (len(black), black) > (len(white), white)
+
+
+def _table_size(count: int) -> int:
+    # The white king stands on one of 32 squares, every other piece on any of 64, with either player to move
+    return 2 * 32 * 64 ** (count - 1)
+
+
+def _index(squares, player: int) -> int:
+    # Index of a position with its squares in table order. Without castling a position and its mirror image from
+    # left to right have the same value, so the board is mirrored to put the white king on files a to d.
+    if squares[0] & 7 >= 4:
+        squares = [sq ^ 7 for sq in squares]
+    index = (squares[0] >> 3) * 4 + (squares[0] & 7)
+    for sq in squares[1:]:
+        index = index * 64 + sq
+    return index * 2 + player
+
+
+# Squares of the white king in index order
+_KING_SQUARES = tuple(row * 8 + col for row in range(8) for col in range(4))
+
+
+def decode(stored: int) -> tuple:
+    """
+    Reads a stored table value.
+
+    Parameters:
+        stored (int): The value stored for a position.
+
+    Returns:
+        tuple: The result for the player to move, 1 for a win, 0 for a draw and -1 for a loss, and the number of
+            plies to mate, which is 0 for a draw.
+    """
+    if stored == DRAW:
+        return 0, 0
+    plies = stored - 1
+    return (1 if plies & 1 else -1), plies
+
+
+class Tablebase:
+    def __init__(self, directory: str):
+        """
+        Initialize a set of endgame tables kept in a directory, one file per ending. A table holds one byte per
+        index, so looking up a position is a single read. Files are memory-mapped when first probed.
+
+        Parameters:
+            directory (str): The directory the tables are read from and generated into.
+        """
+        self.directory = directory
+        self.__tables = {}
+
+    def path(self, name: str) -> str:
+        """
+        Finds the file of an ending.
+
+        Parameters:
+            name (str): The name of the ending, such as 'KQvK'.
+
+        Returns:
+            str: The path of the table.
+        """
+        return os.path.join(self.directory, name + '.tb')
+
+    def available(self, name: str) -> bool:
+        """
+        Checks if the table of an ending has been generated.
+
+        Parameters:
+            name (str): The name of the ending.
+
+        Returns:
+            bool: True if the table can be probed.
+        """
+        return name in self.__tables or os.path.exists(self.path(name))
+
+    def __table(self, name: str):
+        table = self.__tables.get(name)
+        if table is None:
+            if not os.path.exists(self.path(name)):
+                return None
+            pieces = sum(len(kinds) for kinds in parse_material(name))
+            with open(self.path(name), 'rb') as file:
+                if os.fstat(file.fileno()).st_size != _table_size(pieces):
+                    raise ValueError(f'Not a {name} table: {self.path(name)}')
+                table = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.__tables[name] = table
+        return table
+
+    def close(self):
+        """
+        Unmaps every table.
+        """
+        for table in self.__tables.values():
+            table.close()
+        self.__tables.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __reduce__(self):
+        return Tablebase, (self.directory,)
+
+    def probe_pieces(self, pieces, player: int):
+        """
+        Looks up a position given as a list of pieces.
+
+        Parameters:
+            pieces: A (side, type code, square) tuple per piece, where side is the value of the owner.
+            player (int): The value of the player to move.
+
+        Returns:
+            int: The stored value of the position, or None if its table has not been generated.
+        """
+        white = [kind for side, kind, _ in pieces if side == 1]
+        black = [kind for side, kind, _ in pieces if side == 0]
+        if _needs_flip(white, black):
+            white, black = black, white
+            pieces = [(1 - side, kind, sq ^ 56) for side, kind, sq in pieces]
+            player = 1 - player
+        table = self.__table(material_name(white, black))
+        if table is None:
+            return None
+        return table[_index([sq for _, _, sq in _table_order(pieces)], player)]
+
+    def probe(self, model):
+        """
+        Looks up the position of a model. Models with more than MAX_PIECES pieces, or whose ending has not been
+        generated, are not covered.
+
+        Parameters:
+            model (ChessModel): The position.
+
+        Returns:
+            tuple: The result for the player to move, 1 for a win, 0 for a draw and -1 for a loss, and the number
+                of plies to mate, or None if the position is not covered.
+        """
+        bitboard = model.bitboard
+        if bin(bitboard.all).count('1') > MAX_PIECES:
+            return None
+        pieces = []
+        for side in (0, 1):
+            for kind, squares in enumerate(bitboard.pieces[side]):
+                while squares:
+                    low = squares & -squares
+                    pieces.append((side, kind, low.bit_length() - 1))
+                    squares ^= low
+        stored = self.probe_pieces(pieces, model.current_player.value)
+        return None if stored is None else decode(stored)
+
+    def best_move(self, model):
+        """
+        Picks the move that keeps the best result: the quickest mate when winning, the longest resistance when
+        losing, and any drawing move otherwise.
+
+        Parameters:
+            model (ChessModel): The position. It is left unchanged.
+
+        Returns:
+            Move: The best move, or None if the position is not covered or has no legal move.
+        """
+        if self.probe(model) is None:
+            return None
+        best = None
+        best_rank = None
+        for move in model.generate_all_valid_moves():
+            model.move(move)
+            found = self.probe(model)
+            model.undo()
+            if found is None:
+                continue
+            result, plies = found
+            # The result is the opponent's: its loss is our win, and shorter wins and longer losses rank higher
+            rank = (-result, plies if result > 0 else -plies)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = move, rank
+        return best
+
+    def generate(self, name: str, progress=None) -> int:
+        """
+        Solves an ending by retrograde analysis and writes its table, first generating the tables of the endings
+        it can turn into by a capture or a promotion. Pawns promote to queens, as they do in the game.
+
+        Parameters:
+            name (str): The name of the ending, such as 'KPvK'.
+            progress: A function called with a message as each table is finished, or None.
+
+        Returns:
+            int: The number of tables generated, counting those the ending depends on.
+
+        Raises:
+            ValueError: If the name is not an ending.
+        """
+        white, black = parse_material(name)
+        if _needs_flip(white, black):
+            white, black = black, white
+        name = material_name(white, black)
+        if self.available(name):
+            return 0
+        generated = 0
+        for sub_white, sub_black in _successors(white, black):
+            generated += self.generate(material_name(sub_white, sub_black), progress)
+        start = time.perf_counter()
+        data = _Solver(self, white, black).solve()
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = self.path(name) + '.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(data)
+        os.replace(temporary, self.path(name))
+        if progress is not None:
+            progress(f'{name}: {len(data)} positions in {time.perf_counter() - start:.1f}s')
+        return generated + 1
+
+
+def _successors(white, black) -> set:
+    # Endings reached by capturing any piece but a king, or by promoting a pawn
+    endings = set()
+    for own, other, flip in ((white, black, False), (black, white, True)):
+        for index, kind in enumerate(other):
+            if kind != KING:
+                remaining = other[:index] + other[index + 1:]
+                endings.add((remaining, own) if flip else (own, remaining))
+        if PAWN in own:
+            index = own.index(PAWN)
+            promoted = own[:index] + (QUEEN,) + own[index + 1:]
+            endings.add((other, promoted) if flip else (promoted, other))
+            # A promotion that also captures
+            for index, kind in enumerate(other):
+                if kind != KING:
+                    remaining = other[:index] + other[index + 1:]
+                    endings.add((remaining, promoted) if flip else (promoted, remaining))
+    return endings
+
+
+def _between_table() -> list:
+    # Squares strictly between two squares on a line, or 0 if they are not on one
+    table = [[0] * 64 for _ in range(64)]
+    for sq in range(64):
+        for ray in RAYS:
+            beyond = ray[sq]
+            while beyond:
+                low = beyond & -beyond
+                target = low.bit_length() - 1
+                table[sq][target] = ray[sq] ^ ray[target] ^ low
+                beyond ^= low
+    return table
+
+
+_BETWEEN = _between_table()
+# Squares each piece type reaches on an empty board; pawns are looked up by side in PAWN_ATTACKS instead
+_REACH = tuple(tuple(piece_attacks(kind, 1, sq, 0) for sq in range(64)) for kind in range(6))
+_SLIDERS = (BISHOP, ROOK, QUEEN)
+
+
+def _attacks_square(kind: int, side: int, sq: int, target: int, occupied: int) -> bool:
+    # Whether a piece attacks a square, with one table lookup for sliders instead of walking the rays
+    if kind == PAWN:
+        return PAWN_ATTACKS[side][sq] >> target & 1
+    if not _REACH[kind][sq] >> target & 1:
+        return False
+    return kind not in _SLIDERS or not _BETWEEN[sq][target] & occupied
+
+
+class _Solver:
+    def __init__(self, tablebase: Tablebase, white, black):
+        # Pieces in table order, each a (side, type code) pair, starting with the white king
+        self.tablebase = tablebase
+        self.pieces = [(1, kind) for kind in white] + [(0, kind) for kind in black]
+        self.count = len(self.pieces)
+        self.size = _table_size(self.count)
+        # Amount the index changes when piece i moves one square; the white king is handled on its own
+        self.strides = [2 * 64 ** (self.count - 1 - i) for i in range(self.count)]
+
+    def __in_check(self, squares, player: int, king_sq: int, occupied: int, skip: int = -1) -> bool:
+        # Whether the king of player, on king_sq, is attacked by a piece of the other side other than skip
+        for i, (side, kind) in enumerate(self.pieces):
+            if side != player and i != skip and _attacks_square(kind, side, squares[i], king_sq, occupied):
+                return True
+        return False
+
+    def solve(self) -> bytearray:
+        pieces = self.pieces
+        count = self.count
+        kings = [pieces.index((side, KING)) for side in (0, 1)]
+        pawns = [i for i, (_, kind) in enumerate(pieces) if kind == PAWN]
+        values = bytearray(self.size)
+        # Moves of each position not yet known to lose, or _ILLEGAL for positions that cannot arise
+        counters = bytearray(self.size)
+        # Distance each position is queued at; positions are finished in order of distance
+        queued = bytearray([_UNKNOWN]) * self.size
+        buckets = [[]]
+        # Positions that lose one more move at a distance, through a capture or promotion into a won ending
+        exits = [[]]
+
+        def grow(distance: int):
+            while len(buckets) <= distance:
+                buckets.append([])
+                exits.append([])
+
+        def queue(distance: int, index: int):
+            grow(distance)
+            buckets[distance].append(index)
+            queued[index] = distance
+
+        others = [range(64)] * (count - 1)
+        for position, squares in enumerate(itertools.product(_KING_SQUARES, *others)):
+            occupied = 0
+            for sq in squares:
+                occupied |= 1 << sq
+            if bin(occupied).count('1') != count or any(squares[i] // 8 in (0, 7) for i in pawns):
+                counters[position * 2] = counters[position * 2 + 1] = _ILLEGAL
+                continue
+            for player in (0, 1):
+                index = position * 2 + player
+                if self.__in_check(squares, 1 - player, squares[kings[1 - player]], occupied):
+                    counters[index] = _ILLEGAL
+                    continue
+                moves, best_exit, losing_exits = self.__count_moves(squares, player, occupied, kings[player])
+                if best_exit is not None:
+                    queue(best_exit, index)
+                for distance in losing_exits:
+                    grow(distance)
+                    exits[distance].append(index)
+                counters[index] = moves
+                if moves == 0 and self.__in_check(squares, player, squares[kings[player]], occupied):
+                    # Mated; with no moves and no check it is stalemate, which stays a draw
+                    queue(0, index)
+
+        distance = 0
+        while distance < len(buckets):
+            if distance + 1 >= _MAX_STORED:
+                raise ValueError('Mate is too far away to be stored')
+            winning = distance & 1
+            for index in buckets[distance]:
+                if values[index] or queued[index] != distance:
+                    continue
+                values[index] = distance + 1
+                for parent in self.__parents(index):
+                    if values[parent] or counters[parent] == _ILLEGAL:
+                        continue
+                    if not winning:
+                        if queued[parent] > distance + 1:
+                            queue(distance + 1, parent)
+                    else:
+                        counters[parent] -= 1
+                        if counters[parent] == 0:
+                            queue(distance + 1, parent)
+            for parent in exits[distance]:
+                if not values[parent]:
+                    counters[parent] -= 1
+                    if counters[parent] == 0:
+                        queue(distance + 1, parent)
+            distance += 1
+        return values
+
+    def __count_moves(self, squares, player: int, occupied: int, king: int) -> tuple:
+        # Counts the legal moves and sorts out those that leave the ending by a capture or promotion: the distance
+        # at which the best winning exit wins, and the distance of every exit into a lost ending. Winning and
+        # drawn exits are counted but never taken off the count again, so such a position is never lost.
+        pieces = self.pieces
+        own = 0
+        for i, (side, _) in enumerate(pieces):
+            if side == player:
+                own |= 1 << squares[i]
+        king_sq = squares[king]
+        # Other pieces can only expose the king if it is in check already or they stand between it and a slider
+        exposed = self.__in_check(squares, player, king_sq, occupied)
+        lines = 0
+        for i, (side, kind) in enumerate(pieces):
+            if side != player and kind in _SLIDERS and _REACH[kind][squares[i]] >> king_sq & 1:
+                lines |= _BETWEEN[squares[i]][king_sq]
+        moves = 0
+        best_exit = None
+        losing_exits = []
+        for i, (side, kind) in enumerate(pieces):
+            if side != player:
+                continue
+            from_sq = squares[i]
+            safe = i != king and not exposed and not lines >> from_sq & 1
+            if kind == PAWN:
+                step = 8 if side == 0 else -8
+                targets = PAWN_ATTACKS[side][from_sq] & occupied & ~own
+                push = from_sq + step
+                if not occupied >> push & 1:
+                    targets |= 1 << push
+                    if from_sq // 8 == (1 if side == 0 else 6) and not occupied >> (push + step) & 1:
+                        targets |= 1 << (push + step)
+            else:
+                targets = piece_attacks(kind, side, from_sq, occupied) & ~own
+            while targets:
+                low = targets & -targets
+                targets ^= low
+                to = low.bit_length() - 1
+                captured = squares.index(to) if occupied & low else -1
+                after = occupied ^ (1 << from_sq) | low
+                if not safe:
+                    if i == king:
+                        checked = self.__in_check(squares, player, to, after, captured)
+                    else:
+                        checked = self.__in_check(squares[:i] + (to,) + squares[i + 1:], player, king_sq, after,
+                                                  captured)
+                    if checked:
+                        continue
+                moves += 1
+                promotes = kind == PAWN and to // 8 in (0, 7)
+                if captured < 0 and not promotes:
+                    continue
+                moved = squares[:i] + (to,) + squares[i + 1:]
+                remaining = [(pieces[j][0], QUEEN if j == i and promotes else pieces[j][1], moved[j])
+                             for j in range(self.count) if j != captured]
+                result, plies = decode(self.tablebase.probe_pieces(remaining, 1 - player))
+                if result < 0:
+                    if best_exit is None or plies + 1 < best_exit:
+                        best_exit = plies + 1
+                elif result > 0:
+                    losing_exits.append(plies)
+        return moves, best_exit, losing_exits
+
+    def __parents(self, index: int) -> list:
+        # Positions one move earlier that reach this one without a capture or promotion
+        count = self.count
+        pieces = self.pieces
+        player = index & 1
+        mover = 1 - player
+        squares = []
+        rest = index >> 1
+        for _ in range(count - 1):
+            rest, sq = divmod(rest, 64)
+            squares.append(sq)
+        squares.append(_KING_SQUARES[rest])
+        squares.reverse()
+        occupied = 0
+        for sq in squares:
+            occupied |= 1 << sq
+        parents = []
+        base = index ^ 1
+        for i, (side, kind) in enumerate(pieces):
+            if side != mover:
+                continue
+            sq = squares[i]
+            if kind == PAWN:
+                step = -8 if side == 0 else 8
+                sources = 0
+                back = sq + step
+                if 8 <= back < 56 and not occupied >> back & 1:
+                    sources |= 1 << back
+                    if (back + step) // 8 == (1 if side == 0 else 6) and not occupied >> (back + step) & 1:
+                        sources |= 1 << (back + step)
+            else:
+                sources = piece_attacks(kind, side, sq, occupied) & ~occupied
+            while sources:
+                low = sources & -sources
+                sources ^= low
+                source = low.bit_length() - 1
+                if i:
+                    parents.append(base + (source - sq) * self.strides[i])
+                elif source & 7 < 4:
+                    parents.append(base + ((source >> 3) - (sq >> 3)) * 4 * self.strides[0]
+                                   + ((source & 7) - (sq & 7)) * self.strides[0])
+                else:
+                    # The white king steps onto the mirrored half of the board
+                    parents.append(_index([source] + squares[1:], mover))
+        return parents
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate endgame tables by retrograde analysis.')
+    parser.add_argument('endings', nargs='+', help="endings to generate, such as 'KQvK' or 'KPvK'")
+    parser.add_argument('--directory', default='tablebases', help='directory to write the tables to')
+    args = parser.parse_args()
+    tablebase = Tablebase(args.directory)
+    for name in args.endings:
+        tablebase.generate(name, progress=print)
+
+
+if __name__ == '__main__':
+    main()
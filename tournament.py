@@ -0,0 +1,226 @@
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from chess_model import ChessModel
+from player import Player
+from search import Searcher
+
+# Search limits an engine may set, passed straight to Searcher.search
+_LIMITS = {'depth': ('max_depth', int), 'time': ('time_limit', float), 'nodes': ('node_limit', int)}
+
+
+def parse_engine(spec: str) -> dict:
+    """
+    Reads an engine description such as 'random', 'depth=2' or 'time=0.5,nodes=20000'.
+
+    Parameters:
+        spec (str): The description of the engine.
+
+    Returns:
+        dict: The engine, with a name and the search limits it uses. No limits means random moves.
+
+    Raises:
+        ValueError: If the description has an unknown or malformed setting.
+    """
+    engine = {'name': spec}
+    if spec == 'random':
+        return engine
+    for part in spec.split(','):
+        key, sep, value = part.partition('=')
+        if not sep or key not in _LIMITS:
+            raise ValueError(f'Unknown engine setting: {part}')
+        name, convert = _LIMITS[key]
+        engine[name] = convert(value)
+    return engine
+
+
+def _choose_move(model: ChessModel, engine: dict, searcher: Searcher, rng: random.Random):
+    limits = {key: value for key, value in engine.items() if key != 'name'}
+    if not limits:
+        moves = model.generate_all_valid_moves()
+        return rng.choice(moves) if moves else None
+    return searcher.search(model, **limits).move
+
+
+def play_game(index: int, white: dict, black: dict, seed: int, opening_plies: int = 0, max_plies: int = 300) -> dict:
+    """
+    Plays one game between two engines. Each engine keeps its own searcher, and the first plies are played at
+    random so that games between the same engines differ.
+
+    Parameters:
+        index (int): The number of the game in the tournament.
+        white (dict): The engine playing white.
+        black (dict): The engine playing black.
+        seed (int): The seed of the game's random choices.
+        opening_plies (int): The number of random plies played before the engines take over.
+        max_plies (int): The length after which the game is adjudicated a draw.
+
+    Returns:
+        dict: The game record with the result, the reason the game ended, the plies played and the time taken.
+    """
+    rng = random.Random(seed)
+    model = ChessModel()
+    searchers = {Player.WHITE: Searcher(size_mb=4), Player.BLACK: Searcher(size_mb=4)}
+    engines = {Player.WHITE: white, Player.BLACK: black}
+    seen = {model.zobrist_key: 1}
+    start = time.perf_counter()
+    plies = 0
+    result, reason = '1/2-1/2', 'max plies'
+    while plies < max_plies:
+        if model.one_vs_one():
+            reason = 'kings only'
+            break
+        player = model.current_player
+        if plies < opening_plies:
+            moves = model.generate_all_valid_moves()
+            move = rng.choice(moves) if moves else None
+        else:
+            move = _choose_move(model, engines[player], searchers[player], rng)
+        if move is None:
+            if model.in_check(player):
+                result = '0-1' if player == Player.WHITE else '1-0'
+                reason = 'checkmate'
+            else:
+                reason = 'stalemate'
+            break
+        model.move(move)
+        plies += 1
+        seen[model.zobrist_key] = seen.get(model.zobrist_key, 0) + 1
+        if seen[model.zobrist_key] >= 3:
+            reason = 'repetition'
+            break
+    return {'game': index, 'white': white['name'], 'black': black['name'], 'result': result, 'reason': reason,
+            'plies': plies, 'time': time.perf_counter() - start, 'seed': seed}
+
+
+def _load_results(path: str) -> tuple:
+    # The match configuration from the first line of the file, or None, and the game records after it
+    config = None
+    results = []
+    if path and os.path.exists(path):
+        with open(path) as file:
+            for line in file:
+                line = line.strip()
+                if line:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A run stopped half way through writing its last line
+                        continue
+                    if 'config' in record:
+                        config = record['config']
+                    else:
+                        results.append(record)
+    return config, results
+
+
+def summarize(results: list) -> dict:
+    """
+    Totals the results of a tournament from the point of view of the first engine. Games are credited by the
+    color the first engine played, so two engines with the same name are still told apart.
+
+    Parameters:
+        results (list): The game records.
+
+    Returns:
+        dict: The wins, draws and losses of the first engine, the games and plies played, and moves per second.
+    """
+    wins = draws = losses = plies = 0
+    elapsed = 0.0
+    for game in results:
+        plies += game['plies']
+        elapsed += game['time']
+        if game['result'] == '1/2-1/2':
+            draws += 1
+        elif (game['result'] == '1-0') == (game['engine_a'] == 'white'):
+            wins += 1
+        else:
+            losses += 1
+    return {'games': len(results), 'wins': wins, 'draws': draws, 'losses': losses, 'plies': plies,
+            'plies_per_game': plies / len(results) if results else 0.0,
+            'moves_per_second': plies / elapsed if elapsed else 0.0}
+
+
+def run_tournament(engine_a: dict, engine_b: dict, games: int, results_path: str = None, workers: int = None,
+                   seed: int = 0, opening_plies: int = 4, max_plies: int = 300) -> dict:
+    """
+    Plays a match between two engines across a pool of processes, alternating colors every game. Each finished
+    game is appended to the results file straight away, and games already in the file are not played again, so
+    a stopped run can be resumed. The file starts with the configuration of the match, and a run with a different
+    configuration refuses to add to it.
+
+    Parameters:
+        engine_a (dict): The first engine, white in even games.
+        engine_b (dict): The second engine, white in odd games.
+        games (int): The number of games in the match.
+        results_path (str): The JSON lines file to stream the game records to, or None.
+        workers (int): The number of worker processes, or None for one per CPU.
+        seed (int): The seed of the match; game i uses seed + i.
+        opening_plies (int): The number of random plies at the start of every game.
+        max_plies (int): The length after which a game is adjudicated a draw.
+
+    Returns:
+        dict: The summary of every game in the results, including the wall-clock time of this run.
+
+    Raises:
+        ValueError: If the results file holds games of a match with other engines, seed or limits.
+    """
+    config = {'engine_a': engine_a, 'engine_b': engine_b, 'seed': seed, 'opening_plies': opening_plies,
+              'max_plies': max_plies}
+    stored, results = _load_results(results_path)
+    if stored is not None or results:
+        if stored != config:
+            raise ValueError(f'{results_path} holds games of a different match')
+    elif results_path:
+        with open(results_path, 'w') as file:
+            file.write(json.dumps({'config': config}) + '\n')
+    done = {game['game'] for game in results}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for index in range(games):
+            if index in done:
+                continue
+            white, black = (engine_a, engine_b) if index % 2 == 0 else (engine_b, engine_a)
+            futures.append(pool.submit(play_game, index, white, black, seed + index, opening_plies, max_plies))
+        for future in as_completed(futures):
+            game = future.result()
+            game['engine_a'] = 'white' if game['game'] % 2 == 0 else 'black'
+            results.append(game)
+            if results_path:
+                with open(results_path, 'a') as file:
+                    file.write(json.dumps(game) + '\n')
+    summary = summarize(results)
+    summary['wall_time'] = time.perf_counter() - start
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play a match between two engine configurations.')
+    parser.add_argument('engine_a', help="first engine, e.g. 'random', 'depth=2' or 'time=0.5,nodes=20000'")
+    parser.add_argument('engine_b', help='second engine')
+    parser.add_argument('--games', type=int, default=10, help='number of games')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--out', default='tournament_results.jsonl', help='results file, resumed if it exists')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the match')
+    parser.add_argument('--opening-plies', type=int, default=4, help='random plies at the start of every game')
+    parser.add_argument('--max-plies', type=int, default=300, help='plies before a game is adjudicated a draw')
+    args = parser.parse_args()
+
+    try:
+        summary = run_tournament(parse_engine(args.engine_a), parse_engine(args.engine_b), args.games, args.out,
+                                 args.workers, args.seed, args.opening_plies, args.max_plies)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"{args.engine_a} vs {args.engine_b}: +{summary['wins']} ={summary['draws']} -{summary['losses']} "
+          f"in {summary['games']} games")
+    print(f"Plies per game: {summary['plies_per_game']:.1f}")
+    print(f"Moves per second: {summary['moves_per_second']:.1f}")
+    print(f"Wall time: {summary['wall_time']:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
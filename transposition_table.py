@@ -0,0 +1,148 @@
+from array import array
+from enum import IntEnum
+from move import Move
+
+# Every entry takes a 64-bit key and a 64-bit packed data word
+ENTRY_BYTES = 16
+
+# Layout of the data word, which starts with the 16-bit packed move (a move never packs to 0)
+_MOVE_MASK = 0xFFFF
+_DEPTH_SHIFT = 16
+_BOUND_SHIFT = 24
+_AGE_SHIFT = 26
+_AGE_MASK = 31
+_USED_BIT = 1 << 31
+_SCORE_SHIFT = 32
+_SCORE_OFFSET = 1 << 31
+
+
+class Bound(IntEnum):
+    EXACT = 0
+    LOWER = 1
+    UPPER = 2
+
+
+class TranspositionTable:
+    def __init__(self, size_mb: float = 16):
+        """
+        Initialize a fixed-size transposition table. The entries are preallocated in two flat arrays, one of keys
+        and one of packed data words, and grouped in buckets of two: the first slot keeps the deepest result seen
+        for the bucket, the second is always replaced.
+
+        Parameters:
+            size_mb (float): The memory budget of the table in megabytes.
+
+        Raises:
+            ValueError: If the budget is too small to hold a single bucket.
+        """
+        buckets = int(size_mb * 1024 * 1024) // (2 * ENTRY_BYTES)
+        if buckets < 1:
+            raise ValueError('Transposition table needs at least %d bytes' % (2 * ENTRY_BYTES))
+        # Round down to a power of two so the bucket index is a mask of the key
+        buckets = 1 << (buckets.bit_length() - 1)
+        self.__mask = buckets - 1
+        self.__keys = array('Q', [0]) * (2 * buckets)
+        self.__data = array('Q', [0]) * (2 * buckets)
+        self.__age = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    @property
+    def size(self) -> int:
+        """
+        Property to get the number of entries the table can hold.
+
+        Returns:
+            int: The capacity of the table in entries.
+        """
+        return len(self.__keys)
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        Property to get the share of probes that found an entry.
+
+        Returns:
+            float: Hits divided by probes, or 0.0 before the first probe.
+        """
+        probes = self.hits + self.misses
+        return self.hits / probes if probes else 0.0
+
+    def new_search(self):
+        """
+        Starts a new search generation. Depth-preferred entries from older generations may then be replaced by
+        shallower results.
+        """
+        self.__age = (self.__age + 1) & _AGE_MASK
+
+    def clear(self):
+        """
+        Empties the table and resets the statistics.
+        """
+        self.__keys = array('Q', [0]) * len(self.__keys)
+        self.__data = array('Q', [0]) * len(self.__data)
+        self.__age = 0
+        self.hits = self.misses = self.stores = self.overwrites = 0
+
+    def probe(self, key: int):
+        """
+        Looks up the entry stored for a position.
+
+        Parameters:
+            key (int): The Zobrist key of the position.
+
+        Returns:
+            tuple: (depth, score, bound, move) for the position, or None if it is not in the table.
+        """
+        index = (key & self.__mask) << 1
+        keys = self.__keys
+        if keys[index] != key or not self.__data[index]:
+            index += 1
+            if keys[index] != key or not self.__data[index]:
+                self.misses += 1
+                return None
+        self.hits += 1
+        data = self.__data[index]
+        return ((data >> _DEPTH_SHIFT) & 0xFF,
+                (data >> _SCORE_SHIFT) - _SCORE_OFFSET,
+                (data >> _BOUND_SHIFT) & 3,
+                Move.from_packed(data & _MOVE_MASK) if data & _MOVE_MASK else None)
+
+    def store(self, key: int, depth: int, score: int, bound: int, move: Move = None):
+        """
+        Stores the result of searching a position. The depth-preferred slot takes the entry if it holds the same
+        position, a shallower result or a result from an older search; otherwise the always-replace slot does.
+
+        Parameters:
+            key (int): The Zobrist key of the position.
+            depth (int): The depth the position was searched to, between 0 and 255.
+            score (int): The score of the position.
+            bound (int): Whether the score is exact, a lower bound or an upper bound.
+            move (Move): The best move found, or None.
+        """
+        packed = move.packed if move is not None else 0
+        data = (packed | min(max(depth, 0), 255) << _DEPTH_SHIFT | int(bound) << _BOUND_SHIFT
+                | self.__age << _AGE_SHIFT | _USED_BIT | (score + _SCORE_OFFSET) << _SCORE_SHIFT)
+        index = (key & self.__mask) << 1
+        old = self.__data[index]
+        if (old and self.__keys[index] != key and (old >> _DEPTH_SHIFT) & 0xFF > depth
+                and (old >> _AGE_SHIFT) & _AGE_MASK == self.__age):
+            index += 1
+            old = self.__data[index]
+        if old and self.__keys[index] != key:
+            self.overwrites += 1
+        self.__keys[index] = key
+        self.__data[index] = data
+        self.stores += 1
+
+    def usage(self) -> float:
+        """
+        Estimates how full the table is from its first thousand entries.
+
+        Returns:
+            float: The share of sampled entries that are in use.
+        """
+        sample = min(1000, len(self.__data))
+        return sum(1 for i in range(sample) if self.__data[i]) / sample
@@ -0,0 +1,32 @@
+import random
+from player import Player
+from bitboard import PIECE_TYPES
+
+# Fixed seed so that keys are the same in every process and can be stored in files
+_rng = random.Random(0x5EED)
+
+# One random 64-bit key per player, piece type and square, indexed as PIECE_KEYS[player.value][piece type][square]
+PIECE_KEYS = tuple(tuple(tuple(_rng.getrandbits(64) for _ in range(64)) for _ in PIECE_TYPES) for _ in Player)
+
+# Mixed into the key when black is to move
+SIDE_KEY = _rng.getrandbits(64)
+
+
+def hash_board(board: list, player: Player) -> int:
+    """
+    Computes the Zobrist key of a board from scratch. ChessModel keeps the same key up to date incrementally.
+
+    Parameters:
+        board (list): The board as a list of lists of pieces.
+        player (Player): The player to move.
+
+    Returns:
+        int: The 64-bit key of the position.
+    """
+    key = SIDE_KEY if player == Player.BLACK else 0
+    for row in range(len(board)):
+        for col in range(len(board[row])):
+            piece = board[row][col]
+            if piece is not None:
+                key ^= PIECE_KEYS[piece.side][piece.code][row * 8 + col]
+    return key